@@ -0,0 +1,226 @@
+# backend/app/archive.py
+# 整个档案的导出 / 导入 (备份、迁移、新用户导入已有资料)。
+# 格式：gzip 压缩的 NDJSON，每行一条记录 {"type": "header" | "folder" | "pebble", ...}；
+# 导出直接消费 MongoDB 游标、导入逐块解压逐行解析，内存占用与档案大小无关
+
+import zlib
+import orjson
+from pydantic import ValidationError
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.database import settings, pebbles_collection, folders_collection
+from app.documents import now_ms, with_derived_fields
+from app.folders import backfill_folder_ancestors
+from app.models import Pebble, Folder
+from app.semantic import semantic_index
+from app.versioning import bump_version
+
+ARCHIVE_VERSION = 1
+DECOMPRESS_CHUNK = 256 * 1024   # 导入时每次解压输出的上限
+
+# 导出时去掉的字段：所属用户、可重建的派生数据
+EXPORT_PROJECTION = {
+    "folder": {"_id": 0, "owner_id": 0, "ancestors": 0},
+    "pebble": {"_id": 0, "owner_id": 0, "searchTerms": 0, "embedding": 0},
+}
+COLLECTIONS = {"folder": folders_collection, "pebble": pebbles_collection}
+MODELS = {"folder": Folder, "pebble": Pebble}
+
+
+class ArchiveFormatError(ValueError):
+    pass
+
+
+# ==========================================
+# 导出
+# ==========================================
+async def export_records(owner: str, include_deleted: bool = False):
+    """依次 yield header、所有文件夹 (先于 pebbles，导入时父级先就位)、所有 pebbles"""
+    yield {"type": "header", "version": ARCHIVE_VERSION, "exportedAt": now_ms()}
+    for kind in ("folder", "pebble"):
+        query = {"owner_id": owner}
+        if not include_deleted:
+            query["isDeleted"] = {"$ne": True}
+        cursor = COLLECTIONS[kind].find(query, EXPORT_PROJECTION[kind]).batch_size(settings.ARCHIVE_BATCH_SIZE)
+        async for doc in cursor:
+            yield {"type": kind, "data": doc}
+
+
+async def export_gzip(owner: str, include_deleted: bool = False):
+    """gzip 压缩的 NDJSON 字节流；每攒够一批记录刷出一次压缩数据"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits=31: gzip 头
+    pending = 0
+    async for record in export_records(owner, include_deleted):
+        chunk = compressor.compress(orjson.dumps(record) + b"\n")
+        pending += 1
+        if pending >= settings.ARCHIVE_BATCH_SIZE:
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+# ==========================================
+# 导入
+# ==========================================
+async def iter_lines(chunks):
+    """把上传的字节流 (gzip 或未压缩) 逐块解压、切成行；单行超过上限抛 ArchiveFormatError。
+
+    每次最多解压 DECOMPRESS_CHUNK 字节 (剩余输入在 unconsumed_tail 里)，压缩炸弹也只占用
+    行长上限 + 一块的内存；只在新加入的数据里找换行，长行跨很多块时不会反复扫描
+    """
+    limit = settings.ARCHIVE_MAX_LINE_BYTES
+    decompressor = None
+    buffer = bytearray()
+
+    def split(data: bytes) -> list:
+        search = len(buffer)
+        buffer.extend(data)
+        lines, start = [], 0
+        while (end := buffer.find(b"\n", search)) >= 0:
+            if end - start > limit:
+                raise ArchiveFormatError(f"Line longer than {limit} bytes")
+            lines.append(bytes(buffer[start:end]))
+            start = search = end + 1
+        del buffer[:start]
+        if len(buffer) > limit:
+            raise ArchiveFormatError(f"Line longer than {limit} bytes")
+        return lines
+
+    async for chunk in chunks:
+        if decompressor is None:
+            if not chunk:
+                continue
+            # 第一个 chunk 判断是否 gzip (魔数 1f 8b)
+            decompressor = zlib.decompressobj(31) if chunk[:2] == b"\x1f\x8b" else False
+        if not decompressor:
+            for line in split(chunk):
+                yield line
+            continue
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk, DECOMPRESS_CHUNK)
+            except zlib.error as e:
+                raise ArchiveFormatError(f"Invalid gzip data: {e}")
+            chunk = decompressor.unconsumed_tail
+            for line in split(data):
+                yield line
+    if decompressor:
+        for line in split(decompressor.flush()):
+            yield line
+        if not decompressor.eof:
+            raise ArchiveFormatError("Truncated gzip data")
+    if buffer:
+        yield bytes(buffer)
+
+
+def _to_write(owner: str, record, overwrite: bool):
+    """校验一条记录并转成写操作；header / 空记录返回 None，非法记录抛 ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+    kind = record.get("type")
+    if kind == "header":
+        version = record.get("version", ARCHIVE_VERSION)
+        if type(version) is not int or version > ARCHIVE_VERSION:
+            raise ArchiveFormatError(f"Unsupported archive version {version!r}")
+        return None
+    if kind not in MODELS:
+        raise ValueError(f"Unknown record type: {kind!r}")
+    try:
+        doc = MODELS[kind](**{**(record.get("data") or {}), "owner_id": owner}).model_dump()
+    except (ValidationError, TypeError) as e:
+        raise ValueError(str(e))
+    doc["updatedAt"] = now_ms()
+    if kind == "pebble":
+        with_derived_fields(doc)
+    selector = {"id": doc["id"], "owner_id": owner}
+    if overwrite:
+        return kind, ReplaceOne(selector, doc, upsert=True)
+    # 默认跳过已存在的记录，同一文件重复导入是幂等的
+    return kind, UpdateOne(selector, {"$setOnInsert": doc}, upsert=True)
+
+
+async def _flush(batch: dict, stats: dict) -> list:
+    """每个集合一次无序 bulk_write；返回 [(行号, 错误)]"""
+    errors = []
+    for kind, entries in batch.items():
+        if not entries:
+            continue
+        try:
+            result = await COLLECTIONS[kind].bulk_write([w for _, w in entries], ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            errors += [(entries[err["index"]][0], err["errmsg"]) for err in details["writeErrors"]]
+        stats["inserted"] += details.get("nUpserted", 0)
+        stats["updated"] += details.get("nModified", 0)
+        entries.clear()
+    return errors
+
+
+async def import_records(owner: str, chunks, overwrite: bool = False):
+    """逐行导入，按批写入；依次 yield 事件：
+
+    {"event": "error", "line", "detail"}   单条记录的错误 (最多 ARCHIVE_MAX_REPORTED_ERRORS 条)
+    {"event": "progress", ...统计}          每写完一批
+    {"event": "done", ...统计}              全部完成 (文件格式错误时带 fatal)
+    """
+    stats = {"processed": 0, "inserted": 0, "updated": 0, "skipped": 0, "errors": 0}
+    batch = {"folder": [], "pebble": []}
+    reported = 0
+
+    def error_event(line_no: int, detail: str):
+        nonlocal reported
+        stats["errors"] += 1
+        if reported < settings.ARCHIVE_MAX_REPORTED_ERRORS:
+            reported += 1
+            return {"event": "error", "line": line_no, "detail": detail[:500]}
+        return None
+
+    async def flush():
+        errors = await _flush(batch, stats)
+        # 每批写完就 +1 版本号，导入中途断开时客户端也不会拿着旧 ETag 命中 304
+        await bump_version(owner)
+        await semantic_index.changed(owner)
+        for line_no, detail in errors:
+            event = error_event(line_no, detail)
+            if event:
+                yield event
+        stats["skipped"] = stats["processed"] - stats["inserted"] - stats["updated"] - stats["errors"]
+        yield {"event": "progress", **stats}
+
+    line_no = 0
+    fatal = None
+    try:
+        async for line in iter_lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                write = _to_write(owner, orjson.loads(line), overwrite)
+            except ArchiveFormatError:
+                raise
+            except (orjson.JSONDecodeError, ValueError) as e:
+                stats["processed"] += 1
+                event = error_event(line_no, str(e))
+                if event:
+                    yield event
+                continue
+            if write is None:
+                continue
+            stats["processed"] += 1
+            batch[write[0]].append((line_no, write[1]))
+            if len(batch["folder"]) + len(batch["pebble"]) >= settings.ARCHIVE_BATCH_SIZE:
+                async for event in flush():
+                    yield event
+    except ArchiveFormatError as e:
+        fatal = f"line {line_no}: {e}"
+
+    async for event in flush():
+        if event["event"] == "error":
+            yield event
+    # 文件夹的 parentId 可能指向同一文件里后面才出现的文件夹，全部写完后统一重建 ancestors
+    await backfill_folder_ancestors(owners=[owner])
+    await bump_version(owner)
+    yield {"event": "done", **stats, **({"fatal": fatal} if fatal else {})}
@@ -1,15 +1,78 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from app.database import settings
+from app.metrics import password_hashes
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=settings.ARGON2_TIME_COST,
+    argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+    argon2__parallelism=settings.ARGON2_PARALLELISM,
+)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# username -> 用户记录 (不含密码哈希)；token_epoch 用于撤销已签发的 token
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def invalidate_cached_user(username: str):
+    user_cache.pop(username, None)
+
+class PasswordHashingBusy(Exception):
+    """哈希队列已满，调用方应返回 503"""
+
+class PasswordHasher:
+    """在有界线程池里计算 argon2，避免阻塞事件循环 (argon2-cffi 计算时会释放 GIL)"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self._slots = asyncio.Semaphore(workers)
+        self._max_queue = max_queue
+        self.stats = {"in_flight": 0, "queued": 0, "max_queued": 0}
+
+    async def _run(self, fn, *args):
+        if self.stats["queued"] >= self._max_queue:
+            password_hashes.inc("rejected")
+            raise PasswordHashingBusy()
+
+        self.stats["queued"] += 1
+        self.stats["max_queued"] = max(self.stats["max_queued"], self.stats["queued"])
+        try:
+            await self._slots.acquire()
+        finally:
+            self.stats["queued"] -= 1
+
+        self.stats["in_flight"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        # 线程里的计算结束时才释放槽位：等待的请求被取消后 argon2 仍在运行，
+        # 在 finally 里释放会让同时计算的哈希数超过 workers
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._release, f))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        self.stats["in_flight"] -= 1
+        password_hashes.inc("cancelled" if future is None or future.cancelled() else "completed")
+        self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple:
+        """返回 (是否匹配, 新哈希或 None)；代价参数变化时给出新哈希供调用方回写"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -0,0 +1,89 @@
+# backend/app/cache.py
+
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from app.database import settings, generation_cache_collection
+from app.models import Pebble
+from app.metrics import cache_requests
+
+# 缓存结果中与具体某次生成绑定的字段，命中时重新分配
+_PER_INSTANCE_FIELDS = ("id", "timestamp", "owner_id")
+
+
+def _normalize_topic(topic: str) -> str:
+    return " ".join(topic.split()).casefold()
+
+
+def make_generation_key(topic: str, context_nodes: list, provider: str) -> str:
+    """按 (规范化主题, 上下文节点 id/摘要, provider) 计算内容寻址的缓存 key"""
+    context = sorted((c["id"], c["summary"]) for c in context_nodes)
+    material = json.dumps(
+        {"topic": _normalize_topic(topic), "context": context, "provider": provider.lower()},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """两级生成缓存：进程内 TTL+LRU，外加可选的 MongoDB 共享层 (跨 uvicorn worker)"""
+
+    def __init__(self, maxsize: int, ttl: int, shared: bool = False):
+        self.ttl = ttl
+        self.shared = shared
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.stats = {"hits_local": 0, "hits_shared": 0, "misses": 0, "bypassed": 0}
+
+    @staticmethod
+    def _materialize(data: dict) -> Pebble:
+        # 每次命中都是一个新的 Pebble (新的 id / 时间戳)，避免不同用户之间 id 冲突
+        return Pebble(**data, id=str(uuid.uuid4()), timestamp=time.time() * 1000)
+
+    async def get(self, key: str) -> Pebble | None:
+        data = self._local.get(key)
+        if data is not None:
+            self.stats["hits_local"] += 1
+            cache_requests.inc("generation", "hit_local")
+            return self._materialize(data)
+
+        if self.shared:
+            doc = await generation_cache_collection.find_one(
+                {"_id": key, "expiresAt": {"$gt": datetime.utcnow()}}
+            )
+            if doc:
+                self.stats["hits_shared"] += 1
+                cache_requests.inc("generation", "hit_shared")
+                self._local[key] = doc["pebble"]
+                return self._materialize(doc["pebble"])
+
+        self.stats["misses"] += 1
+        cache_requests.inc("generation", "miss")
+        return None
+
+    async def set(self, key: str, pebble: Pebble):
+        data = pebble.model_dump(exclude=set(_PER_INSTANCE_FIELDS))
+        self._local[key] = data
+        if self.shared:
+            await generation_cache_collection.replace_one(
+                {"_id": key},
+                {"_id": key, "pebble": data, "expiresAt": datetime.utcnow() + timedelta(seconds=self.ttl)},
+                upsert=True,
+            )
+
+    def record_bypass(self):
+        self.stats["bypassed"] += 1
+        cache_requests.inc("generation", "bypass")
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "size": len(self._local), "maxsize": self._local.maxsize}
+
+
+generation_cache = GenerationCache(
+    maxsize=settings.GENERATION_CACHE_SIZE,
+    ttl=settings.GENERATION_CACHE_TTL,
+    shared=settings.GENERATION_CACHE_SHARED,
+)
@@ -0,0 +1,77 @@
+# backend/app/context.py
+
+from app.database import settings, pebbles_collection
+from app.semantic import semantic_index, embed_query
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：ASCII 约 4 字符 / token，CJK 等非 ASCII 字符约 1 字符 / token"""
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 二分找到不超过预算的最长前缀
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + "…"
+
+
+async def _retrieve(owner: str, topic: str) -> list:
+    """没有指定上下文时，从用户的 archive 里按语义相似度取最相关的几个 pebble"""
+    index = await semantic_index.get(owner)
+    hits = index.top_k(embed_query(topic), settings.CONTEXT_AUTO_K + 1)
+    return [
+        index.ids[i] for i, score in hits
+        if score >= settings.CONTEXT_AUTO_MIN_SCORE and _normalize(index.topics[i]) != _normalize(topic)
+    ][:settings.CONTEXT_AUTO_K]
+
+
+async def assemble_context(owner: str, topic: str, context_ids: list, auto: bool = True) -> list:
+    """把上下文节点组装成 [{"id", "topic", "summary"}]，控制在 CONTEXT_TOKEN_BUDGET 以内。
+
+    指定了 context_ids 时按给定顺序使用；否则 (auto=True) 自动检索。
+    按主题 / 摘要去重，每个摘要截断到 CONTEXT_NODE_MAX_TOKENS，超出总预算的节点直接丢弃。
+    """
+    if not context_ids:
+        context_ids = await _retrieve(owner, topic) if auto else []
+    if not context_ids:
+        return []
+
+    docs = await pebbles_collection.find(
+        {"owner_id": owner, "id": {"$in": context_ids}, "isDeleted": False},
+        {"_id": 0, "id": 1, "topic": 1, "content.ELI5.summary": 1},
+    ).to_list(length=len(context_ids))
+    by_id = {d["id"]: d for d in docs}
+
+    nodes, seen, used = [], set(), 0
+    for pebble_id in context_ids:
+        doc = by_id.get(pebble_id)
+        if doc is None:
+            continue
+        summary = doc.get("content", {}).get("ELI5", {}).get("summary", "")
+        dedupe_keys = {_normalize(doc["topic"]), _normalize(summary)} - {""}
+        if dedupe_keys & seen:
+            continue
+
+        summary = _truncate(summary, settings.CONTEXT_NODE_MAX_TOKENS)
+        cost = estimate_tokens(doc["topic"]) + estimate_tokens(summary) + 4
+        if used + cost > settings.CONTEXT_TOKEN_BUDGET:
+            break
+        seen |= dedupe_keys
+        used += cost
+        nodes.append({"id": doc["id"], "topic": doc["topic"], "summary": summary})
+        if len(nodes) >= settings.CONTEXT_MAX_NODES:
+            break
+    return nodes
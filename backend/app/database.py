@@ -1,7 +1,9 @@
 # backend/app/database.py
 
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic_settings import BaseSettings
+from app.metrics import MongoCommandListener
 
 class Settings(BaseSettings):
     MONGO_URL: str
@@ -21,16 +23,150 @@ class Settings(BaseSettings):
     # ★★★ 加回 Gemini Keys ★★★
     GEMINI_API_KEY: str = "" 
 
+    # --- 密码哈希 (argon2) ---
+    # 修改代价参数后，旧哈希会在用户下次登录时自动重新计算
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536     # KiB
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 2      # 同时计算哈希的线程数
+    PASSWORD_HASH_MAX_QUEUE: int = 64   # 排队超过该值直接返回 503
+
+    # --- 用户缓存 (get_current_user) ---
+    # 撤销 token 后，其他 worker 最多在 TTL 秒后感知到新的 token_epoch
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 60
+
+    # --- 语义索引 ---
+    SEMANTIC_INDEX_MAX_OWNERS: int = 256   # 进程内缓存向量矩阵的用户数上限
+
+    # --- 生成上下文 (自动检索 + token 预算) ---
+    CONTEXT_TOKEN_BUDGET: int = 600       # 所有上下文节点合计
+    CONTEXT_NODE_MAX_TOKENS: int = 120    # 单个节点摘要截断长度
+    CONTEXT_MAX_NODES: int = 8
+    CONTEXT_AUTO_K: int = 4               # 未指定上下文时自动检索的节点数
+    CONTEXT_AUTO_MIN_SCORE: float = 0.2   # 自动检索的最低余弦相似度
+
+    # --- 后台生成任务 ---
+    JOB_WORKERS: int = 4                  # 每个进程同时执行的生成任务数
+    JOB_MAX_ACTIVE_PER_USER: int = 20     # 单个用户排队 + 执行中的任务上限
+    JOB_MAX_ATTEMPTS: int = 3             # 进程崩溃后重新入队的次数上限
+    JOB_LEASE_SECONDS: int = 600          # 执行中的任务超过租约仍未完成，视为所在进程已退出
+    JOB_RESULT_TTL: int = 24 * 3600       # 已完成任务的保留时间 (秒)
+    JOB_MAX_WAIT: float = 30.0            # 查询状态时最多等待的秒数
+
+    # --- Provider 路由 (限流 / 重试 / 故障切换) ---
+    AI_FAILOVER: bool = True              # 主 provider 失败时切到另一个 (需配置了对应的 key)
+    AI_RATE_LIMIT_DEEPSEEK: float = 10.0  # 令牌桶速率 (请求 / 秒)
+    AI_RATE_LIMIT_GEMINI: float = 10.0
+    AI_RATE_BURST: int = 20
+    AI_MAX_CONCURRENCY: int = 32          # 每个 provider 同时进行的请求数
+    AI_MAX_RETRIES: int = 3               # 仅对 429 / 5xx / 超时 / 连接错误重试
+    AI_RETRY_BASE_DELAY: float = 0.5      # 秒，指数退避 + full jitter
+    AI_RETRY_MAX_DELAY: float = 8.0
+    AI_HEDGE: bool = False                # 对冲请求：主 provider 超过延迟分位数仍未返回时请求备用 provider
+    AI_HEDGE_PERCENTILE: float = 95.0
+    AI_HEDGE_MIN_SAMPLES: int = 20        # 样本不足时不对冲
+    AI_BREAKER_WINDOW: float = 60.0       # 秒，熔断器统计窗口
+    AI_BREAKER_MIN_REQUESTS: int = 10
+    AI_BREAKER_ERROR_RATE: float = 0.5
+    AI_BREAKER_COOLDOWN: float = 30.0     # 秒，熔断后多久放行探测请求
+
+    # --- 改写 (/api/rewrite, /api/rewrite/batch) ---
+    REWRITE_CACHE_SIZE: int = 4096        # LRU 缓存条目数
+    REWRITE_BATCH_MAX_ITEMS: int = 200    # 单次批量请求的条目上限
+    REWRITE_PACK_MAX_ITEMS: int = 20      # 每次 provider 调用打包的条目数
+    REWRITE_PACK_MAX_CHARS: int = 8000    # 每次 provider 调用打包的原文总字符数
+    REWRITE_CONCURRENCY: int = 4          # 同一批量请求内并发的 provider 调用数
+
+    # --- Provider 连接池 ---
+    AI_HTTP2: bool = True
+    AI_MAX_CONNECTIONS: int = 100
+    AI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    AI_KEEPALIVE_EXPIRY: float = 30.0   # 秒
+    AI_CONNECT_TIMEOUT: float = 10.0
+    AI_READ_TIMEOUT: float = 120.0
+
+    # --- 生成缓存 ---
+    GENERATION_CACHE_SIZE: int = 512        # 进程内缓存条目上限
+    GENERATION_CACHE_TTL: int = 6 * 3600    # 秒
+    GENERATION_CACHE_SHARED: bool = False   # 开启后多个 worker 通过 MongoDB 共享缓存
+
+    # --- 档案导出 / 导入 ---
+    ARCHIVE_BATCH_SIZE: int = 500               # 导出游标批大小 / 导入每批写入的记录数
+    ARCHIVE_MAX_LINE_BYTES: int = 16 * 1024 * 1024   # 导入时单条记录的大小上限
+    ARCHIVE_MAX_REPORTED_ERRORS: int = 1000     # 逐条返回的错误数上限，超出的只计数
+
+    # --- 修订历史 ---
+    REVISION_CHECKPOINT_MAX_DIFFS: int = 100    # 两个完整快照之间最多的差异条数 (重建时回放的上限)
+    REVISION_COMPACT_AFTER: int = 24 * 3600     # 秒，早于该时间的修订参与后台合并
+    REVISION_COMPACT_WINDOW: int = 3600         # 秒，同一窗口内的连续修订合并为一条
+    REVISION_COMPACT_INTERVAL: int = 600        # 秒，后台合并的执行间隔
+    REVISION_COMPACT_BATCH: int = 200           # 每轮合并处理的 pebble 数
+
+    # --- 增量同步 (/api/sync/changes) ---
+    SYNC_SAFETY_LAG_MS: int = 10_000        # 读到末尾时 cursor 回退的毫秒数 (写入晚于 updatedAt 提交、实例间时钟偏差)
+
+    # --- 响应压缩 ---
+    COMPRESSION_MIN_SIZE: int = 1024        # 字节，小于该值的响应不压缩
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4     # 需要安装 brotli，否则只用 gzip
+
+    # --- 日志 / 指标 ---
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True                   # 一行一个 JSON 对象；关闭后输出纯文本
+    METRICS_TOKEN: str = ""                 # 非空时 GET /metrics 需要 Authorization: Bearer <token>
+
+    # --- 启动预热 ---
+    MONGO_WARM_CONNECTIONS: int = 4         # 启动后在后台预先建立的 MongoDB 连接数
+    AI_WARM_UP: bool = True                 # 启动后在后台导入主 provider 的 SDK 并创建客户端
+
     class Config:
         env_file = ".env"
         extra = "ignore"
 
 settings = Settings()
 
-client = AsyncIOMotorClient(settings.MONGO_URL)
+# 命令监听器记录每条 MongoDB 命令的耗时 (见 app/metrics.py)。
+# connect=False：导入时不连接、不启动监控线程，第一次操作 (或 warm_up_pool) 时才建立连接
+client = AsyncIOMotorClient(settings.MONGO_URL, connect=False, event_listeners=[MongoCommandListener()])
 db = client[settings.DB_NAME]
 
 # 集合引用
 users_collection = db.get_collection("users")
 pebbles_collection = db.get_collection("pebbles")
-folders_collection = db.get_collection("folders")
\ No newline at end of file
+folders_collection = db.get_collection("folders")
+generation_cache_collection = db.get_collection("generation_cache")
+jobs_collection = db.get_collection("jobs")
+revisions_collection = db.get_collection("revisions")
+
+# ==========================================
+# 事务
+# ==========================================
+_transactions_supported: bool | None = None
+
+async def supports_transactions() -> bool:
+    """副本集 / 分片集群支持多文档事务，单机 mongod 不支持 (结果缓存)"""
+    global _transactions_supported
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions_supported = False
+    return _transactions_supported
+
+async def run_in_transaction(callback):
+    """在事务中执行 callback(session) (遇到临时错误时由驱动整体重试)。
+    单机部署不支持事务时退化为 callback(None)，按顺序直接执行。"""
+    if not await supports_transactions():
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
+
+# ==========================================
+# 连接池预热
+# ==========================================
+async def warm_up_pool(connections: int = settings.MONGO_WARM_CONNECTIONS):
+    """并发发出 ping，让驱动提前完成服务器发现并建立多条连接，
+    滚动重启后第一批请求不用再排队等 TCP / TLS 握手和认证"""
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(connections, 1))))
@@ -0,0 +1,163 @@
+# backend/app/documents.py
+# 各写入路径 (单条 CRUD / 批量同步 / AI 生成) 共用的文档辅助函数
+
+import copy
+import time
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from app.database import pebbles_collection, folders_collection
+from app.models import Pebble, Folder
+from app.search import build_search_terms
+from app.semantic import embed_pebble, to_bson, semantic_index
+from app.versioning import bump_version
+
+# 客户端允许修改的顶层字段；支持点路径，例如 content.ELI5.mainContent.3.body
+UPDATABLE_FIELDS = {
+    "pebble": {"topic", "folderId", "isVerified", "isDeleted", "isUserEdited", "content", "socraticQuestions"},
+    # 文件夹的删除 / 恢复要带上整个子树，只能走 DELETE /folders/{id} 和 /restore (app/folders.py)
+    "folder": {"name", "parentId"},
+}
+
+MODELS = {"pebble": Pebble, "folder": Folder}
+
+# 返回给客户端时排除的内部字段 (索引用的派生数据)
+PUBLIC_PROJECTION = {"_id": 0, "searchTerms": 0, "embedding": 0, "deletedBy": 0}
+# 文件夹：ancestors 是子树查询用的冗余路径，deletedBy 记录级联删除的来源
+FOLDER_PROJECTION = {"_id": 0, "ancestors": 0, "deletedBy": 0}
+
+# 派生字段 (searchTerms / embedding) 依赖的源字段，修改后需要重建
+DERIVED_SOURCE_FIELDS = {"topic", "content"}
+
+
+def now_ms() -> float:
+    return time.time() * 1000
+
+
+def validate_update(kind: str, update_data: dict) -> dict:
+    """校验客户端提交的 $set 内容，返回可直接使用的 dict；非法路径抛 ValueError"""
+    if not update_data:
+        raise ValueError("Empty update")
+    for path in update_data:
+        segments = path.split(".")
+        if any(not seg or seg.startswith("$") for seg in segments):
+            raise ValueError(f"Invalid field path: {path}")
+        if segments[0] not in UPDATABLE_FIELDS[kind]:
+            raise ValueError(f"Field is not updatable: {segments[0]}")
+    return dict(update_data)
+
+
+def _walk(doc, segments: list, path: str, create_leaf: bool):
+    """沿点路径找到叶子的父节点；中间节点必须已存在，数组下标必须在范围内"""
+    target = doc
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if isinstance(target, list):
+            if not segment.isdigit() or int(segment) >= len(target):
+                raise ValueError(f"Index out of range: {path}")
+            if last:
+                return target, int(segment)
+            target = target[int(segment)]
+        elif isinstance(target, dict):
+            if segment not in target and not (last and create_leaf):
+                raise ValueError(f"Field does not exist: {path}")
+            if last:
+                return target, segment
+            target = target[segment]
+        else:
+            raise ValueError(f"Field does not exist: {path}")
+
+
+def apply_update(kind: str, doc: dict, update_data: dict) -> tuple:
+    """在库里的当前内容上按 $set 语义应用 update_data，用模型校验整个结果。
+
+    返回 (更新后的文档, 写入用的 $set)；$set 的值取自校验后的文档 (补齐默认值)。
+    路径不存在、数组越界 (不像 MongoDB 那样用 null 补齐)、类型不符都抛 ValueError，doc 本身不变。
+    """
+    after = copy.deepcopy(doc)
+    for path, value in update_data.items():
+        parent, key = _walk(after, path.split("."), path, create_leaf=True)
+        parent[key] = copy.deepcopy(value)
+    try:
+        validated = MODELS[kind](**after).model_dump()
+    except ValidationError as e:
+        raise ValueError(str(e))
+    update = {}
+    for path in update_data:
+        try:
+            parent, key = _walk(validated, path.split("."), path, create_leaf=False)
+        except ValueError:
+            raise ValueError(f"Unknown field: {path}")
+        update[path] = parent[key]
+        target, target_key = _walk(after, path.split("."), path, create_leaf=False)
+        target[target_key] = copy.deepcopy(parent[key])
+    return after, update
+
+
+def stamp(update_data: dict) -> dict:
+    """写入时打上 updatedAt，供增量同步 (/api/sync/changes) 使用"""
+    return {**update_data, "updatedAt": now_ms()}
+
+
+# --- 派生字段 ---
+
+def derived_fields(doc: dict) -> dict:
+    return {"searchTerms": build_search_terms(doc), "embedding": to_bson(embed_pebble(doc))}
+
+
+def with_derived_fields(doc: dict) -> dict:
+    """写入前给 pebble 文档补上检索词条和语义向量"""
+    doc.update(derived_fields(doc))
+    return doc
+
+
+def touches_derived_fields(update_data: dict) -> bool:
+    return any(path.split(".")[0] in DERIVED_SOURCE_FIELDS for path in update_data)
+
+
+def changes_embeddings(update_data: dict) -> bool:
+    """语义索引只关心向量和删除状态，移动 / 验证等更新不需要更新索引"""
+    return touches_derived_fields(update_data) or "isDeleted" in update_data
+
+
+async def refresh_derived_fields(owner: str, pebble_ids: list):
+    """路径级更新之后从库里读回最新内容重建派生字段 (一次查询 + 一次 bulk_write)"""
+    if not pebble_ids:
+        return
+    docs = await pebbles_collection.find(
+        {"owner_id": owner, "id": {"$in": list(pebble_ids)}}, {"_id": 0, "id": 1, "topic": 1, "content": 1}
+    ).to_list(length=len(pebble_ids))
+    if docs:
+        await pebbles_collection.bulk_write([
+            UpdateOne({"owner_id": owner, "id": d["id"]}, {"$set": derived_fields(d)}) for d in docs
+        ], ordered=False)
+
+
+async def backfill_derived_fields(batch_size: int = 500):
+    """启动时为缺少派生字段的旧文档补建；每批写完给涉及的用户 +1 版本号 (ETag 和语义索引随之失效)"""
+    cursor = pebbles_collection.find(
+        {"$or": [{"searchTerms": {"$exists": False}}, {"embedding": {"$exists": False}}]},
+        {"_id": 1, "owner_id": 1, "topic": 1, "content": 1},
+    ).batch_size(batch_size)
+    batch, owners = [], set()
+
+    async def flush():
+        await pebbles_collection.bulk_write(batch, ordered=False)
+        for owner in owners:
+            await bump_version(owner)
+            await semantic_index.changed(owner)
+        batch.clear()
+        owners.clear()
+
+    async for doc in cursor:
+        batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": derived_fields(doc)}))
+        owners.add(doc.get("owner_id"))
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+
+async def backfill_updated_at():
+    """启动时给没有 updatedAt 的旧文档补上当前时间，增量同步 ($gt 游标) 才能拉到它们"""
+    for collection in (pebbles_collection, folders_collection):
+        await collection.update_many({"updatedAt": {"$exists": False}}, {"$set": {"updatedAt": now_ms()}})
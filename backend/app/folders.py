@@ -0,0 +1,234 @@
+# backend/app/folders.py
+# 文件夹子树操作。每个文件夹存 ancestors (从根到父文件夹的 id 列表)，
+# 配合 {owner_id, ancestors} 多键索引，子树查询是一次索引等值匹配，代价 O(子树大小)
+
+from pymongo import UpdateOne
+from app.database import folders_collection, pebbles_collection, run_in_transaction
+from app.documents import stamp, now_ms
+from app.versioning import bump_version
+
+
+class FolderTreeError(ValueError):
+    pass
+
+
+async def ancestors_for(owner: str, parent_id: str | None, session=None) -> list:
+    """新建 / 移动到 parent_id 下时的 ancestors"""
+    if parent_id is None:
+        return []
+    parent = await folders_collection.find_one(
+        {"id": parent_id, "owner_id": owner}, {"_id": 0, "ancestors": 1}, session=session
+    )
+    if parent is None:
+        return []
+    return parent.get("ancestors", []) + [parent_id]
+
+
+async def subtree_ids(owner: str, folder_id: str, session=None) -> list:
+    cursor = folders_collection.find({"owner_id": owner, "ancestors": folder_id}, {"_id": 0, "id": 1}, session=session)
+    return [folder_id] + [d["id"] async for d in cursor]
+
+
+async def _rewrite_subtree(owner: str, folder_id: str, parent_id: str | None, prefix: list, session=None):
+    """把 folder_id 挂到 parent_id 下，并把所有后代 ancestors 中 folder_id 之前的部分替换为 prefix。
+    新的 ancestors 在内存里算好 (和 backfill_folder_ancestors 一样)，一次 bulk_write 写回"""
+    updated_at = now_ms()
+    writes = [UpdateOne(
+        {"id": folder_id, "owner_id": owner},
+        {"$set": {"parentId": parent_id, "ancestors": prefix, "updatedAt": updated_at}},
+    )]
+    cursor = folders_collection.find(
+        {"owner_id": owner, "ancestors": folder_id}, {"_id": 0, "id": 1, "ancestors": 1}, session=session
+    )
+    async for d in cursor:
+        # ancestors = prefix + [folder_id] + 原 ancestors 中 folder_id 之后的部分
+        tail = d["ancestors"][d["ancestors"].index(folder_id) + 1:]
+        writes.append(UpdateOne(
+            {"id": d["id"], "owner_id": owner},
+            {"$set": {"ancestors": prefix + [folder_id] + tail, "updatedAt": updated_at}},
+        ))
+    await folders_collection.bulk_write(writes, ordered=False, session=session)
+
+
+async def move_subtree(owner: str, folder_id: str, parent_id: str | None) -> dict:
+    async def _move(session):
+        folder = await folders_collection.find_one(
+            {"id": folder_id, "owner_id": owner, "isDeleted": {"$ne": True}}, {"_id": 0, "id": 1}, session=session
+        )
+        if folder is None:
+            raise LookupError("Folder not found")
+        if parent_id is not None:
+            target = await folders_collection.find_one(
+                {"id": parent_id, "owner_id": owner, "isDeleted": {"$ne": True}},
+                {"_id": 0, "ancestors": 1}, session=session,
+            )
+            if target is None:
+                raise LookupError("Target folder not found")
+            if parent_id == folder_id or folder_id in target.get("ancestors", []):
+                raise FolderTreeError("Cannot move a folder into its own subtree")
+        prefix = await ancestors_for(owner, parent_id, session)
+        await _rewrite_subtree(owner, folder_id, parent_id, prefix, session)
+        return {"id": folder_id, "parentId": parent_id, "ancestors": prefix}
+
+    return await run_in_transaction(_move)
+
+
+async def folder_parents(owner: str) -> dict:
+    """{id: [parentId, isDeleted]}，批量同步在内存里按提交顺序校验移动"""
+    cursor = folders_collection.find({"owner_id": owner}, {"_id": 0, "id": 1, "parentId": 1, "isDeleted": 1})
+    return {d["id"]: [d.get("parentId"), d.get("isDeleted", False)] async for d in cursor}
+
+
+def check_move(parents: dict, folder_id: str, parent_id: str | None):
+    """与 move_subtree 相同的校验，作用于 folder_parents 的结果；校验通过后由调用方更新 parents"""
+    if folder_id not in parents or parents[folder_id][1]:
+        raise LookupError("Folder not found")
+    if parent_id is None:
+        return
+    if parent_id not in parents or parents[parent_id][1]:
+        raise LookupError("Target folder not found")
+    current, seen = parent_id, set()
+    while current is not None and current not in seen:
+        if current == folder_id:
+            raise FolderTreeError("Cannot move a folder into its own subtree")
+        seen.add(current)
+        current = parents.get(current, [None])[0]
+
+
+async def delete_subtree(owner: str, folder_id: str) -> dict:
+    """软删除文件夹、所有子文件夹和其中的 pebbles。用 deletedBy 记住是哪次删除，restore 时只恢复这些"""
+    async def _delete(session):
+        ids = await subtree_ids(owner, folder_id, session)
+        marker = stamp({"isDeleted": True, "deletedBy": folder_id})
+        folders = await folders_collection.update_many(
+            {"owner_id": owner, "id": {"$in": ids}, "isDeleted": {"$ne": True}}, {"$set": marker}, session=session
+        )
+        if folders.matched_count == 0:
+            raise LookupError("Folder not found")
+        pebbles = await pebbles_collection.update_many(
+            {"owner_id": owner, "folderId": {"$in": ids}, "isDeleted": False}, {"$set": marker}, session=session
+        )
+        return {"folders": folders.modified_count, "pebbles": pebbles.modified_count}
+
+    return await run_in_transaction(_delete)
+
+
+async def restore_subtree(owner: str, folder_id: str) -> dict:
+    async def _restore(session):
+        update = {"$set": stamp({"isDeleted": False}), "$unset": {"deletedBy": ""}}
+        folders = await folders_collection.update_many({"owner_id": owner, "deletedBy": folder_id}, update, session=session)
+        if folders.matched_count == 0:
+            raise LookupError("Nothing to restore")
+        pebbles = await pebbles_collection.update_many({"owner_id": owner, "deletedBy": folder_id}, update, session=session)
+
+        # 原来的父文件夹已不存在 / 已删除时，恢复到根目录
+        folder = await folders_collection.find_one({"id": folder_id, "owner_id": owner}, {"_id": 0, "parentId": 1}, session=session)
+        parent_id = folder.get("parentId")
+        if parent_id is not None:
+            parent = await folders_collection.find_one(
+                {"id": parent_id, "owner_id": owner, "isDeleted": {"$ne": True}}, {"_id": 1}, session=session
+            )
+            if parent is None:
+                await _rewrite_subtree(owner, folder_id, None, [], session)
+                parent_id = None
+        return {"folders": folders.modified_count, "pebbles": pebbles.modified_count, "parentId": parent_id}
+
+    return await run_in_transaction(_restore)
+
+
+async def ungroup(owner: str, folder_id: str) -> str | None:
+    """把文件夹的 pebbles 和子文件夹上移一级，再软删除该文件夹；返回新的父级 id"""
+    async def _ungroup(session):
+        folder = await folders_collection.find_one({"id": folder_id, "owner_id": owner}, session=session)
+        if folder is None:
+            raise LookupError("Folder not found")
+        target_parent_id = folder.get("parentId")
+
+        await pebbles_collection.update_many(
+            {"folderId": folder_id, "owner_id": owner},
+            {"$set": stamp({"folderId": target_parent_id})}, session=session,
+        )
+        await folders_collection.update_many(
+            {"parentId": folder_id, "owner_id": owner},
+            {"$set": stamp({"parentId": target_parent_id})}, session=session,
+        )
+        # 整个子树的 ancestors 去掉这一层
+        await folders_collection.update_many(
+            {"ancestors": folder_id, "owner_id": owner},
+            {"$pull": {"ancestors": folder_id}, "$set": {"updatedAt": now_ms()}}, session=session,
+        )
+        await folders_collection.update_one(
+            {"id": folder_id, "owner_id": owner},
+            {"$set": stamp({"isDeleted": True})}, session=session,
+        )
+        return target_parent_id
+
+    return await run_in_transaction(_ungroup)
+
+
+async def recursive_counts(owner: str, root: str | None = None) -> dict:
+    """每个文件夹 (含所有子文件夹) 下未删除的 pebble 数。
+
+    先按 folderId 分组计数，再一次读出这些文件夹的 ancestors，在内存里把计数累加到所有祖先上；
+    指定 root 时只统计该子树。
+    """
+    match = {"owner_id": owner, "isDeleted": False}
+    if root is not None:
+        match["folderId"] = {"$in": await subtree_ids(owner, root)}
+    else:
+        match["folderId"] = {"$ne": None}
+
+    pipeline = [{"$match": match}, {"$group": {"_id": "$folderId", "n": {"$sum": 1}}}]
+    direct = {d["_id"]: d["n"] async for d in pebbles_collection.aggregate(pipeline)}
+    cursor = folders_collection.find(
+        {"owner_id": owner, "id": {"$in": list(direct)}}, {"_id": 0, "id": 1, "ancestors": 1}
+    )
+    ancestors = {d["id"]: d.get("ancestors", []) async for d in cursor}
+
+    counts = {}
+    for folder_id, n in direct.items():
+        for path_id in ancestors.get(folder_id, []) + [folder_id]:
+            counts[path_id] = counts.get(path_id, 0) + n
+    if root is not None:
+        # 子树之外的祖先只计入了子树内的 pebbles，不返回
+        keep = set(match["folderId"]["$in"])
+        counts = {k: v for k, v in counts.items() if k in keep}
+    return counts
+
+
+async def repair_ancestors(owner: str, folder_ids: list):
+    """批量同步里创建 / 移动了文件夹之后，按 parentId 重新计算这些文件夹子树的 ancestors"""
+    for folder_id in folder_ids:
+        folder = await folders_collection.find_one({"id": folder_id, "owner_id": owner}, {"_id": 0, "parentId": 1})
+        if folder is None:
+            continue
+        prefix = await ancestors_for(owner, folder.get("parentId"))
+        if folder_id in prefix:
+            # 移动进了自己的子树 (产生环)，保持原状
+            continue
+        await _rewrite_subtree(owner, folder_id, folder.get("parentId"), prefix)
+
+
+async def backfill_folder_ancestors(batch_size: int = 500, owners: list | None = None):
+    """启动时为缺少 ancestors 的旧文件夹补建 (按用户在内存里沿 parentId 向上走)；
+    指定 owners 时重建这些用户所有文件夹的 ancestors (例如导入档案之后)"""
+    if owners is None:
+        owners = await folders_collection.distinct("owner_id", {"ancestors": {"$exists": False}})
+    for owner in owners:
+        parents = {
+            d["id"]: d.get("parentId")
+            async for d in folders_collection.find({"owner_id": owner}, {"_id": 0, "id": 1, "parentId": 1})
+        }
+        batch = []
+        for folder_id in parents:
+            chain, current = [], parents[folder_id]
+            while current is not None and current in parents and current not in chain and current != folder_id:
+                chain.append(current)
+                current = parents[current]
+            batch.append(UpdateOne({"id": folder_id, "owner_id": owner}, {"$set": {"ancestors": chain[::-1]}}))
+            if len(batch) >= batch_size:
+                await folders_collection.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await folders_collection.bulk_write(batch, ordered=False)
+        await bump_version(owner)
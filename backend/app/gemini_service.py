@@ -1,66 +1,52 @@
 # backend/app/gemini_service.py (或 ai_service.py)
 
+import asyncio
+import hashlib
 import json
+import logging
 import uuid
 import time
-import google.generativeai as genai
-from openai import AsyncOpenAI
+from cachetools import LRUCache
 from app.database import settings
-from app.models import Pebble, LevelContent, MainBlock, SidebarBlock
+from app.providers import provider_registry
+from app.provider_router import provider_router
+from app.metrics import cache_requests, parse_latency
+from app.cache import generation_cache, make_generation_key
+from app.stream_parser import IncrementalJSONParser
+from app.models import (
+    Pebble, MainBlock, SidebarBlock, GeneratedArtifact, RewriteBatchOutput,
+    normalize_main_block, normalize_sidebar_block,
+)
+
+logger = logging.getLogger(__name__)
 
 # ==========================================
-# 1. 通用辅助函数 (数据清洗) - 保持不变
+# 1. 通用辅助函数 (解析 AI 输出)
 # ==========================================
-def _process_json_to_pebble(data: dict, topic: str) -> Pebble:
-    """将 AI 返回的原始 JSON 转换为标准的 Pebble 对象"""
-    
-    def sanitize_sidebar_block(sb: dict) -> SidebarBlock:
-        if 'heading' not in sb: sb['heading'] = sb.get('title', "Info")
-        valid_types = ['definition', 'profile', 'stat']
-        if 'type' not in sb or sb['type'] not in valid_types: sb['type'] = 'definition'
-        if 'body' not in sb: sb['body'] = sb.get('description', '') or "No content"
-        return SidebarBlock(**sb)
-
-    def process_content(content_data):
-        main_blocks = []
-        for b in content_data.get('mainContent', []):
-            if b.get('type') == 'key_points' and isinstance(b.get('body'), str):
-                b['body'] = [s.strip() for s in b['body'].split('|')]
-            if 'iconType' not in b: b['iconType'] = 'default'
-            main_blocks.append(MainBlock(**b))
-        
-        sidebar_blocks = []
-        for sb in content_data.get('sidebarContent', []):
-            try:
-                sidebar_blocks.append(sanitize_sidebar_block(sb))
-            except Exception:
-                pass
-
-        # 移除已处理字段，防止传参冲突
-        clean_data = {k: v for k, v in content_data.items() if k not in ['mainContent', 'sidebarContent']}
-        
-        return LevelContent(
-            **clean_data,
-            mainContent=main_blocks,
-            sidebarContent=sidebar_blocks
-        )
-
-    return Pebble(
+def _to_pebble(artifact: GeneratedArtifact, topic: str) -> Pebble:
+    # artifact 已经通过 schema 校验，model_construct 跳过第二次校验
+    return Pebble.model_construct(
         id=str(uuid.uuid4()),
         topic=topic,
         timestamp=time.time() * 1000,
-        content={
-            "ELI5": process_content(data.get('eli5_content', {})),
-            "ACADEMIC": process_content(data.get('academic_content', {}))
-        },
-        socraticQuestions=data.get('socratic_questions', [])
+        content={"ELI5": artifact.eli5_content, "ACADEMIC": artifact.academic_content},
+        socraticQuestions=artifact.socratic_questions,
     )
 
-def _build_prompt(topic: str, context_pebbles: list) -> str:
+def _parse_artifact(text: str, topic: str) -> Pebble:
+    """将 AI 返回的原始 JSON 文本解析为 Pebble (去掉根对象前后的 markdown 围栏等内容)"""
+    started = time.perf_counter()
+    raw = text[text.index('{'):text.rindex('}') + 1]
+    pebble = _to_pebble(GeneratedArtifact.model_validate_json(raw), topic)
+    parse_latency.observe(time.perf_counter() - started, "artifact")
+    return pebble
+
+def _build_prompt(topic: str, context_nodes: list) -> str:
+    # context_nodes 由 app/context.py 组装，已经去重并控制在 token 预算内
     context_str = ""
-    if context_pebbles:
+    if context_nodes:
         context_str = "CONTEXT NODES:\n" + "\n".join(
-            [f"- {p['topic']}: {p['content']['ELI5']['summary']}" for p in context_pebbles]
+            [f"- {c['topic']}: {c['summary']}" for c in context_nodes]
         )
         
     return f"""
@@ -85,161 +71,275 @@ def _build_prompt(topic: str, context_pebbles: list) -> str:
     """
 
 # ==========================================
-# 2. DeepSeek 实现
+# 2. Provider 调用 (SDK 在第一次选用时才导入，见 app/providers)
 # ==========================================
-async def _generate_with_deepseek(topic: str, context_pebbles: list) -> Pebble:
-    client = AsyncOpenAI(api_key=settings.DEEPSEEK_API_KEY, base_url=settings.DEEPSEEK_BASE_URL)
-    prompt = _build_prompt(topic, context_pebbles)
-    
-    response = await client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": "You output VALID JSON only."},
-            {"role": "user", "content": prompt},
-        ],
-        response_format={ "type": "json_object" },
-        temperature=1.3,
-    )
-    
-    content_str = response.choices[0].message.content
-    if content_str.startswith("```json"):
-        content_str = content_str.replace("```json", "").replace("```", "")
-        
-    return _process_json_to_pebble(json.loads(content_str), topic)
-
-async def _rewrite_with_deepseek(text: str, instruction: str) -> str:
-    client = AsyncOpenAI(api_key=settings.DEEPSEEK_API_KEY, base_url=settings.DEEPSEEK_BASE_URL)
-    response = await client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": "You are an expert editor. Output ONLY the rewritten text."},
-            {"role": "user", "content": f"Instruction: {instruction}\n\nOriginal: {text}"},
-        ],
-        temperature=0.7,
-    )
-    return response.choices[0].message.content.strip()
+def _calls(method: str, *args, then=None) -> dict:
+    """每个已注册 provider 一个无参协程工厂，交给 provider_router 选择 / 切换。
+
+    then 在工厂内部执行 (例如解析 artifact)，解析失败也会计为该 provider 失败并切到下一个。
+    """
+    async def call(name: str):
+        provider = await provider_registry.load(name)
+        result = await getattr(provider, method)(*args)
+        return then(result) if then else result
+    return {name: (lambda name=name: call(name)) for name in provider_registry.names()}
+
+def _streams(prompt: str) -> dict:
+    async def stream(name: str):
+        provider = await provider_registry.load(name)
+        async for chunk in provider.stream(prompt):
+            yield chunk
+    return {name: (lambda name=name: stream(name)) for name in provider_registry.names()}
 
 # ==========================================
-# 3. Gemini 实现 (增强修复版)
+# 3. 并发合并 (Single-flight)
 # ==========================================
-async def _generate_with_gemini(topic: str, context_pebbles: list) -> Pebble:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    
-    # 尝试不同的模型名称，防止版本差异
-    model_candidates = ['gemini-2.5-flash', 'gemini-1.5-flash-latest', 'gemini-1.5-pro']
-    model = None
-    
-    for model_name in model_candidates:
-        try:
-            model = genai.GenerativeModel(
-                model_name,
-                generation_config={"response_mime_type": "application/json"}
-            )
-            break
-        except Exception:
-            continue
-            
-    if not model:
-        # 如果还没找到，回退到默认并去掉 json 配置（防止旧库报错）
-        print("Warning: Could not configure JSON mode for Gemini 1.5. Falling back to default.")
-        model = genai.GenerativeModel('gemini-pro')
-
-    prompt = _build_prompt(topic, context_pebbles)
-    
-    try:
-        response = await model.generate_content_async(prompt)
-        text = response.text
-        # 清理可能存在的 markdown (如果回退到了非 JSON 模式)
-        if text.startswith("```json"):
-            text = text.replace("```json", "").replace("```", "")
-        return _process_json_to_pebble(json.loads(text), topic)
-        
-    except Exception as e:
-        # ★★★ 调试：列出可用模型，方便排查 404 错误 ★★★
-        print(f"\n--- GEMINI ERROR DEBUG ---")
-        print(f"Error: {e}")
-        try:
-            print("Available models for your key:")
-            for m in genai.list_models():
-                if 'generateContent' in m.supported_generation_methods:
-                    print(f"- {m.name}")
-        except:
-            print("Could not list models.")
-        print(f"--------------------------\n")
-        raise e
+# key -> [正在进行的 provider 调用, 当前等待者数量]
+_inflight: dict = {}
 
-async def _rewrite_with_gemini(text: str, instruction: str) -> str:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    
-    # ★★★ 修复：增加模型回退机制 (同 generate 函数) ★★★
-    model_candidates = ['gemini-2.5-flash', 'gemini-1.5-flash-latest', 'gemini-1.5-pro', 'gemini-pro']
-    model = None
-    
-    for model_name in model_candidates:
-        try:
-            # 尝试初始化模型
-            m = genai.GenerativeModel(model_name)
-            # 这是一个轻量级检查，如果模型名不对，有些库版本会在调用时才报错
-            # 但我们在下面 try-catch 调用 generate_content_async
-            model = m
-            break
-        except Exception:
-            continue
-    
-    # 如果没找到，兜底使用 gemini-pro
-    if not model:
-        model = genai.GenerativeModel('gemini-pro')
+async def _single_flight(key: str, factory):
+    """相同 key 的并发请求只发起一次 provider 调用，所有等待者共享结果或异常。
 
-    prompt = f"""
-    You are an expert editor. 
-    Instruction: {instruction}
-    
-    Original Text:
-    {text}
-    
-    Output ONLY the rewritten text. No preamble.
+    单个等待者被取消 (例如客户端断开) 不会取消共享调用；
+    只有当所有等待者都离开时才取消底层调用。
     """
-    
+    entry = _inflight.get(key)
+    if entry is None:
+        task = asyncio.ensure_future(factory())
+        entry = [task, 0]
+        _inflight[key] = entry
+
+        def _cleanup(t, key=key, entry=entry):
+            if _inflight.get(key) is entry:
+                del _inflight[key]
+            # 标记异常已被读取，避免无人等待时出现 "exception was never retrieved"
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_cleanup)
+
+    task = entry[0]
+    entry[1] += 1
     try:
-        response = await model.generate_content_async(prompt)
-        return response.text.strip()
-    except Exception as e:
-        print(f"Gemini Rewrite Error: {e}")
-        # 如果还是失败，抛出异常，但在日志里能看到具体原因
-        raise e
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if entry[1] == 1 and not task.done():
+            if _inflight.get(key) is entry:
+                del _inflight[key]
+            task.cancel()
+        raise
+    finally:
+        entry[1] -= 1
+
+def _rewrite_key(text: str, instruction: str, provider: str) -> str:
+    return hashlib.sha256(f"{provider}\0{instruction}\0{text}".encode("utf-8")).hexdigest()
 
 # ==========================================
 # 4. 主入口
 # ==========================================
-async def generate_pebble_logic(topic: str, context_pebbles: list) -> Pebble:
+async def generate_pebble_logic(topic: str, context_nodes: list, use_cache: bool = True) -> Pebble:
     provider = settings.AI_PROVIDER.lower()
-    print(f"🌊 Generating using Provider: {provider.upper()}")
-    
+
+    # 先查生成缓存 (内容寻址：主题 + 上下文节点 + provider)
+    cache_key = make_generation_key(topic, context_nodes, provider)
+    if use_cache:
+        cached = await generation_cache.get(cache_key)
+        if cached:
+            return cached
+    else:
+        generation_cache.record_bypass()
+
+    async def _call_provider() -> Pebble:
+        logger.info("generate", extra={"provider": provider, "context_nodes": len(context_nodes)})
+        # 限流 / 重试 / 熔断 / 故障切换见 app/provider_router.py
+        try:
+            prompt = _build_prompt(topic, context_nodes)
+            pebble = await provider_router.call(
+                _calls("generate", prompt, then=lambda text: _parse_artifact(text, topic))
+            )
+        except Exception as e:
+            logger.warning("generate failed", extra={"provider": provider, "error": repr(e)})
+            raise e
+
+        await generation_cache.set(cache_key, pebble)
+        return pebble
+
+    pebble = await _single_flight(f"generate:{cache_key}", _call_provider)
+    # 合并后的等待者拿到的是同一个对象，每人复制一份并分配新 id，避免入库时冲突
+    return pebble.model_copy(
+        update={"id": str(uuid.uuid4()), "timestamp": time.time() * 1000}, deep=True
+    )
+
+# 流式生成中需要尽早推送给前端的 JSON 路径
+_LEVEL_KEYS = {"eli5_content": "ELI5", "academic_content": "ACADEMIC"}
+_LEVEL_FIELDS = {"title", "summary", "emojiCollage", "keywords"}
+
+def _want_stream_path(path: tuple) -> bool:
+    if path and path[0] in _LEVEL_KEYS:
+        if len(path) == 2:
+            return path[1] in _LEVEL_FIELDS
+        return len(path) == 3 and path[1] in ("mainContent", "sidebarContent")
+    return len(path) == 2 and path[0] == "socratic_questions"
+
+def _stream_event(path: tuple, value):
+    """把解析出的 (path, value) 转成推送给前端的事件；无法识别/校验失败的返回 None"""
+    if path[0] == "socratic_questions":
+        return {"event": "socratic_question", "index": path[1], "value": value}
+
+    level = _LEVEL_KEYS[path[0]]
+    if len(path) == 2:
+        return {"event": "field", "level": level, "field": path[1], "value": value}
     try:
-        if provider == 'deepseek':
-            return await _generate_with_deepseek(topic, context_pebbles)
-        else:
-            return await _generate_with_gemini(topic, context_pebbles)
+        if path[1] == "mainContent":
+            block = MainBlock.model_validate(normalize_main_block(value))
+            return {"event": "main_block", "level": level, "index": path[2], "block": block.model_dump()}
+        block = SidebarBlock.model_validate(normalize_sidebar_block(value))
+        return {"event": "sidebar_block", "level": level, "index": path[2], "block": block.model_dump()}
+    except Exception:
+        return None
+
+async def stream_pebble_logic(topic: str, context_nodes: list, use_cache: bool = True):
+    """流式生成：边消费 provider 的 token 流边推送已完成的 LevelContent 片段。
+
+    依次 yield 事件 dict，最后一个事件为 {"event": "done", "pebble": Pebble}。
+    """
+    provider = settings.AI_PROVIDER.lower()
+
+    cache_key = make_generation_key(topic, context_nodes, provider)
+    if use_cache:
+        cached = await generation_cache.get(cache_key)
+        if cached:
+            yield {"event": "done", "pebble": cached}
+            return
+    else:
+        generation_cache.record_bypass()
+
+    logger.info("generate stream", extra={"provider": provider, "context_nodes": len(context_nodes)})
+    prompt = _build_prompt(topic, context_nodes)
+    chunks = provider_router.stream(_streams(prompt))
+    parser = IncrementalJSONParser(_want_stream_path)
+
+    try:
+        async for chunk in chunks:
+            for path, value in parser.feed(chunk):
+                event = _stream_event(path, value)
+                if event:
+                    yield event
+        pebble = _parse_artifact(parser.text, topic)
     except Exception as e:
-        print(f"AI Generation Error ({provider}): {e}")
+        logger.warning("generate stream failed", extra={"provider": provider, "error": repr(e)})
         raise e
 
+    await generation_cache.set(cache_key, pebble)
+    yield {"event": "done", "pebble": pebble}
+
+REWRITE_INSTRUCTIONS = {
+    "improve": "Rewrite to be more clear, professional, and engaging.",
+    "shorter": "Summarize concisely. Remove fluff.",
+    "longer": "Expand with more detail and context.",
+    "simplify": "Explain like I'm 5 years old."
+}
+
+# 改写结果缓存：key = hash(原文, 指令, provider)，LRU 淘汰
+rewrite_cache = LRUCache(maxsize=settings.REWRITE_CACHE_SIZE)
+
 async def rewrite_text_logic(text: str, mode: str) -> str:
-    instructions = {
-        "improve": "Rewrite to be more clear, professional, and engaging.",
-        "shorter": "Summarize concisely. Remove fluff.",
-        "longer": "Expand with more detail and context.",
-        "simplify": "Explain like I'm 5 years old."
-    }
-    instruction = instructions.get(mode, instructions["improve"])
+    instruction = REWRITE_INSTRUCTIONS.get(mode, REWRITE_INSTRUCTIONS["improve"])
     
     provider = settings.AI_PROVIDER.lower()
-    
+    key = _rewrite_key(text, instruction, provider)
+    cached = rewrite_cache.get(key)
+    cache_requests.inc("rewrite", "miss" if cached is None else "hit")
+    if cached is not None:
+        return cached
+
+    async def _call_provider() -> str:
+        try:
+            return await provider_router.call(_calls("rewrite", text, instruction))
+        except Exception as e:
+            logger.warning("rewrite failed", extra={"provider": provider, "error": repr(e)})
+            raise e
+
+    result = await _single_flight(f"rewrite:{key}", _call_provider)
+    rewrite_cache[key] = result
+    return result
+
+def _pack(items: list) -> list:
+    """把待改写条目 [(下标, 原文, mode)] 按条数 / 总字符数上限装箱，每箱一次 provider 调用"""
+    packs, current, size = [], [], 0
+    for item in items:
+        length = len(item[1])
+        if current and (len(current) >= settings.REWRITE_PACK_MAX_ITEMS or size + length > settings.REWRITE_PACK_MAX_CHARS):
+            packs.append(current)
+            current, size = [], 0
+        current.append(item)
+        size += length
+    if current:
+        packs.append(current)
+    return packs
+
+async def _rewrite_pack(pack: list) -> dict:
+    """一次结构化输出调用改写一箱条目，返回 {下标: 新文本}；缺失 / 无法解析的条目不在结果里"""
+    if len(pack) == 1:
+        index, text, mode = pack[0]
+        return {index: await rewrite_text_logic(text, mode)}
+
+    modes = sorted({mode for _, _, mode in pack})
+    payload = json.dumps(
+        {"items": [{"id": index, "mode": mode, "text": text} for index, text, mode in pack]},
+        ensure_ascii=False,
+    )
+    prompt = f"""
+    You are an expert editor. Rewrite each item's text according to its mode:
+    {json.dumps({m: REWRITE_INSTRUCTIONS[m] for m in modes}, ensure_ascii=False)}
+
+    Input:
+    {payload}
+
+    OUTPUT MUST BE RAW JSON: {{"items": [{{"id": <same id>, "text": "<rewritten text>"}}]}}
+    Keep every id. Output ONLY the rewritten text in each item. No preamble.
+    """
+    raw = await provider_router.call(_calls("rewrite_batch", prompt))
     try:
-        if provider == 'deepseek':
-            return await _rewrite_with_deepseek(text, instruction)
-        else:
-            return await _rewrite_with_gemini(text, instruction)
-    except Exception as e:
-        print(f"Rewrite Error ({provider}): {e}")
-        raise e
\ No newline at end of file
+        output = RewriteBatchOutput.model_validate_json(raw[raw.index('{'):raw.rindex('}') + 1])
+    except ValueError as e:
+        logger.warning("rewrite batch output invalid", extra={"items": len(pack), "error": str(e)})
+        return {}
+    expected = {index for index, _, _ in pack}
+    return {item.id: item.text.strip() for item in output.items if item.id in expected}
+
+async def rewrite_batch_logic(items: list) -> list:
+    """items: [(原文, mode)]，返回同顺序的改写结果。
+
+    先查缓存并去重，剩余条目装箱后每箱一次结构化输出调用，箱之间并发 (REWRITE_CONCURRENCY)；
+    某箱返回缺失的条目再逐条单独改写。
+    """
+    provider = settings.AI_PROVIDER.lower()
+    modes = [mode if mode in REWRITE_INSTRUCTIONS else "improve" for _, mode in items]
+    keys = [_rewrite_key(text, REWRITE_INSTRUCTIONS[mode], provider) for (text, _), mode in zip(items, modes)]
+
+    results = {key: rewrite_cache[key] for key in keys if key in rewrite_cache}
+    cache_requests.inc("rewrite", "hit", amount=len(results))
+    cache_requests.inc("rewrite", "miss", amount=len(set(keys)) - len(results))
+    pending = {}
+    for index, key in enumerate(keys):
+        if key not in results and key not in pending:
+            pending[key] = (index, items[index][0], modes[index])
+
+    semaphore = asyncio.Semaphore(settings.REWRITE_CONCURRENCY)
+
+    async def _limited(fn, *args):
+        async with semaphore:
+            return await fn(*args)
+
+    done = {}
+    for rewritten in await asyncio.gather(*(_limited(_rewrite_pack, pack) for pack in _pack(list(pending.values())))):
+        done.update(rewritten)
+    missing = [item for item in pending.values() if item[0] not in done]
+    if missing:
+        singles = await asyncio.gather(*(_limited(rewrite_text_logic, text, mode) for _, text, mode in missing))
+        done.update({item[0]: text for item, text in zip(missing, singles)})
+
+    for key, (index, _, _) in pending.items():
+        results[key] = rewrite_cache[key] = done[index]
+    return [results[key] for key in keys]
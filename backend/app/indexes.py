@@ -0,0 +1,74 @@
+# backend/app/indexes.py
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# 每个集合需要的索引，对应各路由的查询模式 (见 scripts/check_query_plans.py)
+INDEXES = {
+    "users": [
+        # get_current_user / login / register: {username}
+        IndexModel([("username", ASCENDING)], unique=True, name="username_unique"),
+    ],
+    "pebbles": [
+        # get_pebbles: {owner_id, isDeleted} + 按 (timestamp, id) 倒序分页
+        IndexModel(
+            [("owner_id", ASCENDING), ("isDeleted", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+            name="owner_active_timeline",
+        ),
+        # update / delete / by-ids: {id, owner_id}
+        IndexModel([("owner_id", ASCENDING), ("id", ASCENDING)], unique=True, name="owner_pebble_id"),
+        # ungroup: {folderId, owner_id}
+        IndexModel([("owner_id", ASCENDING), ("folderId", ASCENDING)], name="owner_folder"),
+        # 文件夹子树删除 / 恢复: {owner_id, deletedBy}
+        IndexModel(
+            [("owner_id", ASCENDING), ("deletedBy", ASCENDING)],
+            partialFilterExpression={"deletedBy": {"$exists": True}}, name="owner_deleted_by",
+        ),
+        # search: {owner_id, isDeleted, searchTerms.t 前缀}
+        IndexModel([("owner_id", ASCENDING), ("searchTerms.t", ASCENDING)], name="owner_search_terms"),
+        # sync/changes: {owner_id, updatedAt} + 按 (updatedAt, id) 翻页
+        IndexModel([("owner_id", ASCENDING), ("updatedAt", ASCENDING), ("id", ASCENDING)], name="owner_changes"),
+    ],
+    "folders": [
+        IndexModel([("owner_id", ASCENDING), ("id", ASCENDING)], unique=True, name="owner_folder_id"),
+        # ungroup: {parentId, owner_id}
+        IndexModel([("owner_id", ASCENDING), ("parentId", ASCENDING)], name="owner_parent"),
+        # 子树查询: {owner_id, ancestors} (多键)
+        IndexModel([("owner_id", ASCENDING), ("ancestors", ASCENDING)], name="owner_ancestors"),
+        IndexModel(
+            [("owner_id", ASCENDING), ("deletedBy", ASCENDING)],
+            partialFilterExpression={"deletedBy": {"$exists": True}}, name="owner_deleted_by",
+        ),
+        IndexModel([("owner_id", ASCENDING), ("updatedAt", ASCENDING), ("id", ASCENDING)], name="owner_changes"),
+    ],
+    "jobs": [
+        # 查询状态 {id, owner_id} / 领取任务 {id, status}
+        IndexModel([("id", ASCENDING)], unique=True, name="job_id"),
+        # 每个用户的活跃任务数: {owner_id, status}
+        IndexModel([("owner_id", ASCENDING), ("status", ASCENDING)], name="owner_status"),
+        # 启动时恢复: {status, leaseUntil} / 按 createdAt 重新入队
+        IndexModel([("status", ASCENDING), ("createdAt", ASCENDING)], name="status_created"),
+        IndexModel([("expiresAt", ASCENDING)], expireAfterSeconds=0, name="expires_ttl"),
+    ],
+    "revisions": [
+        # 最新一条 / 列表 / 重建: {owner_id, pebbleId} + seq 范围
+        IndexModel(
+            [("owner_id", ASCENDING), ("pebbleId", ASCENDING), ("seq", DESCENDING)],
+            unique=True, name="owner_pebble_seq",
+        ),
+        # 后台合并: {compacted: False, createdAt < cutoff}
+        IndexModel(
+            [("compacted", ASCENDING), ("createdAt", ASCENDING)],
+            partialFilterExpression={"compacted": False}, name="compaction_pending",
+        ),
+    ],
+    "generation_cache": [
+        # 过期条目由 MongoDB TTL 线程自动清理
+        IndexModel([("expiresAt", ASCENDING)], expireAfterSeconds=0, name="expires_ttl"),
+    ],
+}
+
+
+async def ensure_indexes(db):
+    """幂等地创建所有索引；规格相同的索引已存在时 MongoDB 不做任何事"""
+    for collection_name, models in INDEXES.items():
+        await db.get_collection(collection_name).create_indexes(models)
@@ -0,0 +1,211 @@
+# backend/app/jobs.py
+# 后台生成任务：请求立即返回任务 id，生成在进程内的 worker 池里执行，状态和结果持久化在 jobs 集合
+
+import asyncio
+import uuid
+import weakref
+from collections import deque
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from app.database import settings, jobs_collection, pebbles_collection
+from app.models import Pebble
+from app.context import assemble_context
+from app.gemini_service import generate_pebble_logic
+from app.documents import now_ms, with_derived_fields
+from app.semantic import semantic_index
+from app.versioning import bump_version
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed")
+JOB_PROJECTION = {"_id": 0, "owner_id": 0, "leaseUntil": 0, "expiresAt": 0, "params": 0}
+
+
+class TooManyJobs(Exception):
+    pass
+
+
+async def generate_and_save(owner: str, topic: str, context_ids: list, auto_context: bool, no_cache: bool) -> Pebble:
+    """组装上下文 -> 调用 AI 生成 -> 入库 (/generate 和后台任务共用)"""
+    context_nodes = await assemble_context(owner, topic, context_ids, auto=auto_context)
+    new_pebble = await generate_pebble_logic(topic, context_nodes, use_cache=not no_cache)
+    new_pebble.owner_id = owner
+    new_pebble.updatedAt = now_ms()
+    await pebbles_collection.insert_one(with_derived_fields(new_pebble.model_dump()))
+    await bump_version(owner)
+    await semantic_index.changed(owner, [new_pebble.id])
+    return new_pebble
+
+
+async def run_generation_job(job: dict) -> Pebble:
+    return await generate_and_save(job["owner_id"], job["topic"], **job["params"])
+
+
+class JobQueue:
+    """按用户公平排队的 asyncio worker 池。
+
+    每个用户一条队列，worker 在用户之间轮转取任务，单个用户提交大量任务不会饿死其他人。
+    领取任务时在 Mongo 里原子地把 queued 改成 running 并写入租约，多个进程不会重复执行；
+    启动时把租约过期的 running 任务和所有 queued 任务重新入队。
+    runner 可替换 (测试时换成不调用真实 provider 的实现)。
+    """
+
+    def __init__(self, runner, workers: int):
+        self.runner = runner
+        self._worker_count = workers
+        self._queues: dict = {}        # owner -> deque[job_id]
+        self._owners = deque()         # 有待执行任务的用户，轮转顺序
+        self._cond = asyncio.Condition()
+        self._workers: list = []
+        # job_id -> Event，只在有人等待时存在
+        self._done = weakref.WeakValueDictionary()
+
+    # --- 队列 ---
+
+    def _push(self, owner: str, job_id: str):
+        if owner not in self._queues:
+            self._queues[owner] = deque()
+            self._owners.append(owner)
+        self._queues[owner].append(job_id)
+
+    def _pop(self) -> str:
+        owner = self._owners.popleft()
+        queue = self._queues[owner]
+        job_id = queue.popleft()
+        if queue:
+            self._owners.append(owner)
+        else:
+            del self._queues[owner]
+        return job_id
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self._worker_count,
+            "queued": sum(len(q) for q in self._queues.values()),
+            "owners": len(self._owners),
+        }
+
+    # --- 生命周期 ---
+
+    async def start(self):
+        # Condition 绑定在当前事件循环上
+        self._cond = asyncio.Condition()
+        await self._recover()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _recover(self):
+        now = now_ms()
+        stale = {"status": "running", "leaseUntil": {"$lt": now}}
+        await jobs_collection.update_many(
+            {**stale, "attempts": {"$gte": settings.JOB_MAX_ATTEMPTS}},
+            {"$set": self._finished({"status": "failed", "error": "Job exceeded max attempts"})},
+        )
+        await jobs_collection.update_many(stale, {"$set": {"status": "queued"}, "$unset": {"leaseUntil": ""}})
+
+        async with self._cond:
+            async for doc in jobs_collection.find(
+                {"status": "queued"}, {"_id": 0, "id": 1, "owner_id": 1}
+            ).sort("createdAt", 1):
+                self._push(doc["owner_id"], doc["id"])
+            self._cond.notify_all()
+
+    # --- 提交 / 查询 ---
+
+    async def submit(self, owner: str, topic: str, params: dict) -> dict:
+        active = await jobs_collection.count_documents({"owner_id": owner, "status": {"$in": list(ACTIVE_STATUSES)}})
+        if active >= settings.JOB_MAX_ACTIVE_PER_USER:
+            raise TooManyJobs()
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "owner_id": owner,
+            "status": "queued",
+            "topic": topic,
+            "params": params,
+            "createdAt": now_ms(),
+            "attempts": 0,
+        }
+        await jobs_collection.insert_one(dict(job))
+        async with self._cond:
+            self._push(owner, job["id"])
+            self._cond.notify()
+        return {k: v for k, v in job.items() if k not in JOB_PROJECTION}
+
+    async def get(self, owner: str, job_id: str, wait: float = 0) -> dict | None:
+        """wait > 0 时等到任务结束或超时再返回。
+
+        本进程执行的任务完成时直接唤醒；其他进程执行的任务靠每秒轮询一次 Mongo 感知。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            job = await jobs_collection.find_one({"id": job_id, "owner_id": owner}, JOB_PROJECTION)
+            remaining = deadline - loop.time()
+            if job is None or job["status"] in FINISHED_STATUSES or remaining <= 0:
+                return job
+            event = self._done.get(job_id)
+            if event is None:
+                event = self._done[job_id] = asyncio.Event()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+
+    # --- 执行 ---
+
+    @staticmethod
+    def _finished(update: dict) -> dict:
+        return {
+            **update,
+            "finishedAt": now_ms(),
+            "expiresAt": datetime.utcnow() + timedelta(seconds=settings.JOB_RESULT_TTL),
+        }
+
+    async def _worker(self):
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self._owners)
+                job_id = self._pop()
+            await self._run(job_id)
+
+    async def _run(self, job_id: str):
+        now = now_ms()
+        job = await jobs_collection.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {
+                "$set": {"status": "running", "startedAt": now, "leaseUntil": now + settings.JOB_LEASE_SECONDS * 1000},
+                "$inc": {"attempts": 1},
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            # 已被其他进程领取
+            return
+
+        try:
+            pebble = await self.runner(job)
+            update = {"status": "succeeded", "result": pebble.model_dump()}
+        except asyncio.CancelledError:
+            # 进程关闭：放回队列，下次启动时重新执行
+            await jobs_collection.update_one(
+                {"id": job_id}, {"$set": {"status": "queued"}, "$unset": {"leaseUntil": ""}}
+            )
+            raise
+        except Exception as e:
+            update = {"status": "failed", "error": str(e)}
+
+        await jobs_collection.update_one(
+            {"id": job_id}, {"$set": self._finished(update), "$unset": {"leaseUntil": ""}}
+        )
+        event = self._done.get(job_id)
+        if event is not None:
+            event.set()
+
+
+job_queue = JobQueue(runner=run_generation_job, workers=settings.JOB_WORKERS)
@@ -1,8 +1,74 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, pebbles, ai
+from app.routers import auth, pebbles, ai, sync, graph, archive, revisions
+from app.auth import password_hasher
+from app.database import db, settings, warm_up_pool
+from app.indexes import ensure_indexes
+from app.documents import backfill_derived_fields, backfill_updated_at
+from app.folders import backfill_folder_ancestors
+from app.jobs import job_queue
+from app.revisions import run_compaction
+from app.provider_router import ProviderUnavailable, provider_router, primary_provider
+from app.providers import provider_registry
+from app.metrics import registry, Gauge, MetricsMiddleware, configure_logging
+from app.compression import CompressionMiddleware
 
-app = FastAPI(title="Pebbles API")
+configure_logging(settings.LOG_LEVEL, settings.LOG_JSON)
+logger = logging.getLogger(__name__)
+
+# 取值时才读取的状态类指标
+registry.register(Gauge(
+    "pebbles_jobs_queued", "Generation jobs waiting in this worker's queue", (),
+    lambda: {(): job_queue.snapshot()["queued"]},
+))
+registry.register(Gauge(
+    "pebbles_password_hash_tasks", "Password hash tasks running / waiting for a worker thread", ("state",),
+    lambda: {(state,): value for state, value in password_hasher.stats.items()},
+))
+registry.register(Gauge(
+    "pebbles_provider_circuit_open", "1 when the provider circuit breaker is open / half-open", ("provider",),
+    lambda: {(name,): int(s["breaker"] != "closed") for name, s in provider_router.snapshot().items()},
+))
+
+async def warm_up():
+    """后台预热 MongoDB 连接池和主 provider (在线程里导入 SDK、创建客户端 / 解析 Gemini 模型)。
+    不阻塞启动；失败只记日志，第一次使用时会按需重试"""
+    tasks = [warm_up_pool()]
+    primary = primary_provider()
+    if settings.AI_WARM_UP and provider_registry.specs[primary].configured:
+        tasks.append(provider_registry.warm_up(primary))
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning("warm up failed", extra={"error": repr(result)})
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # provider SDK 只在被选用时才导入 (见 app/providers)，预热在后台进行，和建索引并行
+    warming = asyncio.create_task(warm_up())
+    # 启动时创建索引 (幂等)
+    await ensure_indexes(db)
+    # 旧文档的 updatedAt、检索词条 / 语义向量、旧文件夹的 ancestors 在后台补建，不阻塞启动
+    backfills = [
+        asyncio.create_task(backfill_updated_at()),
+        asyncio.create_task(backfill_derived_fields()),
+        asyncio.create_task(backfill_folder_ancestors()),
+    ]
+    # 旧的细粒度修订定期合并
+    compaction = asyncio.create_task(run_compaction())
+    # 后台生成任务：恢复上次未完成的任务并启动 worker
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    for task in [warming, compaction, *backfills]:
+        task.cancel()
+    await provider_registry.shutdown()
+    password_hasher.shutdown()
+
+app = FastAPI(title="Pebbles API", lifespan=lifespan)
 
 # 配置 CORS，允许前端访问
 origins = [
@@ -10,18 +76,47 @@ origins = [
     "http://localhost:3000",
 ]
 
+# 大的 JSON 响应按 Accept-Encoding 压缩 (流式响应不压缩)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# 最后添加的中间件在最外层：延迟包含 CORS 处理，预检请求也会被记录
+app.add_middleware(MetricsMiddleware)
+
+# provider 限流 / 熔断 / 全部失败时返回 503 (而不是 500)，客户端可按 Retry-After 重试
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailable):
+    headers = {"Retry-After": str(int(exc.retry_after or 1))}
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers=headers)
+
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(pebbles.router, prefix="/api", tags=["Pebbles"])
 app.include_router(ai.router, prefix="/api", tags=["AI"])
+app.include_router(sync.router, prefix="/api", tags=["Sync"])
+app.include_router(graph.router, prefix="/api", tags=["Graph"])
+app.include_router(archive.router, prefix="/api", tags=["Archive"])
+app.include_router(revisions.router, prefix="/api", tags=["Revisions"])
 
 @app.get("/")
 def read_root():
-    return {"message": "Pebbles Core Online"}
\ No newline at end of file
+    return {"message": "Pebbles Core Online"}
+
+# Prometheus 抓取端点 (文本格式 0.0.4)
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,243 @@
+# backend/app/metrics.py
+# 进程内指标 (Prometheus 文本格式，GET /metrics)：HTTP 路由延迟、MongoDB 命令耗时、
+# provider 调用延迟 / 重试 / 失败 / token 用量、缓存命中、provider 输出解析耗时。
+# 只依赖标准库；多 worker 部署时每个 worker 各自暴露自己的数值，由 Prometheus 按实例聚合
+
+import bisect
+import json
+import logging
+import threading
+import time
+from pymongo import monitoring
+
+# 秒；覆盖 Mongo 单条命令 (~ms) 到 provider 生成 (~数十秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()   # pymongo 的监听回调可能来自驱动线程
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge:
+    """取值时调用 callback，返回 {标签元组: 数值}"""
+
+    def __init__(self, name: str, help: str, labels: tuple, callback):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.callback = callback
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(buckets)
+        self._series = {}   # 标签元组 -> [各桶计数 (非累计)..., +Inf 桶, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines += metric.render()
+            except Exception:
+                logging.getLogger(__name__).exception("metric %s failed to render", metric.name)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ==========================================
+# 指标定义
+# ==========================================
+http_latency = registry.register(Histogram(
+    "pebbles_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"),
+))
+mongo_latency = registry.register(Histogram(
+    "pebbles_mongo_command_duration_seconds", "MongoDB command latency", ("command", "outcome"),
+))
+provider_latency = registry.register(Histogram(
+    "pebbles_provider_request_duration_seconds", "AI provider call latency (one attempt)", ("provider", "outcome"),
+))
+provider_retries = registry.register(Counter(
+    "pebbles_provider_retries_total", "AI provider retries", ("provider",),
+))
+provider_failures = registry.register(Counter(
+    "pebbles_provider_failures_total", "AI provider failed attempts", ("provider", "reason"),
+))
+provider_tokens = registry.register(Counter(
+    "pebbles_provider_tokens_total", "Tokens reported by the provider", ("provider", "kind"),
+))
+password_hashes = registry.register(Counter(
+    "pebbles_password_hashes_total", "Password hash / verify tasks", ("outcome",),
+))
+cache_requests = registry.register(Counter(
+    "pebbles_cache_requests_total", "Generation / rewrite cache lookups", ("cache", "result"),
+))
+parse_latency = registry.register(Histogram(
+    "pebbles_parse_duration_seconds", "Provider output parsing / validation time", ("kind",),
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+))
+
+
+def record_usage(provider: str, prompt_tokens, completion_tokens):
+    if prompt_tokens:
+        provider_tokens.inc(provider, "prompt", amount=prompt_tokens)
+    if completion_tokens:
+        provider_tokens.inc(provider, "completion", amount=completion_tokens)
+
+
+# ==========================================
+# HTTP 中间件 (纯 ASGI，不缓冲流式响应)
+# ==========================================
+class MetricsMiddleware:
+    """按路由模板 (例如 /api/pebbles/{pebble_id}) 记录延迟，避免 id 造成标签爆炸。
+    耗时计到响应体发送完毕，流式接口即整个流的时长"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后 FastAPI 会把 route 写回同一个 scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_latency.observe(time.perf_counter() - started, scope["method"], path, str(status))
+
+
+# ==========================================
+# MongoDB 命令监听
+# ==========================================
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, event.command_name, "ok")
+
+    def failed(self, event):
+        mongo_latency.observe(event.duration_micros / 1e6, event.command_name, "error")
+
+
+# ==========================================
+# 结构化日志
+# ==========================================
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """一行一个 JSON 对象；logger.info(..., extra={...}) 的字段原样输出"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO", json_format: bool = True):
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s"
+    ))
+    root = logging.getLogger("app")
+    root.handlers[:] = [handler]
+    root.setLevel(level.upper())
+    root.propagate = False
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Union, Any
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional, Dict, Union, Any, Literal
 from enum import Enum
 import time
 
@@ -48,6 +48,64 @@ class Pebble(BaseModel):
     content: Dict[str, LevelContent] 
     socraticQuestions: List[str]
     owner_id: Optional[str] = None # 关联到用户
+    updatedAt: Optional[float] = None # 最后写入时间 (ms)，增量同步用
+
+# --- Archive 列表 (分页 / 轻量投影) ---
+class PebbleSummary(BaseModel):
+    id: str
+    topic: str
+    folderId: Optional[str] = None
+    timestamp: float
+    isVerified: bool = False
+    emoji: Optional[str] = None # ELI5 emojiCollage 的第一个
+    summary: str = "" # ELI5 summary
+    keywords: List[str] = [] # ELI5 keywords 的前两个
+
+class PebbleSearchResult(PebbleSummary):
+    score: float
+
+class PebblePage(BaseModel):
+    items: List[Union[Pebble, PebbleSummary]]
+    nextCursor: Optional[str] = None # 为 None 表示已经是最后一页
+
+class PebbleIdsRequest(BaseModel):
+    ids: List[str]
+
+# --- AI 原始输出 ---
+# provider 返回的 JSON 直接用 GeneratedArtifact.model_validate_json 一次解析 + 校验，
+# 常见的格式偏差在字段校验器里规整，不再逐块手工清洗
+
+SIDEBAR_TYPES = ("definition", "profile", "stat")
+
+def normalize_main_block(b: dict) -> dict:
+    if b.get('type') == 'key_points' and isinstance(b.get('body'), str):
+        b['body'] = [s.strip() for s in b['body'].split('|')]
+    if 'iconType' not in b: b['iconType'] = 'default'
+    return b
+
+def normalize_sidebar_block(sb: dict) -> dict:
+    if not sb.get('heading'): sb['heading'] = sb.get('title') or "Info"
+    if sb.get('type') not in SIDEBAR_TYPES: sb['type'] = 'definition'
+    if 'body' not in sb: sb['body'] = sb.get('description', '') or "No content"
+    if isinstance(sb['body'], list): sb['body'] = " ".join(str(x) for x in sb['body'])
+    return sb
+
+class GeneratedLevel(LevelContent):
+    @field_validator("mainContent", mode="before")
+    @classmethod
+    def _normalize_main(cls, blocks):
+        return [normalize_main_block(b) if isinstance(b, dict) else b for b in blocks or []]
+
+    @field_validator("sidebarContent", mode="before")
+    @classmethod
+    def _normalize_sidebar(cls, blocks):
+        # 侧栏是可选的装饰内容，非对象的条目直接丢弃
+        return [normalize_sidebar_block(b) for b in blocks or [] if isinstance(b, dict)]
+
+class GeneratedArtifact(BaseModel):
+    eli5_content: GeneratedLevel
+    academic_content: GeneratedLevel
+    socratic_questions: List[str] = []
 
 # --- Folder Data ---
 class Folder(BaseModel):
@@ -56,6 +114,12 @@ class Folder(BaseModel):
     parentId: Optional[str] = None
     createdAt: float
     owner_id: Optional[str] = None
+    isDeleted: bool = False
+    updatedAt: Optional[float] = None
+
+class FolderPage(BaseModel):
+    items: List[Folder]
+    nextCursor: Optional[str] = None # 为 None 表示已经是最后一页
 
 # --- User Auth ---
 class UserRegister(BaseModel):
@@ -65,11 +129,69 @@ class UserRegister(BaseModel):
 class UserInDB(BaseModel):
     username: str
     hashed_password: str
+    token_epoch: int = 0 # 自增即可撤销该用户所有已签发的 token
 
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+# --- Batch / Delta Sync ---
+class SyncOperation(BaseModel):
+    op: Literal["create", "update", "delete", "move"]
+    kind: Literal["pebble", "folder"]
+    id: str
+    # create: 完整文档；update: 字段或点路径 -> 新值 (如 "content.ELI5.mainContent.3.body")
+    data: Optional[Dict[str, Any]] = None
+    # move: 目标 folderId (pebble) / parentId (folder)，None 表示根目录
+    target: Optional[str] = None
+
+class SyncBatchRequest(BaseModel):
+    operations: List[SyncOperation]
+
+# --- 修订历史 ---
+class RevisionSummary(BaseModel):
+    seq: int
+    fromSeq: int # 合并后覆盖 fromSeq..seq
+    createdAt: float
+    source: Literal["baseline", "edit", "restore"]
+    restoredFrom: Optional[int] = None
+    checkpoint: bool = False
+    size: int # 差异 (checkpoint 为快照) 的字节数
+    squashed: int = 1 # 合并了多少次编辑
+    changes: int = 0
+    paths: List[str] = [] # 改动的 JSON Pointer 路径 (最多 10 个)
+
+class RevisionPage(BaseModel):
+    items: List[RevisionSummary]
+    nextBeforeSeq: Optional[int] = None # 为 None 表示已经是最后一页
+
+class RevisionDetail(BaseModel):
+    revision: RevisionSummary
+    state: dict # 该版本的 topic / content / socraticQuestions / isUserEdited
+
+# --- Generation Jobs ---
+class GenerationJob(BaseModel):
+    id: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    topic: str
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[Pebble] = None
+
 class RewriteRequest(BaseModel):
     text: str
-    mode: str # 'improve', 'shorter', 'longer', 'simplify'
\ No newline at end of file
+    mode: str # 'improve', 'shorter', 'longer', 'simplify'
+
+class RewriteBatchRequest(BaseModel):
+    items: List[RewriteRequest]
+
+# 批量改写时 provider 的结构化输出
+class RewriteBatchOutputItem(BaseModel):
+    id: int
+    text: str
+
+class RewriteBatchOutput(BaseModel):
+    items: List[RewriteBatchOutputItem]
\ No newline at end of file
@@ -0,0 +1,381 @@
+# backend/app/provider_router.py
+# 在已注册的 provider (DeepSeek / Gemini，见 app/providers) 之间路由 provider 调用：令牌桶限流、并发上限、带抖动的指数退避重试、
+# 熔断器，以及可选的对冲请求 (主 provider 超过历史延迟分位数仍未返回时并发请求备用 provider)
+
+import asyncio
+import random
+import time
+from collections import deque
+from app.database import settings
+from app.metrics import provider_latency, provider_retries, provider_failures
+from app.providers import provider_registry
+
+DEFAULT_PROVIDER = "gemini"
+DEFAULT_RATE_LIMIT = 10.0     # 没有 AI_RATE_LIMIT_<NAME> 配置项的插件 provider 使用
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class ProviderUnavailable(Exception):
+    """所有候选 provider 都失败 / 熔断，路由层映射为 503"""
+
+    def __init__(self, detail: str, retry_after: float | None = None):
+        super().__init__(detail)
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+# ==========================================
+# 错误分类 (鸭子类型，不依赖 openai / google SDK 的异常类)
+# ==========================================
+def error_status(exc: Exception) -> int | None:
+    # openai: APIStatusError.status_code；google.api_core: GoogleAPICallError.code
+    for attr in ("status_code", "code"):
+        status = getattr(exc, attr, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_retryable(exc: Exception) -> bool:
+    status = error_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # httpx / openai 的连接、超时异常
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def failure_reason(exc: Exception) -> str:
+    """指标标签：HTTP 状态码，否则异常类名"""
+    status = error_status(exc)
+    return str(status) if status is not None else type(exc).__name__
+
+
+def retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(exc: Exception, attempt: int) -> float:
+    """full jitter：在 [0, min(上限, 基数 * 2^attempt)] 内随机；服务端给了 Retry-After 时不早于它"""
+    delay = random.uniform(0, min(settings.AI_RETRY_MAX_DELAY, settings.AI_RETRY_BASE_DELAY * 2 ** attempt))
+    hinted = retry_after(exc)
+    if hinted is not None:
+        delay = max(delay, min(hinted, settings.AI_RETRY_MAX_DELAY))
+    return delay
+
+
+# ==========================================
+# 限流 / 熔断 / 延迟统计
+# ==========================================
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """滑动窗口内错误率超过阈值即熔断；冷却期过后放行一个探测请求，成功则恢复"""
+
+    def __init__(self, window: float, min_requests: int, error_rate: float, cooldown: float):
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self._events = deque()      # (时间, 是否成功)
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        return self.state == "closed" or (self.state == "half_open" and not self._probing)
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def abandon(self):
+        """探测请求没有结果就结束 (被取消 / 对冲落败 / 客户端断开)：放弃这次探测，下一个请求重新探测"""
+        self._probing = False
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        if self._opened_at is not None:
+            # 熔断期间只认探测请求的结果
+            if self._probing:
+                self._probing = False
+                if ok:
+                    self._opened_at = None
+                    self._events.clear()
+                else:
+                    self._opened_at = now
+            return
+
+        self._events.append((now, ok))
+        while self._events and now - self._events[0][0] > self.window:
+            self._events.popleft()
+        failures = sum(1 for _, success in self._events if not success)
+        if len(self._events) >= self.min_requests and failures / len(self._events) >= self.error_rate:
+            self._opened_at = now
+            self._events.clear()
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int = 1) -> float | None:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ProviderState:
+    def __init__(self, name: str, rate: float):
+        self.name = name
+        self.bucket = TokenBucket(rate, settings.AI_RATE_BURST)
+        self.semaphore = asyncio.Semaphore(settings.AI_MAX_CONCURRENCY)
+        self.breaker = CircuitBreaker(
+            settings.AI_BREAKER_WINDOW, settings.AI_BREAKER_MIN_REQUESTS,
+            settings.AI_BREAKER_ERROR_RATE, settings.AI_BREAKER_COOLDOWN,
+        )
+        self.latency = LatencyTracker()
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0}
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "breaker": self.breaker.state,
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+        }
+
+
+# ==========================================
+# 路由
+# ==========================================
+def primary_provider() -> str:
+    """AI_PROVIDER 指定的 provider；未注册的名字回退到 gemini"""
+    name = settings.AI_PROVIDER.lower()
+    return name if name in provider_registry.specs else DEFAULT_PROVIDER
+
+
+class ProviderRouter:
+    def __init__(self):
+        self._states = {}
+
+    def _state(self, name: str) -> ProviderState:
+        # 按需创建，插件 provider 注册后无需改动这里
+        state = self._states.get(name)
+        if state is None:
+            rate = getattr(settings, f"AI_RATE_LIMIT_{name.upper()}", DEFAULT_RATE_LIMIT)
+            state = self._states[name] = ProviderState(name, rate)
+        return state
+
+    def snapshot(self) -> dict:
+        return {name: self._state(name).snapshot() for name in provider_registry.names()}
+
+    def candidates(self, providers) -> list:
+        """主 provider 在前；开启 AI_FAILOVER 时追加配置了 key 的其他 provider。跳过熔断中的"""
+        primary = primary_provider()
+        order = [primary]
+        if settings.AI_FAILOVER:
+            order += [
+                name for name, spec in provider_registry.specs.items()
+                if name != primary and spec.configured
+            ]
+        return [n for n in order if n in providers and self._state(n).breaker.available()]
+
+    def _unavailable(self, errors: list) -> ProviderUnavailable:
+        if not errors:
+            return ProviderUnavailable("All AI providers are temporarily unavailable", settings.AI_BREAKER_COOLDOWN)
+        last = errors[-1]
+        return ProviderUnavailable(f"AI provider error: {last}", retry_after(last))
+
+    async def _with_retries(self, name: str, factory):
+        state = self._state(name)
+        loop = asyncio.get_running_loop()
+        for attempt in range(settings.AI_MAX_RETRIES + 1):
+            if not state.breaker.allow():
+                provider_failures.inc(name, "circuit_open")
+                raise CircuitOpen(f"{name} circuit is open")
+            # 熔断器不是 closed 说明这次是半开状态下的探测请求
+            probe = state.breaker.state != "closed"
+            try:
+                await state.bucket.acquire()
+                async with state.semaphore:
+                    state.stats["calls"] += 1
+                    started = loop.time()
+                    try:
+                        result = await factory()
+                    except asyncio.CancelledError:
+                        provider_latency.observe(loop.time() - started, name, "cancelled")
+                        raise
+                    except Exception as e:
+                        state.stats["failures"] += 1
+                        state.breaker.record(False)
+                        provider_latency.observe(loop.time() - started, name, "error")
+                        provider_failures.inc(name, failure_reason(e))
+                        if attempt == settings.AI_MAX_RETRIES or not is_retryable(e):
+                            raise
+                        delay = backoff_delay(e, attempt)
+                    else:
+                        state.breaker.record(True)
+                        state.latency.add(loop.time() - started)
+                        provider_latency.observe(loop.time() - started, name, "ok")
+                        return result
+            finally:
+                # 已经 record() 过时 _probing 已清除；被取消的探测不能让熔断器永远停在半开
+                if probe:
+                    state.breaker.abandon()
+            state.stats["retries"] += 1
+            provider_retries.inc(name)
+            await asyncio.sleep(delay)
+
+    def _hedge_delay(self, name: str) -> float | None:
+        if not settings.AI_HEDGE:
+            return None
+        return self._state(name).latency.percentile(settings.AI_HEDGE_PERCENTILE, settings.AI_HEDGE_MIN_SAMPLES)
+
+    async def call(self, providers: dict):
+        """providers: {provider 名: 无参协程工厂}。返回第一个成功的结果。
+
+        当前 provider (重试耗尽后) 失败时切到下一个；开启对冲时，当前 provider 超过其
+        延迟分位数仍未返回，就并发请求下一个，先成功者胜出，另一个被取消。
+        """
+        remaining = self.candidates(providers)
+        if not remaining:
+            raise self._unavailable([])
+
+        pending = {}        # task -> provider 名
+        errors = []
+
+        def launch():
+            name = remaining.pop(0)
+            pending[asyncio.ensure_future(self._with_retries(name, providers[name]))] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if remaining and len(pending) == 1:
+                    timeout = self._hedge_delay(next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._state(remaining[0]).stats["hedges"] += 1
+                    launch()
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+                if not pending and remaining:
+                    launch()
+            raise self._unavailable(errors)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, providers: dict):
+        """流式版本：providers 的值返回异步迭代器。
+
+        重试 / 切换只发生在收到第一个 chunk 之前；之后的错误直接抛给调用方 (已推送的内容无法撤回)。
+        流式请求不做对冲。
+        """
+        errors = []
+        for name in self.candidates(providers):
+            state = self._state(name)
+            for attempt in range(settings.AI_MAX_RETRIES + 1):
+                if not state.breaker.allow():
+                    provider_failures.inc(name, "circuit_open")
+                    break
+                # 熔断器不是 closed 说明这次是半开状态下的探测请求
+                probe = state.breaker.state != "closed"
+                try:
+                    await state.bucket.acquire()
+                    async with state.semaphore:
+                        state.stats["calls"] += 1
+                        started = time.monotonic()
+                        chunks = providers[name]()
+                        try:
+                            first = await chunks.__anext__()
+                        except StopAsyncIteration:
+                            first = None
+                        except Exception as e:
+                            state.stats["failures"] += 1
+                            state.breaker.record(False)
+                            provider_latency.observe(time.monotonic() - started, name, "error")
+                            provider_failures.inc(name, failure_reason(e))
+                            errors.append(e)
+                            await chunks.aclose()
+                            if attempt == settings.AI_MAX_RETRIES or not is_retryable(e):
+                                break
+                            delay = backoff_delay(e, attempt)
+                        else:
+                            try:
+                                if first is not None:
+                                    yield first
+                                    async for chunk in chunks:
+                                        yield chunk
+                            except Exception as e:
+                                state.stats["failures"] += 1
+                                state.breaker.record(False)
+                                provider_latency.observe(time.monotonic() - started, name, "error")
+                                provider_failures.inc(name, failure_reason(e))
+                                raise
+                            finally:
+                                await chunks.aclose()
+                            state.breaker.record(True)
+                            # 流式请求记录整个流的时长
+                            provider_latency.observe(time.monotonic() - started, name, "ok")
+                            return
+                finally:
+                    # 探测被取消 / 客户端断开 (GeneratorExit) 时没有 record()，放弃这次探测
+                    if probe:
+                        state.breaker.abandon()
+                state.stats["retries"] += 1
+                provider_retries.inc(name)
+                await asyncio.sleep(delay)
+        raise self._unavailable(errors)
+
+
+provider_router = ProviderRouter()
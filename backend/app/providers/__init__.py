@@ -0,0 +1,73 @@
+# backend/app/providers/__init__.py
+# AI provider 插件注册表。各 provider 的 SDK (openai / google-generativeai + grpc) 导入代价很高，
+# 只有在第一次被选用 (或启动预热) 时才导入对应模块，worker 冷启动不再为未使用的 SDK 付费。
+#
+# provider 模块需要提供 Provider 类，实现：
+#   generate(prompt) -> str             结构化 JSON 输出 (生成 artifact)
+#   stream(prompt) -> AsyncIterator[str]
+#   rewrite(text, instruction) -> str   纯文本改写
+#   rewrite_batch(prompt) -> str        结构化 JSON 输出 (批量改写)
+#   startup() / shutdown()              创建 / 释放客户端 (startup 可以不调用，首次使用时按需创建)
+
+import asyncio
+import importlib
+from app.database import settings
+
+
+class ProviderSpec:
+    def __init__(self, name: str, module: str, key_setting: str | None):
+        self.name = name
+        self.module = module
+        self.key_setting = key_setting      # 对应的 API key 配置项；None 表示不需要 key
+
+    @property
+    def configured(self) -> bool:
+        return self.key_setting is None or bool(getattr(settings, self.key_setting, ""))
+
+
+class ProviderRegistry:
+    def __init__(self):
+        self.specs: dict = {}
+        self._instances: dict = {}
+        self._locks: dict = {}
+
+    def register(self, name: str, module: str, key_setting: str | None = None):
+        """注册一个 provider (插件在 app 启动前调用)；只记录模块路径，不导入"""
+        self.specs[name] = ProviderSpec(name, module, key_setting)
+
+    def install(self, name: str, instance):
+        """直接放入一个已创建的实例 (压测 / 脚本里替换成假的 provider)"""
+        self._instances[name] = instance
+
+    def names(self) -> list:
+        return list(self.specs)
+
+    def loaded(self) -> list:
+        return list(self._instances)
+
+    async def load(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                # SDK 导入要几百毫秒，放到线程里，不阻塞事件循环上的其他请求
+                module = await asyncio.to_thread(importlib.import_module, self.specs[name].module)
+                instance = self._instances[name] = module.Provider()
+            return instance
+
+    async def warm_up(self, name: str):
+        """导入 SDK 并创建客户端 (连接池 / 解析 Gemini 模型)，供 lifespan 在后台调用"""
+        provider = await self.load(name)
+        await provider.startup()
+
+    async def shutdown(self):
+        for instance in list(self._instances.values()):
+            await instance.shutdown()
+
+
+provider_registry = ProviderRegistry()
+provider_registry.register("deepseek", "app.providers.deepseek", "DEEPSEEK_API_KEY")
+provider_registry.register("gemini", "app.providers.gemini", "GEMINI_API_KEY")
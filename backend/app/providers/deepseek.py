@@ -0,0 +1,105 @@
+# backend/app/providers/deepseek.py
+# DeepSeek (OpenAI 兼容接口)
+
+import httpx
+from openai import AsyncOpenAI
+from app.database import settings
+from app.metrics import record_usage
+
+MODEL = "deepseek-chat"
+
+
+def _record_usage(usage):
+    if usage is not None:
+        record_usage("deepseek", usage.prompt_tokens, usage.completion_tokens)
+
+
+class Provider:
+    """长生命周期的客户端：所有请求复用同一个 keep-alive 连接池 (可选 HTTP/2)"""
+
+    def __init__(self):
+        self._http: httpx.AsyncClient | None = None
+        self._client: AsyncOpenAI | None = None
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=settings.AI_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.AI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.AI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.AI_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.AI_READ_TIMEOUT, connect=settings.AI_CONNECT_TIMEOUT),
+        )
+
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            if self._http is None:
+                self._http = self._build_http_client()
+            self._client = AsyncOpenAI(
+                api_key=settings.DEEPSEEK_API_KEY,
+                base_url=settings.DEEPSEEK_BASE_URL,
+                http_client=self._http,
+            )
+        return self._client
+
+    async def startup(self):
+        self.client()
+
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _json(self, system: str, prompt: str, temperature: float) -> str:
+        response = await self.client().chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={ "type": "json_object" },
+            temperature=temperature,
+        )
+        _record_usage(response.usage)
+        return response.choices[0].message.content
+
+    async def generate(self, prompt: str) -> str:
+        return await self._json("You output VALID JSON only.", prompt, 1.3)
+
+    async def stream(self, prompt: str):
+        stream = await self.client().chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": "You output VALID JSON only."},
+                {"role": "user", "content": prompt},
+            ],
+            response_format={ "type": "json_object" },
+            temperature=1.3,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            if chunk.usage:
+                # 最后一个 chunk 只带 usage，没有 choices
+                _record_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def rewrite(self, text: str, instruction: str) -> str:
+        response = await self.client().chat.completions.create(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": "You are an expert editor. Output ONLY the rewritten text."},
+                {"role": "user", "content": f"Instruction: {instruction}\n\nOriginal: {text}"},
+            ],
+            temperature=0.7,
+        )
+        _record_usage(response.usage)
+        return response.choices[0].message.content.strip()
+
+    async def rewrite_batch(self, prompt: str) -> str:
+        return await self._json("You are an expert editor. You output VALID JSON only.", prompt, 0.7)
@@ -0,0 +1,107 @@
+# backend/app/providers/gemini.py
+# Google Gemini (google-generativeai，底层 grpc)
+
+import asyncio
+import google.generativeai as genai
+from google.api_core.exceptions import NotFound
+from app.database import settings
+from app.metrics import record_usage
+
+# 按优先级尝试的 Gemini 模型，首次使用时解析；只缓存确实解析成功的名字
+GEMINI_MODEL_CANDIDATES = ['gemini-2.5-flash', 'gemini-1.5-flash-latest', 'gemini-1.5-pro']
+
+
+def _record_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_usage("gemini", usage.prompt_token_count, usage.candidates_token_count)
+
+
+class Provider:
+    def __init__(self):
+        self._configured = False
+        self._model_name: str | None = None
+        self._models: dict = {}     # json_mode -> GenerativeModel
+        self._lock = asyncio.Lock()
+
+    def _resolve_model_name(self) -> str | None:
+        """返回第一个存在的候选模型；网络 / 鉴权等错误时返回 None (下次调用再解析)"""
+        for model_name in GEMINI_MODEL_CANDIDATES:
+            try:
+                genai.get_model(f"models/{model_name}")
+                return model_name
+            except NotFound:
+                continue
+            except Exception:
+                return None
+        return None
+
+    async def model(self, json_mode: bool = True) -> genai.GenerativeModel:
+        model = self._models.get(json_mode)
+        if model is not None:
+            return model
+
+        async with self._lock:
+            if not self._configured:
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                self._configured = True
+            if self._model_name is None:
+                # get_model 是同步网络调用，放到线程里避免阻塞事件循环
+                self._model_name = await asyncio.to_thread(self._resolve_model_name)
+
+            model = self._models.get(json_mode)
+            if model is None:
+                # 没解析出来时先用首选模型，不缓存，下次调用重新解析
+                generation_config = {"response_mime_type": "application/json"} if json_mode else None
+                model = genai.GenerativeModel(
+                    self._model_name or GEMINI_MODEL_CANDIDATES[0], generation_config=generation_config
+                )
+                if self._model_name is not None:
+                    self._models[json_mode] = model
+            return model
+
+    async def startup(self):
+        await self.model()
+
+    async def shutdown(self):
+        self._models.clear()
+
+    async def generate(self, prompt: str) -> str:
+        response = await (await self.model(json_mode=True)).generate_content_async(prompt)
+        _record_usage(response)
+        # 回退到非 JSON 模式时可能带 markdown 围栏，解析时会去掉
+        return response.text
+
+    async def stream(self, prompt: str):
+        response = await (await self.model(json_mode=True)).generate_content_async(prompt, stream=True)
+        usage = None
+        async for chunk in response:
+            # 每个 chunk 的 usage_metadata 是累计值，只记最后一个
+            usage = chunk
+            try:
+                text = chunk.text
+            except ValueError:
+                # 没有文本 part 的 chunk (例如只有 safety / finish 信息)
+                continue
+            if text:
+                yield text
+        _record_usage(usage)
+
+    async def rewrite(self, text: str, instruction: str) -> str:
+        prompt = f"""
+    You are an expert editor. 
+    Instruction: {instruction}
+    
+    Original Text:
+    {text}
+    
+    Output ONLY the rewritten text. No preamble.
+    """
+        response = await (await self.model(json_mode=False)).generate_content_async(prompt)
+        _record_usage(response)
+        return response.text.strip()
+
+    async def rewrite_batch(self, prompt: str) -> str:
+        response = await (await self.model(json_mode=True)).generate_content_async(prompt)
+        _record_usage(response)
+        return response.text
@@ -0,0 +1,405 @@
+# backend/app/revisions.py
+# pebble 的修订历史 (撤销 / 历史版本)。每次编辑在 revisions 集合里存一条 JSON Patch 风格的差异
+# ({"op": "add" | "remove" | "replace", "path": "/content/ELI5/mainContent/3/body", "value": ...})，
+# 存储量与改动大小成正比；累计差异的字节数超过文档本身 (或条数超过上限) 时附带一份完整快照 (checkpoint)，
+# 重建任意版本最多回放一个 checkpoint 之后的差异。后台合并把旧的细粒度差异 (autosave) 按时间窗口压成一条。
+#
+# 修订文档：
+#   seq / fromSeq      该条覆盖的版本范围 (fromSeq..seq，合并后 fromSeq < seq)，上一条是 seq == fromSeq - 1
+#   patch              相对上一条的差异；快照修订 (基线 / 链断开) 可以没有
+#   snapshot           checkpoint 才有：该版本的完整内容
+#   baseHash/stateHash 编辑前 / 后内容的哈希。其他写入路径 (同步、导入) 改过文档时两者对不上，
+#                      这条直接存成快照，链不会因为漏记的修改而回放出错误内容
+
+import asyncio
+import hashlib
+import logging
+import random
+import orjson
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.database import settings, pebbles_collection, revisions_collection
+from app.documents import (
+    stamp, now_ms, apply_update, derived_fields, touches_derived_fields, refresh_derived_fields,
+)
+from app.semantic import semantic_index
+from app.versioning import bump_version
+
+logger = logging.getLogger(__name__)
+
+# 纳入修订历史的字段 (内容本身)；移动 / 删除 / 标记校验不产生修订，恢复时也不会被改回去
+TRACKED_FIELDS = ("topic", "content", "socraticQuestions", "isUserEdited")
+TRACKED_PROJECTION = {"_id": 0, **{field: 1 for field in TRACKED_FIELDS}}
+# 列表里返回的修订信息 (不含快照和差异内容)
+SUMMARY_PROJECTION = {
+    "_id": 0, "seq": 1, "fromSeq": 1, "createdAt": 1, "source": 1, "restoredFrom": 1,
+    "checkpoint": 1, "size": 1, "squashed": 1, "patch.path": 1,
+}
+MAX_SUMMARY_PATHS = 10
+
+
+class RevisionNotFound(Exception):
+    pass
+
+
+class RevisionChainError(Exception):
+    """修订链不完整 (通常是后台合并正在进行)，稍后重试即可"""
+
+
+def _dumps(value) -> bytes:
+    return orjson.dumps(value, option=orjson.OPT_SORT_KEYS)
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def _copy(value):
+    return orjson.loads(orjson.dumps(value))
+
+
+def tracks(update_data: dict) -> bool:
+    return any(path.split(".")[0] in TRACKED_FIELDS for path in update_data)
+
+
+# ==========================================
+# JSON Patch
+# ==========================================
+def _pointer(segments: list) -> str:
+    return "".join("/" + str(s).replace("~", "~0").replace("/", "~1") for s in segments)
+
+
+def _segments(pointer: str) -> list:
+    return [s.replace("~1", "/").replace("~0", "~") for s in pointer.split("/")[1:]]
+
+
+def diff(old, new, path: tuple = ()) -> list:
+    """old -> new 的差异。对象逐键递归；数组先去掉相同的首尾元素，
+    中间部分逐个递归，多出 / 缺少的元素用 add / remove，插入或删除一个块只产生一条操作"""
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer([*path, key])})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer([*path, key]), "value": value})
+            else:
+                ops += diff(old[key], value, (*path, key))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        start = 0
+        while start < min(len(old), len(new)) and old[start] == new[start]:
+            start += 1
+        end_old, end_new = len(old), len(new)
+        while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+            end_old -= 1
+            end_new -= 1
+        common = min(end_old - start, end_new - start)
+        ops = []
+        for i in range(start, start + common):
+            ops += diff(old[i], new[i], (*path, i))
+        # 从后往前删除，前面的下标保持不变
+        for i in range(end_old - 1, start + common - 1, -1):
+            ops.append({"op": "remove", "path": _pointer([*path, i])})
+        for i in range(start + common, end_new):
+            ops.append({"op": "add", "path": _pointer([*path, i]), "value": new[i]})
+        return ops
+    return [{"op": "replace", "path": _pointer(path), "value": new}]
+
+
+def apply_patch(doc: dict, patch: list) -> dict:
+    """就地应用差异并返回 doc；调用方负责传入可修改的副本"""
+    for op in patch:
+        *parents, last = _segments(op["path"])
+        target = doc
+        for segment in parents:
+            target = target[int(segment)] if isinstance(target, list) else target[segment]
+        if isinstance(target, list):
+            index = int(last)
+            if op["op"] == "add":
+                target.insert(index, op["value"])
+            elif op["op"] == "remove":
+                del target[index]
+            else:
+                target[index] = op["value"]
+        elif op["op"] == "remove":
+            del target[last]
+        else:
+            target[last] = op["value"]
+    return doc
+
+
+# ==========================================
+# 记录
+# ==========================================
+def _revision(owner: str, pebble_id: str, seq: int, source: str, **fields) -> dict:
+    return {
+        "owner_id": owner, "pebbleId": pebble_id, "seq": seq, "fromSeq": seq,
+        "createdAt": now_ms(), "source": source, "squashed": 1, "compacted": False, **fields,
+    }
+
+
+async def record_revision(owner: str, pebble_id: str, before: dict, after: dict,
+                          source: str = "edit", restored_from: int | None = None) -> int | None:
+    """记录 before -> after 的一次修订，返回 seq；内容没有变化时不记录"""
+    patch = diff(before, after)
+    if not patch:
+        return None
+    before_bytes, after_bytes = _dumps(before), _dumps(after)
+    base_hash, state_hash = _hash(before_bytes), _hash(after_bytes)
+    size = len(_dumps(patch))
+    extra = {"restoredFrom": restored_from} if restored_from is not None else {}
+
+    # 并发编辑同一个 pebble 时 seq 冲突 (唯一索引)，重新读取最新一条再试
+    for _ in range(5):
+        prev = await revisions_collection.find_one(
+            {"owner_id": owner, "pebbleId": pebble_id},
+            {"_id": 0, "seq": 1, "stateHash": 1, "chainBytes": 1, "chainLength": 1},
+            sort=[("seq", -1)],
+        )
+        try:
+            if prev is None:
+                # 第一次编辑：先存编辑前的内容作为基线 (通常是 AI 生成的原稿)
+                await revisions_collection.insert_one(_revision(
+                    owner, pebble_id, 0, "baseline", patch=None, snapshot=before, checkpoint=True,
+                    stateHash=base_hash, chainBytes=0, chainLength=0, size=len(before_bytes),
+                ))
+                prev = {"seq": 0, "stateHash": base_hash, "chainBytes": 0, "chainLength": 0}
+
+            revision = _revision(
+                owner, pebble_id, prev["seq"] + 1, source, patch=patch, size=size,
+                baseHash=base_hash, stateHash=state_hash, **extra,
+            )
+            chain_bytes = prev.get("chainBytes", 0) + size
+            chain_length = prev.get("chainLength", 0) + 1
+            if (
+                prev.get("stateHash") != base_hash
+                or chain_bytes >= len(after_bytes)
+                or chain_length >= settings.REVISION_CHECKPOINT_MAX_DIFFS
+            ):
+                revision.update(snapshot=after, checkpoint=True, chainBytes=0, chainLength=0)
+            else:
+                revision.update(checkpoint=False, chainBytes=chain_bytes, chainLength=chain_length)
+            await revisions_collection.insert_one(revision)
+            return revision["seq"]
+        except DuplicateKeyError:
+            continue
+    raise RevisionChainError("Too many concurrent edits")
+
+
+def tracked(doc: dict) -> dict:
+    return {field: doc[field] for field in TRACKED_FIELDS if field in doc}
+
+
+async def update_with_revision(owner: str, pebble_id: str, update_data: dict,
+                               source: str = "edit", restored_from: int | None = None) -> bool:
+    """校验并 $set 更新 pebble，记录修订；pebble 不存在返回 False，内容非法抛 ValueError。
+
+    先读当前内容，在本地应用 $set 并用模型校验 (documents.apply_update)，再以 updatedAt 为条件写入，
+    期间有其他写入时重读重试；读到的内容就是这次编辑的前像。派生字段由校验后的内容算出，
+    和编辑在同一次写入里。修订记录失败只记日志 (下一条修订会存成快照)。
+    """
+    selector = {"id": pebble_id, "owner_id": owner}
+    for _ in range(5):
+        before = await pebbles_collection.find_one(selector, {"_id": 0, "searchTerms": 0, "embedding": 0})
+        if before is None:
+            return False
+        after, update = apply_update("pebble", before, update_data)
+        if touches_derived_fields(update_data):
+            update.update(derived_fields(after))
+        result = await pebbles_collection.update_one(
+            {**selector, "updatedAt": before.get("updatedAt")}, {"$set": stamp(update)}
+        )
+        if result.matched_count:
+            break
+    else:
+        raise RevisionChainError("Too many concurrent edits")
+
+    if tracks(update_data):
+        try:
+            await record_revision(owner, pebble_id, tracked(before), tracked(after), source, restored_from)
+        except Exception as e:
+            logger.warning("revision record failed", extra={"pebble_id": pebble_id, "error": repr(e)})
+    return True
+
+
+# ==========================================
+# 查询 / 重建 / 恢复
+# ==========================================
+def _summary(doc: dict) -> dict:
+    paths = [op["path"] for op in doc.pop("patch", None) or []]
+    return {**doc, "changes": len(paths), "paths": paths[:MAX_SUMMARY_PATHS]}
+
+
+async def list_revisions(owner: str, pebble_id: str, limit: int, before_seq: int | None = None) -> list:
+    query = {"owner_id": owner, "pebbleId": pebble_id}
+    if before_seq is not None:
+        query["seq"] = {"$lt": before_seq}
+    docs = await revisions_collection.find(query, SUMMARY_PROJECTION) \
+        .sort("seq", -1).limit(limit).to_list(length=limit)
+    return [_summary(d) for d in docs]
+
+
+def _replay(chain: list) -> dict:
+    """chain: 从一个 checkpoint 开始、按 seq 升序的修订"""
+    state = _copy(chain[0]["snapshot"])
+    for revision in chain[1:]:
+        state = _copy(revision["snapshot"]) if revision.get("snapshot") is not None \
+            else apply_patch(state, revision["patch"])
+    return state
+
+
+async def reconstruct(owner: str, pebble_id: str, seq: int) -> tuple:
+    """返回 (修订信息, 该版本的内容)。从不晚于 seq 的最近 checkpoint 开始回放"""
+    query = {"owner_id": owner, "pebbleId": pebble_id}
+    checkpoint = await revisions_collection.find_one(
+        {**query, "seq": {"$lte": seq}, "checkpoint": True}, {"_id": 0, "seq": 1}, sort=[("seq", -1)],
+    )
+    if checkpoint is None:
+        raise RevisionNotFound()
+    docs = await revisions_collection.find(
+        {**query, "seq": {"$gte": checkpoint["seq"], "$lte": seq}}, {"_id": 0, "owner_id": 0}
+    ).to_list(length=None)
+    by_seq = {d["seq"]: d for d in docs}
+    if seq not in by_seq:
+        raise RevisionNotFound()
+
+    # 沿 fromSeq 从目标往回走到 checkpoint；合并中残留的旧差异不在这条链上，自然被跳过
+    chain = [by_seq[seq]]
+    while not chain[-1].get("checkpoint"):
+        prev = by_seq.get(chain[-1]["fromSeq"] - 1)
+        if prev is None:
+            raise RevisionChainError(f"Revision chain broken before {chain[-1]['fromSeq']}")
+        chain.append(prev)
+    chain.reverse()
+    summary_fields = {key.split(".")[0] for key in SUMMARY_PROJECTION}
+    info = _summary({k: v for k, v in by_seq[seq].items() if k in summary_fields})
+    return info, _replay(chain)
+
+
+async def restore_revision(owner: str, pebble_id: str, seq: int) -> int | None:
+    """把 pebble 的内容恢复到 seq 版本；恢复本身也记成一条修订 (可以再撤销)。返回新修订的 seq"""
+    _, state = await reconstruct(owner, pebble_id, seq)
+    update_data = {field: state[field] for field in TRACKED_FIELDS if field in state}
+    before = await pebbles_collection.find_one_and_update(
+        {"id": pebble_id, "owner_id": owner}, {"$set": stamp(update_data)},
+        projection=TRACKED_PROJECTION, return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        raise RevisionNotFound()
+    new_seq = await record_revision(owner, pebble_id, before, {**before, **update_data}, "restore", seq)
+    if touches_derived_fields(update_data):
+        await refresh_derived_fields(owner, [pebble_id])
+    await bump_version(owner)
+    if touches_derived_fields(update_data):
+        await semantic_index.changed(owner, [pebble_id])
+    return new_seq
+
+
+# ==========================================
+# 后台合并
+# ==========================================
+def _groups(chain: list, window_ms: float) -> list:
+    """按时间窗口把连续修订分组；checkpoint 结束一组 (合并后的修订保留它的快照)"""
+    groups, current = [], []
+    for revision in chain:
+        if current and revision["createdAt"] // window_ms != current[-1]["createdAt"] // window_ms:
+            groups.append(current)
+            current = []
+        current.append(revision)
+        if revision.get("checkpoint"):
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def compact_pebble(owner: str, pebble_id: str, cutoff: float) -> int:
+    """合并 cutoff 之前的修订，返回删除的条数。
+
+    cutoff 对齐到窗口边界，参与合并的窗口都已经结束，之后的编辑不会再落进来；
+    多个进程同时合并同一个 pebble 得到相同的结果。先改写每组的最后一条再删除其余，
+    中途读取的请求沿 fromSeq 回走，会跳过还没删除的旧差异。
+    """
+    docs = await revisions_collection.find(
+        {"owner_id": owner, "pebbleId": pebble_id, "createdAt": {"$lt": cutoff}}
+    ).sort("seq", 1).to_list(length=None)
+    if not docs:
+        return 0
+    by_seq = {d["seq"]: d for d in docs}
+
+    # 从最后一条沿 fromSeq 往回走出有效链，不在链上的是上次合并残留的旧差异
+    chain = [docs[-1]]
+    while chain[-1]["fromSeq"] - 1 in by_seq:
+        chain.append(by_seq[chain[-1]["fromSeq"] - 1])
+    chain.reverse()
+    on_chain = {d["_id"] for d in chain}
+    garbage = [d["_id"] for d in docs if d["_id"] not in on_chain]
+
+    # 链必须从 checkpoint 开始才能计算每组合并前后的内容；之前的部分 (理论上不会出现) 保持原样
+    while chain and not chain[0].get("checkpoint"):
+        skipped = chain.pop(0)
+        await revisions_collection.update_one({"_id": skipped["_id"]}, {"$set": {"compacted": True}})
+
+    window_ms = settings.REVISION_COMPACT_WINDOW * 1000
+    state = None
+    for group in _groups(chain, window_ms):
+        # apply_patch 就地修改，合并前的内容要单独留一份
+        before, state = state, _copy(state)
+        for revision in group:
+            state = _copy(revision["snapshot"]) if revision.get("snapshot") is not None \
+                else apply_patch(state, revision["patch"])
+        last = group[-1]
+        if len(group) > 1:
+            merged = {
+                "fromSeq": group[0]["fromSeq"],
+                "baseHash": group[0].get("baseHash"),
+                "squashed": sum(r.get("squashed", 1) for r in group),
+                "compacted": True,
+            }
+            # 基线 (before 为空) 只可能是第一组的第一条，它是 checkpoint，单独成组
+            patch = diff(before, state)
+            merged.update(patch=patch, size=len(_dumps(patch)))
+            await revisions_collection.update_one({"_id": last["_id"]}, {"$set": merged})
+            garbage += [r["_id"] for r in group[:-1]]
+        elif not last.get("compacted"):
+            await revisions_collection.update_one({"_id": last["_id"]}, {"$set": {"compacted": True}})
+
+    if garbage:
+        await revisions_collection.delete_many({"_id": {"$in": garbage}})
+    return len(garbage)
+
+
+async def compact_revisions() -> int:
+    """处理一批有未合并旧修订的 pebble，返回删除的修订数"""
+    window_ms = settings.REVISION_COMPACT_WINDOW * 1000
+    cutoff = (now_ms() - settings.REVISION_COMPACT_AFTER * 1000) // window_ms * window_ms
+    pending = await revisions_collection.aggregate([
+        {"$match": {"compacted": False, "createdAt": {"$lt": cutoff}}},
+        {"$group": {"_id": {"owner_id": "$owner_id", "pebbleId": "$pebbleId"}}},
+        {"$limit": settings.REVISION_COMPACT_BATCH},
+    ]).to_list(length=None)
+    removed = 0
+    for entry in pending:
+        try:
+            removed += await compact_pebble(entry["_id"]["owner_id"], entry["_id"]["pebbleId"], cutoff)
+        except Exception as e:
+            logger.warning("revision compaction failed", extra={**entry["_id"], "error": repr(e)})
+    return removed
+
+
+async def run_compaction():
+    """lifespan 中的后台循环；多个 worker 错开启动时间，避免同时扫描"""
+    await asyncio.sleep(random.uniform(0, settings.REVISION_COMPACT_INTERVAL))
+    while True:
+        try:
+            removed = await compact_revisions()
+            if removed:
+                logger.info("revisions compacted", extra={"removed": removed})
+        except Exception as e:
+            logger.warning("revision compaction failed", extra={"error": repr(e)})
+        await asyncio.sleep(settings.REVISION_COMPACT_INTERVAL)
@@ -1,29 +1,117 @@
-from fastapi import APIRouter, Depends, Body
-from app.gemini_service import generate_pebble_logic, rewrite_text_logic
+import orjson
+from typing import List
+from fastapi import APIRouter, Depends, Body, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.gemini_service import rewrite_text_logic, rewrite_batch_logic, stream_pebble_logic
+from app.cache import generation_cache
 from app.routers.auth import get_current_user
-from app.database import pebbles_collection
-from app.models import Pebble, RewriteRequest
+from app.database import settings, pebbles_collection
+from app.models import Pebble, RewriteRequest, RewriteBatchRequest, GenerationJob
+from app.documents import now_ms, with_derived_fields
+from app.context import assemble_context
+from app.jobs import job_queue, generate_and_save, TooManyJobs
+from app.provider_router import provider_router
+from app.semantic import semantic_index
+from app.versioning import bump_version
 
 
 router = APIRouter()
 
+MAX_CONTEXT_IDS = 20
+
 @router.post("/generate", response_model=Pebble)
 async def generate_pebble_endpoint(
     topic: str = Body(..., embed=True),
-    context_pebbles: list = Body(default=[], embed=True),
+    context_ids: List[str] = Body(default=[], embed=True, max_length=MAX_CONTEXT_IDS),
+    auto_context: bool = Body(default=True, embed=True),
+    no_cache: bool = Body(default=False, embed=True),
+    current_user: dict = Depends(get_current_user)
+):
+    # 上下文只接收 id，内容从库里取；没给 id 时自动检索相关 pebble。
+    # no_cache=True 时跳过生成缓存，强制重新生成；生成结果自动保存到数据库
+    return await generate_and_save(current_user["username"], topic, context_ids, auto_context, no_cache)
+
+# --- 后台生成任务 ---
+
+@router.post("/generate/jobs", response_model=GenerationJob, status_code=202)
+async def create_generation_job(
+    topic: str = Body(..., embed=True),
+    context_ids: List[str] = Body(default=[], embed=True, max_length=MAX_CONTEXT_IDS),
+    auto_context: bool = Body(default=True, embed=True),
+    no_cache: bool = Body(default=False, embed=True),
+    current_user: dict = Depends(get_current_user)
+):
+    """立即返回任务 id；用 GET /generate/jobs/{id}?wait=秒数 查询状态和结果"""
+    params = {"context_ids": context_ids, "auto_context": auto_context, "no_cache": no_cache}
+    try:
+        return await job_queue.submit(current_user["username"], topic, params)
+    except TooManyJobs:
+        raise HTTPException(status_code=429, detail="Too many generation jobs in progress")
+
+@router.get("/generate/jobs/{job_id}", response_model=GenerationJob)
+async def get_generation_job(
+    job_id: str,
+    wait: float = Query(default=0, ge=0, le=settings.JOB_MAX_WAIT),
+    current_user: dict = Depends(get_current_user)
+):
+    job = await job_queue.get(current_user["username"], job_id, wait=wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/generate/provider-stats")
+async def provider_stats(current_user: dict = Depends(get_current_user)):
+    return provider_router.snapshot()
+
+@router.get("/generate/job-stats")
+async def generation_job_stats(current_user: dict = Depends(get_current_user)):
+    return job_queue.snapshot()
+
+@router.post("/generate/stream")
+async def generate_pebble_stream_endpoint(
+    topic: str = Body(..., embed=True),
+    context_ids: List[str] = Body(default=[], embed=True, max_length=MAX_CONTEXT_IDS),
+    auto_context: bool = Body(default=True, embed=True),
+    no_cache: bool = Body(default=False, embed=True),
     current_user: dict = Depends(get_current_user)
 ):
-    # 1. 调用 AI 生成
-    new_pebble = await generate_pebble_logic(topic, context_pebbles)
-    
-    # 2. 自动保存到数据库
-    new_pebble.owner_id = current_user["username"]
-    await pebbles_collection.insert_one(new_pebble.dict())
-    
-    return new_pebble
+    """NDJSON 流：每行一个事件 (field / main_block / sidebar_block / socratic_question)，
+    最后一行是 done (带完整 Pebble，已入库) 或 error"""
+
+    context_nodes = await assemble_context(current_user["username"], topic, context_ids, auto=auto_context)
+
+    async def event_stream():
+        try:
+            async for event in stream_pebble_logic(topic, context_nodes, use_cache=not no_cache):
+                if event["event"] == "done":
+                    new_pebble = event["pebble"]
+                    new_pebble.owner_id = current_user["username"]
+                    new_pebble.updatedAt = now_ms()
+                    await pebbles_collection.insert_one(with_derived_fields(new_pebble.model_dump()))
+                    await bump_version(current_user["username"])
+                    await semantic_index.changed(current_user["username"], [new_pebble.id])
+                    event = {"event": "done", "pebble": new_pebble.model_dump()}
+                yield orjson.dumps(event) + b"\n"
+        except Exception as e:
+            # 响应头已发出，只能在流里报告错误
+            yield orjson.dumps({"event": "error", "detail": str(e)}) + b"\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+@router.get("/generate/cache-stats")
+async def generation_cache_stats(current_user: dict = Depends(get_current_user)):
+    return generation_cache.snapshot()
 
 # ★★★ 新增：改写接口 ★★★
 @router.post("/rewrite")
 async def rewrite_text(request: RewriteRequest, current_user: dict = Depends(get_current_user)):
     new_text = await rewrite_text_logic(request.text, request.mode)
-    return {"text": new_text}
\ No newline at end of file
+    return {"text": new_text}
+
+@router.post("/rewrite/batch")
+async def rewrite_batch(request: RewriteBatchRequest, current_user: dict = Depends(get_current_user)):
+    """一次改写多段文本 (例如整篇 artifact 的所有段落)，返回同顺序的 texts"""
+    if len(request.items) > settings.REWRITE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.REWRITE_BATCH_MAX_ITEMS} items per batch")
+    texts = await rewrite_batch_logic([(item.text, item.mode) for item in request.items])
+    return {"texts": texts}
@@ -0,0 +1,50 @@
+import time
+import orjson
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from app.archive import export_gzip, import_records
+from app.routers.auth import get_current_user
+
+router = APIRouter()
+
+class _BodyConsumingStreamingResponse(StreamingResponse):
+    """响应流里才读取请求体：不能像 StreamingResponse 那样并发监听 http.disconnect
+    (会和 request.stream() 抢 receive 消息)；客户端断开时 request.stream() 自己会抛 ClientDisconnect"""
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@router.get("/export")
+async def export_archive(
+    include_deleted: bool = Query(default=False),
+    current_user: dict = Depends(get_current_user)
+):
+    """下载整个档案 (文件夹 + pebbles)，gzip 压缩的 NDJSON，边读游标边发送"""
+    filename = f"pebbles-{current_user['username']}-{time.strftime('%Y%m%d')}.ndjson.gz"
+    return StreamingResponse(
+        export_gzip(current_user["username"], include_deleted),
+        media_type="application/gzip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            # 档案内容属于当前用户：不进共享缓存，切换账号后也不复用
+            "Cache-Control": "private, no-store",
+            "Vary": "Authorization",
+        },
+    )
+
+@router.post("/import")
+async def import_archive(
+    request: Request,
+    overwrite: bool = Query(default=False),
+    current_user: dict = Depends(get_current_user)
+):
+    """请求体为导出文件 (gzip 或未压缩的 NDJSON) 的原始字节，边上传边解析写入。
+
+    响应是 NDJSON 事件流：error (单条记录) / progress (每批) / done (汇总)。
+    overwrite=false 时跳过已存在的 id，重复导入同一文件是幂等的。
+    """
+    async def event_stream():
+        async for event in import_records(current_user["username"], request.stream(), overwrite):
+            yield orjson.dumps(event) + b"\n"
+
+    return _BodyConsumingStreamingResponse(event_stream(), media_type="application/x-ndjson")
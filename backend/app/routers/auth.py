@@ -2,10 +2,18 @@ from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from app.models import UserRegister, UserInDB, Token
 from app.database import users_collection, settings
-from app.auth import get_password_hash, verify_password, create_access_token
+from app.auth import (
+    create_access_token, user_cache, invalidate_cached_user, password_hasher, PasswordHashingBusy
+)
 from jose import JWTError, jwt
+from pymongo import ReturnDocument
 
 router = APIRouter()
+hashing_busy_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Too many concurrent sign-ins, please retry",
+    headers={"Retry-After": "1"},
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 # 获取当前用户的依赖函数
@@ -22,9 +30,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = await users_collection.find_one({"username": username})
-    if user is None:
+
+    # 签名已验证，用户记录走进程内缓存；只有未命中时才查库
+    token_epoch = payload.get("token_epoch", 0) # 旧 token 没有该字段，视为 0
+    user = user_cache.get(username)
+    # 缓存里的 epoch 比 token 旧，说明别的 worker 刚撤销过，刷新一次
+    if user is None or token_epoch > user.get("token_epoch", 0):
+        user = await users_collection.find_one({"username": username}, {"_id": 0, "hashed_password": 0})
+        if user is None:
+            raise credentials_exception
+        user_cache[username] = user
+
+    # token_epoch 与用户当前值不一致说明 token 已被撤销
+    if token_epoch != user.get("token_epoch", 0):
         raise credentials_exception
     return user
 
@@ -34,10 +52,13 @@ async def register(user: UserRegister):
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    hashed_pw = get_password_hash(user.password)
+    try:
+        hashed_pw = await password_hasher.hash(user.password)
+    except PasswordHashingBusy:
+        raise hashing_busy_exception
     user_db = UserInDB(username=user.username, hashed_password=hashed_pw)
     
-    await users_collection.insert_one(user_db.dict())
+    await users_collection.insert_one(user_db.model_dump())
     
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
@@ -45,8 +66,32 @@ async def register(user: UserRegister):
 @router.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = await users_collection.find_one({"username": form_data.username})
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect username or password")
+
+    try:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user["hashed_password"])
+    except PasswordHashingBusy:
+        raise hashing_busy_exception
+    if not verified:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
+    if new_hash:
+        # argon2 参数已调整，透明地把旧哈希升级为新参数
+        await users_collection.update_one({"username": user["username"]}, {"$set": {"hashed_password": new_hash}})
     
-    access_token = create_access_token(data={"sub": user["username"]})
+    access_token = create_access_token(data={"sub": user["username"], "token_epoch": user.get("token_epoch", 0)})
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/revoke", response_model=Token)
+async def revoke_tokens(current_user: dict = Depends(get_current_user)):
+    """撤销该用户所有已签发的 token (退出所有设备)，并返回一个新 token 给当前会话"""
+    user = await users_collection.find_one_and_update(
+        {"username": current_user["username"]},
+        {"$inc": {"token_epoch": 1}},
+        projection={"_id": 0, "hashed_password": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    invalidate_cached_user(current_user["username"])
+
+    access_token = create_access_token(data={"sub": user["username"], "token_epoch": user["token_epoch"]})
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
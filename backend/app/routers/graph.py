@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from app.semantic import semantic_index
+from app.routers.auth import get_current_user
+
+router = APIRouter()
+
+@router.get("/graph")
+async def get_graph(
+    k: int = Query(default=3, ge=1, le=20),
+    min_score: float = Query(default=0.1, ge=-1.0, le=1.0),
+    current_user: dict = Depends(get_current_user)
+):
+    """语义 kNN 图：每个 pebble 连向最相似的 k 个邻居 (无向、去重)，边数 O(n·k)"""
+    index = await semantic_index.get(current_user["username"])
+    return ORJSONResponse({"nodes": index.ids, "edges": index.knn_edges(k, min_score)})
+
+@router.get("/related/{pebble_id}")
+async def get_related(
+    pebble_id: str,
+    k: int = Query(default=5, ge=1, le=50),
+    current_user: dict = Depends(get_current_user)
+):
+    index = await semantic_index.get(current_user["username"])
+    position = index.positions.get(pebble_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="Pebble not found")
+
+    return [
+        {"id": index.ids[i], "topic": index.topics[i], "score": round(score, 4)}
+        for i, score in index.top_k(index.matrix[position], k, exclude=position)
+    ]
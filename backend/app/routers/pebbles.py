@@ -1,98 +1,291 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from app.models import Pebble, Folder
+import base64
+import json
+import logging
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import ORJSONResponse
+from typing import List, Literal, Optional
+from app.models import Pebble, Folder, FolderPage, PebblePage, PebbleIdsRequest, PebbleSearchResult
 from app.database import pebbles_collection, folders_collection
 from app.routers.auth import get_current_user
+from app.documents import (
+    validate_update, apply_update, stamp, now_ms, PUBLIC_PROJECTION, FOLDER_PROJECTION,
+    with_derived_fields, changes_embeddings,
+)
+from app.search import search_pebbles
+from app.semantic import semantic_index
+from app.revisions import RevisionChainError, update_with_revision
+from app.versioning import bump_version, conditional, cache_headers
+from app.folders import (
+    FolderTreeError, ancestors_for, move_subtree, delete_subtree, restore_subtree, ungroup, recursive_counts,
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # --- Pebbles Endpoints ---
+# 读接口返回的是库里已经校验过的文档 (写入时经过模型校验)，直接用 orjson 序列化，
+# 不再逐条走 response_model 重新校验；response_model 只用于 OpenAPI 文档
 
-@router.get("/pebbles", response_model=List[Pebble])
-async def get_pebbles(current_user: dict = Depends(get_current_user)):
-    cursor = pebbles_collection.find({"owner_id": current_user["username"], "isDeleted": False})
-    pebbles = await cursor.to_list(length=1000)
-    return pebbles
+# summary 视图只取 Archive 列表渲染需要的字段
+SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "topic": 1, "folderId": 1, "timestamp": 1, "isVerified": 1,
+    "content.ELI5.emojiCollage": 1, "content.ELI5.summary": 1, "content.ELI5.keywords": 1,
+}
+MAX_PAGE_SIZE = 500
+SUMMARY_KEYWORDS = 2 # 卡片上只显示前两个关键词
+
+def _encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc["timestamp"], doc["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        timestamp, pebble_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(timestamp), str(pebble_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _encode_folder_cursor(doc: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(doc["id"]).encode()).decode()
+
+def _decode_folder_cursor(cursor: str) -> str:
+    try:
+        return str(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _to_summary(doc: dict) -> dict:
+    # 字段与 PebbleSummary 一致
+    eli5 = doc.get("content", {}).get("ELI5", {})
+    emojis = eli5.get("emojiCollage") or []
+    return {
+        "id": doc["id"], "topic": doc["topic"], "folderId": doc.get("folderId"),
+        "timestamp": doc["timestamp"], "isVerified": doc.get("isVerified", False),
+        "emoji": emojis[0] if emojis else None,
+        "summary": eli5.get("summary", ""), "keywords": eli5.get("keywords", [])[:SUMMARY_KEYWORDS],
+    }
+
+@router.get("/pebbles", response_model=PebblePage)
+async def get_pebbles(
+    request: Request,
+    limit: int = Query(default=100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    view: Literal["full", "summary"] = "full",
+    current_user: dict = Depends(get_current_user)
+):
+    # 档案没有变化时直接 304 (见 app/versioning.py)
+    etag, not_modified = await conditional(request, current_user["username"])
+    if not_modified:
+        return not_modified
+
+    # 按 (timestamp, id) 倒序的 keyset 分页，cursor 指向上一页最后一条
+    query = {"owner_id": current_user["username"], "isDeleted": False}
+    if cursor:
+        timestamp, pebble_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "id": {"$lt": pebble_id}},
+        ]
+
+    projection = SUMMARY_PROJECTION if view == "summary" else PUBLIC_PROJECTION
+    docs = await pebbles_collection.find(query, projection) \
+        .sort([("timestamp", -1), ("id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    items = [_to_summary(d) for d in docs] if view == "summary" else docs
+    return ORJSONResponse(
+        {"items": items, "nextCursor": _encode_cursor(docs[-1]) if has_more else None},
+        headers=cache_headers(etag),
+    )
+
+@router.post("/pebbles/by-ids", response_model=List[Pebble])
+async def get_pebbles_by_ids(request: PebbleIdsRequest, current_user: dict = Depends(get_current_user)):
+    if len(request.ids) > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PAGE_SIZE} ids per request")
+    cursor = pebbles_collection.find(
+        {"owner_id": current_user["username"], "id": {"$in": request.ids}, "isDeleted": False},
+        PUBLIC_PROJECTION,
+    )
+    return ORJSONResponse(await cursor.to_list(length=len(request.ids)))
 
 @router.post("/pebbles", response_model=Pebble)
 async def create_pebble(pebble: Pebble, current_user: dict = Depends(get_current_user)):
     pebble.owner_id = current_user["username"]
-    await pebbles_collection.insert_one(pebble.dict())
+    pebble.updatedAt = now_ms()
+    await pebbles_collection.insert_one(with_derived_fields(pebble.model_dump()))
+    await bump_version(pebble.owner_id)
+    await semantic_index.changed(pebble.owner_id, [pebble.id])
     return pebble
 
+@router.get("/search", response_model=List[PebbleSearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    return ORJSONResponse(await search_pebbles(current_user["username"], q, limit))
+
 @router.put("/pebbles/{pebble_id}")
 async def update_pebble(pebble_id: str, update_data: dict, current_user: dict = Depends(get_current_user)):
-    print(f"Update Request for {pebble_id}: {update_data.keys()}") # ★ Debug Log
-    
-    result = await pebbles_collection.update_one(
-        {"id": pebble_id, "owner_id": current_user["username"]},
-        {"$set": update_data}
-    )
+    logger.debug("update pebble", extra={"pebble_id": pebble_id, "fields": sorted(update_data)})
+    try:
+        update_data = validate_update("pebble", update_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    print(f"Matched: {result.matched_count}, Modified: {result.modified_count}") # ★ Debug Log
-    
-    if result.matched_count == 0:
+    # 内容字段的修改同时记一条修订 (差异)，见 app/revisions.py
+    try:
+        updated = await update_with_revision(current_user["username"], pebble_id, update_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RevisionChainError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not updated:
         # 如果匹配数为0，说明 ID 不对或者 Owner 不对
-        print("Update Failed: Document not found or permission denied.")
         raise HTTPException(status_code=404, detail="Pebble not found")
-        
+
+    await bump_version(current_user["username"])
+    if changes_embeddings(update_data):
+        await semantic_index.changed(current_user["username"], [pebble_id])
     return {"status": "success"}
 
 @router.delete("/pebbles/{pebble_id}")
 async def delete_pebble(pebble_id: str, current_user: dict = Depends(get_current_user)):
-    # 软删除
+    # 软删除 (保留墓碑，增量同步才能把删除下发给其他设备)
     await pebbles_collection.update_one(
         {"id": pebble_id, "owner_id": current_user["username"]},
-        {"$set": {"isDeleted": True}}
+        {"$set": stamp({"isDeleted": True})}
     )
+    await bump_version(current_user["username"])
+    await semantic_index.changed(current_user["username"], [pebble_id])
     return {"status": "deleted"}
 
 # --- Folders Endpoints ---
 
-@router.get("/folders", response_model=List[Folder])
-async def get_folders(current_user: dict = Depends(get_current_user)):
-    cursor = folders_collection.find({"owner_id": current_user["username"]})
-    return await cursor.to_list(length=1000)
+@router.get("/folders", response_model=FolderPage)
+async def get_folders(
+    request: Request,
+    limit: int = Query(default=MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    etag, not_modified = await conditional(request, current_user["username"])
+    if not_modified:
+        return not_modified
+
+    # 按 id 升序的 keyset 分页 (走 {owner_id, id} 唯一索引)，cursor 为上一页最后一个 id
+    query = {"owner_id": current_user["username"], "isDeleted": {"$ne": True}}
+    if cursor:
+        query["id"] = {"$gt": _decode_folder_cursor(cursor)}
+    docs = await folders_collection.find(query, FOLDER_PROJECTION) \
+        .sort("id", 1) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    return ORJSONResponse(
+        {"items": docs, "nextCursor": _encode_folder_cursor(docs[-1]) if has_more else None},
+        headers=cache_headers(etag),
+    )
 
 @router.post("/folders", response_model=Folder)
 async def create_folder(folder: Folder, current_user: dict = Depends(get_current_user)):
     folder.owner_id = current_user["username"]
-    await folders_collection.insert_one(folder.dict())
+    folder.updatedAt = now_ms()
+    doc = folder.model_dump()
+    doc["ancestors"] = await ancestors_for(folder.owner_id, folder.parentId)
+    await folders_collection.insert_one(doc)
+    await bump_version(folder.owner_id)
     return folder
 
 # ★★★ 新增：更新文件夹接口 ★★★
 @router.put("/folders/{folder_id}")
 async def update_folder(folder_id: str, update_data: dict, current_user: dict = Depends(get_current_user)):
     # 同样只允许修改属于当前用户的文件夹
-    result = await folders_collection.update_one(
-        {"id": folder_id, "owner_id": current_user["username"]},
-        {"$set": update_data}
-    )
+    selector = {"id": folder_id, "owner_id": current_user["username"]}
+    folder = await folders_collection.find_one(selector, FOLDER_PROJECTION)
+    if folder is None:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    try:
+        _, update_data = apply_update("folder", folder, validate_update("folder", update_data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 修改 parentId 等同于移动整个子树 (需要同步更新后代的 ancestors)
+    if "parentId" in update_data:
+        await _move_folder(current_user["username"], folder_id, update_data.pop("parentId"))
+        await bump_version(current_user["username"])
+        if not update_data:
+            return {"status": "success", "id": folder_id}
+
+    await folders_collection.update_one(selector, {"$set": stamp(update_data)})
+    await bump_version(current_user["username"])
     # 即使没有修改行数(名字一样)也返回成功
     return {"status": "success", "id": folder_id}
 
 @router.post("/folders/{folder_id}/ungroup")
 async def ungroup_folder_endpoint(folder_id: str, current_user: dict = Depends(get_current_user)):
-    # 1. 获取当前文件夹信息（为了知道它的 parentId 是什么）
-    folder = await folders_collection.find_one({"id": folder_id, "owner_id": current_user["username"]})
-    if not folder:
-        raise HTTPException(status_code=404, detail="Folder not found")
-    
-    target_parent_id = folder.get("parentId")
+    # pebbles 和子文件夹上移一级，然后软删除该文件夹 (同一个事务内)
+    try:
+        target_parent_id = await ungroup(current_user["username"], folder_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await bump_version(current_user["username"])
+    return {"status": "ungrouped", "moved_to": target_parent_id}
 
-    # 2. 将该文件夹下的所有 Pebble 移动到上一级
-    await pebbles_collection.update_many(
-        {"folderId": folder_id, "owner_id": current_user["username"]},
-        {"$set": {"folderId": target_parent_id}}
-    )
+# --- Folder Subtree Endpoints ---
 
-    # 3. 将该文件夹下的所有 子文件夹 移动到上一级
-    await folders_collection.update_many(
-        {"parentId": folder_id, "owner_id": current_user["username"]},
-        {"$set": {"parentId": target_parent_id}}
-    )
+async def _move_folder(owner: str, folder_id: str, parent_id: Optional[str]) -> dict:
+    try:
+        return await move_subtree(owner, folder_id, parent_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except FolderTreeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/folders/{folder_id}/move")
+async def move_folder(
+    folder_id: str,
+    parentId: Optional[str] = Body(..., embed=True),
+    current_user: dict = Depends(get_current_user)
+):
+    """把整个子树移动到 parentId 下 (None 表示根目录)"""
+    result = await _move_folder(current_user["username"], folder_id, parentId)
+    await bump_version(current_user["username"])
+    return result
+
+@router.delete("/folders/{folder_id}")
+async def delete_folder(folder_id: str, current_user: dict = Depends(get_current_user)):
+    """软删除文件夹、所有子文件夹和其中的 pebbles"""
+    try:
+        result = await delete_subtree(current_user["username"], folder_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await bump_version(current_user["username"])
+    if result["pebbles"]:
+        await semantic_index.changed(current_user["username"])
+    return result
 
-    # 4. 删除空文件夹
-    await folders_collection.delete_one({"id": folder_id})
+@router.post("/folders/{folder_id}/restore")
+async def restore_folder(folder_id: str, current_user: dict = Depends(get_current_user)):
+    """恢复 DELETE /folders/{id} 删除的内容；原父文件夹已不存在时恢复到根目录"""
+    try:
+        result = await restore_subtree(current_user["username"], folder_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    await bump_version(current_user["username"])
+    if result["pebbles"]:
+        await semantic_index.changed(current_user["username"])
+    return result
 
-    return {"status": "ungrouped", "moved_to": target_parent_id}
\ No newline at end of file
+@router.get("/folder-counts")
+async def folder_counts(request: Request, root: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    """{folderId: 该文件夹及所有子文件夹下的 pebble 数}；没有 pebble 的文件夹不出现"""
+    etag, not_modified = await conditional(request, current_user["username"])
+    if not_modified:
+        return not_modified
+    return ORJSONResponse(await recursive_counts(current_user["username"], root), headers=cache_headers(etag))
@@ -0,0 +1,47 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from app.models import RevisionPage, RevisionDetail
+from app.routers.auth import get_current_user
+from app.revisions import (
+    RevisionNotFound, RevisionChainError, list_revisions, reconstruct, restore_revision,
+)
+
+router = APIRouter()
+
+MAX_PAGE_SIZE = 100
+
+@router.get("/pebbles/{pebble_id}/revisions", response_model=RevisionPage)
+async def get_revisions(
+    pebble_id: str,
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_SIZE),
+    before_seq: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """修订列表，按 seq 倒序 (最新在前)；翻页时把上一页的 nextBeforeSeq 作为 before_seq 传回"""
+    items = await list_revisions(current_user["username"], pebble_id, limit + 1, before_seq)
+    has_more = len(items) > limit
+    items = items[:limit]
+    return ORJSONResponse({"items": items, "nextBeforeSeq": items[-1]["seq"] if has_more else None})
+
+@router.get("/pebbles/{pebble_id}/revisions/{seq}", response_model=RevisionDetail)
+async def get_revision(pebble_id: str, seq: int, current_user: dict = Depends(get_current_user)):
+    """重建某个版本的内容 (预览)"""
+    try:
+        revision, state = await reconstruct(current_user["username"], pebble_id, seq)
+    except RevisionNotFound:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    except RevisionChainError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return ORJSONResponse({"revision": revision, "state": state})
+
+@router.post("/pebbles/{pebble_id}/revisions/{seq}/restore")
+async def restore(pebble_id: str, seq: int, current_user: dict = Depends(get_current_user)):
+    """把内容恢复到该版本；恢复会记成一条新的修订"""
+    try:
+        new_seq = await restore_revision(current_user["username"], pebble_id, seq)
+    except RevisionNotFound:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    except RevisionChainError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "restored", "seq": new_seq}
@@ -0,0 +1,209 @@
+import base64
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
+from typing import Optional
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.models import SyncBatchRequest, SyncOperation
+from app.database import settings, pebbles_collection, folders_collection
+from app.documents import (
+    MODELS, validate_update, apply_update, stamp, now_ms, PUBLIC_PROJECTION, FOLDER_PROJECTION,
+    derived_fields, with_derived_fields, touches_derived_fields, changes_embeddings,
+)
+from app.routers.auth import get_current_user
+from app.folders import FolderTreeError, repair_ancestors, folder_parents, check_move
+from app.revisions import tracks, tracked, record_revision
+from app.semantic import semantic_index
+from app.versioning import bump_version
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPERATIONS = 500
+MAX_CHANGES_PAGE = 1000
+
+COLLECTIONS = {"pebble": pebbles_collection, "folder": folders_collection}
+MOVE_FIELDS = {"pebble": "folderId", "folder": "parentId"}
+PROJECTIONS = {"pebble": PUBLIC_PROJECTION, "folder": FOLDER_PROJECTION}
+
+# --- Batch Mutations ---
+
+def _to_write(op: SyncOperation, owner: str, current: dict | None) -> tuple:
+    """把一个同步操作翻译成 (UpdateOne, 执行后的文档)；current 是批内此前的最新内容 (没读过为 None)。
+    非法操作抛 ValueError / LookupError"""
+    selector = {"id": op.id, "owner_id": owner}
+
+    if op.op == "create":
+        # upsert + $setOnInsert：客户端重试同一个 create 不会重复插入
+        try:
+            doc = MODELS[op.kind](**{**(op.data or {}), "id": op.id, "owner_id": owner})
+        except ValidationError as e:
+            raise ValueError(str(e))
+        doc = stamp(doc.model_dump())
+        if op.kind == "pebble":
+            with_derived_fields(doc)
+        return UpdateOne(selector, {"$setOnInsert": doc}, upsert=True), current or doc
+    if op.op == "update":
+        # 在当前内容上应用并用模型校验，写入校验后的值 (见 documents.apply_update)
+        if current is None:
+            raise LookupError(f"{op.kind.capitalize()} not found")
+        update_data = validate_update(op.kind, op.data or {})
+        after, update = apply_update(op.kind, current, update_data)
+        if op.kind == "pebble" and touches_derived_fields(update_data):
+            update.update(derived_fields(after))
+        return UpdateOne(selector, {"$set": stamp(update)}), after
+    field, value = ("isDeleted", True) if op.op == "delete" else (MOVE_FIELDS[op.kind], op.target)
+    return UpdateOne(selector, {"$set": stamp({field: value})}), current and {**current, field: value}
+
+def _check_folder_op(op: SyncOperation, parents: dict):
+    """文件夹的 parentId 变化先在内存里按提交顺序校验 (不能移动进自己的子树)，通过后更新 parents"""
+    data = op.data or {}
+    if op.op == "create":
+        if op.id not in parents:
+            # 重复的 create 不会覆盖已有文档 ($setOnInsert)
+            if data.get("parentId") == op.id:
+                raise FolderTreeError("Cannot move a folder into its own subtree")
+            parents[op.id] = [data.get("parentId"), False]
+        return
+    if op.op == "move" or "parentId" in data:
+        parent_id = op.target if op.op == "move" else data["parentId"]
+        check_move(parents, op.id, parent_id)
+        parents[op.id][0] = parent_id
+    if op.id in parents and op.op == "delete":
+        parents[op.id][1] = True
+
+@router.post("/sync/batch")
+async def sync_batch(request: SyncBatchRequest, current_user: dict = Depends(get_current_user)):
+    """一次请求提交多个操作，每个集合只做一次 bulk_write (同一集合内按提交顺序执行)"""
+    if len(request.operations) > MAX_BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_OPERATIONS} operations per batch")
+
+    owner = current_user["username"]
+    errors = []
+    # kind -> [(请求中的下标, UpdateOne)]
+    writes = {"pebble": [], "folder": []}
+    # 改到内容字段的 pebble 更新：(下标, id, 编辑前, 编辑后)，写入成功后记修订 (见 app/revisions.py)
+    edits = []
+    moves_folders = any(
+        op.kind == "folder" and (op.op == "move" or (op.op == "update" and "parentId" in (op.data or {})))
+        for op in request.operations
+    )
+    parents = await folder_parents(owner) if moves_folders else None
+    # 被更新的文档一次批量读出，批内的操作按提交顺序在内存里累积
+    docs = {}
+    for kind, collection in COLLECTIONS.items():
+        ids = list({op.id for op in request.operations if op.kind == kind and op.op == "update"})
+        cursor = collection.find({"owner_id": owner, "id": {"$in": ids}}, {"_id": 0, "searchTerms": 0, "embedding": 0})
+        docs[kind] = {d["id"]: d async for d in cursor} if ids else {}
+    for index, op in enumerate(request.operations):
+        try:
+            write, after = _to_write(op, owner, docs[op.kind].get(op.id))
+            if op.kind == "folder" and parents is not None:
+                _check_folder_op(op, parents)
+            writes[op.kind].append((index, write))
+            if op.kind == "pebble" and op.op == "update" and tracks(op.data or {}):
+                edits.append((index, op.id, tracked(docs["pebble"][op.id]), tracked(after)))
+            if after is not None:
+                docs[op.kind][op.id] = after
+        except (ValueError, LookupError) as e:
+            errors.append({"index": index, "detail": str(e)})
+
+    applied = 0
+    for kind, entries in writes.items():
+        if not entries:
+            continue
+        try:
+            await COLLECTIONS[kind].bulk_write([w for _, w in entries], ordered=True)
+            applied += len(entries)
+        except BulkWriteError as e:
+            # 有序执行：出错的那条之后的操作都没有执行
+            failed_at = e.details["writeErrors"][0]["index"]
+            applied += failed_at
+            errors.append({"index": entries[failed_at][0], "detail": e.details["writeErrors"][0]["errmsg"]})
+            errors.extend(
+                {"index": index, "detail": "Not applied: an earlier operation in this batch failed"}
+                for index, _ in entries[failed_at + 1:]
+            )
+
+    failed = {e["index"] for e in errors}
+    applied_ops = [op for index, op in enumerate(request.operations) if index not in failed]
+    for index, pebble_id, before, after in edits:
+        if index in failed:
+            continue
+        try:
+            await record_revision(owner, pebble_id, before, after)
+        except Exception as e:
+            logger.warning("revision record failed", extra={"pebble_id": pebble_id, "error": repr(e)})
+    # 新建 / 移动过的文件夹按提交顺序重算子树的 ancestors
+    await repair_ancestors(owner, list(dict.fromkeys(
+        op.id for op in applied_ops
+        if op.kind == "folder" and (op.op in ("create", "move") or "parentId" in (op.data or {}))
+    )))
+
+    if applied:
+        await bump_version(owner)
+    embedded = list(dict.fromkeys(
+        op.id for op in applied_ops
+        if op.kind == "pebble" and (op.op in ("create", "delete") or (op.op == "update" and changes_embeddings(op.data or {})))
+    ))
+    if embedded:
+        await semantic_index.changed(owner, embedded)
+
+    errors.sort(key=lambda e: e["index"])
+    return {"applied": applied, "errors": errors, "serverTime": now_ms()}
+
+# --- Delta Sync ---
+
+def _encode_cursor(position: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {kind: (float(position[kind][0]), str(position[kind][1])) for kind in COLLECTIONS}
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/sync/changes")
+async def sync_changes(
+    since: float = 0,
+    cursor: Optional[str] = None,
+    limit: int = Query(default=500, ge=1, le=MAX_CHANGES_PAGE),
+    current_user: dict = Depends(get_current_user)
+):
+    """返回 updatedAt 晚于 since 的 pebbles / folders (包含 isDeleted 墓碑)。
+
+    hasMore 为 True 时用返回的 cursor 继续拉取；同步完成后保存 cursor，下次直接传 cursor 即可。
+    updatedAt 在写入前打上，提交可能更晚 (其他请求 / 实例的时钟也可能有偏差)，所以读到末尾时
+    cursor 回退 SYNC_SAFETY_LAG_MS，下次重新读这段时间窗；同一条记录可能重复返回，客户端按 id 覆盖即可。
+    """
+    position = _decode_cursor(cursor) if cursor else {kind: (since, "") for kind in COLLECTIONS}
+    owner = current_user["username"]
+    response = {"hasMore": False}
+
+    for kind, collection in COLLECTIONS.items():
+        updated_at, last_id = position[kind]
+        # 按 (updatedAt, id) 翻页，批量更新产生的相同 updatedAt 也不会丢
+        docs = await collection.find(
+            {
+                "owner_id": owner,
+                "$or": [{"updatedAt": {"$gt": updated_at}}, {"updatedAt": updated_at, "id": {"$gt": last_id}}],
+            },
+            PROJECTIONS[kind],
+        ).sort([("updatedAt", 1), ("id", 1)]).limit(limit + 1).to_list(length=limit + 1)
+
+        full = len(docs) > limit
+        if full:
+            docs = docs[:limit]
+            response["hasMore"] = True
+        if docs:
+            position[kind] = (docs[-1]["updatedAt"], docs[-1]["id"])
+        if not full:
+            position[kind] = min(position[kind], (now_ms() - settings.SYNC_SAFETY_LAG_MS, ""))
+        response[f"{kind}s"] = docs
+
+    response["cursor"] = _encode_cursor(position)
+    return ORJSONResponse(response)
@@ -0,0 +1,73 @@
+# backend/app/search.py
+
+import re
+from app.database import pebbles_collection
+
+# 每个 pebble 在写入时生成 searchTerms: [{"t": 词, "w": 权重}]，
+# 配合 {owner_id, searchTerms.t} 多键索引做按用户隔离的前缀检索
+FIELD_WEIGHTS = {"topic": 8, "title": 6, "keywords": 5, "summary": 3, "heading": 2, "body": 1}
+MAX_TERMS = 400          # 单个文档最多保留的词条 (按权重取前 N)
+MAX_QUERY_TOKENS = 8
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text) -> list:
+    if isinstance(text, list):
+        text = " ".join(str(t) for t in text)
+    return _TOKEN_RE.findall(str(text or "").casefold())
+
+
+def build_search_terms(doc: dict) -> list:
+    weights = {}
+
+    def add(text, weight):
+        for token in tokenize(text):
+            if weights.get(token, 0) < weight:
+                weights[token] = weight
+
+    add(doc.get("topic"), FIELD_WEIGHTS["topic"])
+    for level in (doc.get("content") or {}).values():
+        add(level.get("title"), FIELD_WEIGHTS["title"])
+        add(level.get("summary"), FIELD_WEIGHTS["summary"])
+        add(level.get("keywords"), FIELD_WEIGHTS["keywords"])
+        for block in level.get("mainContent", []) + level.get("sidebarContent", []):
+            add(block.get("heading"), FIELD_WEIGHTS["heading"])
+            add(block.get("body"), FIELD_WEIGHTS["body"])
+
+    ranked = sorted(weights.items(), key=lambda kv: -kv[1])[:MAX_TERMS]
+    return [{"t": token, "w": weight} for token, weight in ranked]
+
+
+async def search_pebbles(owner: str, query: str, limit: int) -> list:
+    """每个查询词做前缀匹配 (全部命中才返回)；完整命中的词按 2 倍权重计分"""
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+
+    prefix_match = {"$or": [{"$eq": [{"$substrCP": ["$$e.t", 0, len(t)]}, t]} for t in tokens]}
+    pipeline = [
+        {"$match": {
+            "owner_id": owner,
+            "isDeleted": False,
+            "$and": [{"searchTerms.t": re.compile("^" + re.escape(t))} for t in tokens],
+        }},
+        {"$addFields": {"score": {"$sum": {"$map": {
+            "input": "$searchTerms",
+            "as": "e",
+            "in": {"$switch": {
+                "branches": [
+                    {"case": {"$in": ["$$e.t", tokens]}, "then": {"$multiply": ["$$e.w", 2]}},
+                    {"case": prefix_match, "then": "$$e.w"},
+                ],
+                "default": 0,
+            }},
+        }}}}},
+        {"$sort": {"score": -1, "timestamp": -1}},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0, "id": 1, "topic": 1, "folderId": 1, "timestamp": 1, "isVerified": 1,
+            "emoji": {"$arrayElemAt": [{"$ifNull": ["$content.ELI5.emojiCollage", []]}, 0]}, "score": 1,
+        }},
+    ]
+    return await pebbles_collection.aggregate(pipeline).to_list(length=limit)
@@ -0,0 +1,199 @@
+# backend/app/semantic.py
+
+import math
+import zlib
+import numpy as np
+from collections import Counter
+from app.database import settings, pebbles_collection
+from app.search import tokenize
+from app.versioning import bump_embedding_version, current_embedding_version
+
+# 离线的哈希词袋向量：词 + 词内字符三元组 (对 CJK / 词形变化更友好) 经 crc32 映射到固定维度，
+# 带符号哈希减少碰撞偏差，次线性 TF 加字段权重，最后 L2 归一化，点积即余弦相似度
+EMBEDDING_DIM = 512
+EMBEDDING_DTYPE = np.float32
+FIELD_WEIGHTS = {"topic": 3.0, "keywords": 2.0, "summary": 1.0}
+# knn_edges 每块 (chunk × n) 的元素数上限：float32 相似度 + argpartition 的 int64 下标，约 24 MB
+KNN_BLOCK_ELEMENTS = 2 * 1024 * 1024
+
+
+def _features(text) -> Counter:
+    features = Counter()
+    for token in tokenize(text):
+        features[token] += 1
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            features["3:" + padded[i:i + 3]] += 0.5
+    return features
+
+
+def embed_fields(fields: list) -> np.ndarray:
+    """fields: [(文本或文本列表, 权重)]，返回归一化后的 float32 向量"""
+    vec = np.zeros(EMBEDDING_DIM, dtype=EMBEDDING_DTYPE)
+    for text, weight in fields:
+        for feature, tf in _features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vec[h % EMBEDDING_DIM] += sign * weight * (1.0 + math.log(tf + 1.0))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+def embed_pebble(doc: dict) -> np.ndarray:
+    fields = [(doc.get("topic"), FIELD_WEIGHTS["topic"])]
+    for level in (doc.get("content") or {}).values():
+        fields.append((level.get("summary"), FIELD_WEIGHTS["summary"]))
+        fields.append((level.get("keywords"), FIELD_WEIGHTS["keywords"]))
+    return embed_fields(fields)
+
+
+def embed_query(text: str) -> np.ndarray:
+    return embed_fields([(text, 1.0)])
+
+
+def to_bson(vec: np.ndarray) -> bytes:
+    """以紧凑的 float32 字节存储 (512 维 = 2KB)"""
+    return vec.astype(EMBEDDING_DTYPE).tobytes()
+
+
+class OwnerIndex:
+    """某个用户所有 pebble 向量组成的连续矩阵 (n × DIM)，行号与 ids 一一对应"""
+
+    def __init__(self, ids: list, topics: list, matrix: np.ndarray, version):
+        self.ids = ids
+        self.topics = topics
+        self.matrix = matrix
+        self.version = version
+        self.positions = {pebble_id: i for i, pebble_id in enumerate(ids)}
+
+    def top_k(self, query: np.ndarray, k: int, exclude: int | None = None) -> list:
+        """向量化的 top-k 余弦相似度，返回 [(行号, 分数)] 按分数降序"""
+        if not self.ids:
+            return []
+        scores = self.matrix @ query
+        if exclude is not None:
+            scores[exclude] = -np.inf
+        k = min(k, len(self.ids) - (exclude is not None))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def knn_edges(self, k: int, min_score: float, chunk_size: int | None = None) -> list:
+        """稀疏 kNN 图：每个节点取最相似的 k 个邻居，去重后返回无向边。
+
+        按行分块做矩阵乘，块大小由 n 决定 (chunk × n ≤ KNN_BLOCK_ELEMENTS)，内存占用与 n 无关，
+        输出边数为 O(n·k)。
+        """
+        n = len(self.ids)
+        k = min(k, n - 1)
+        if k <= 0:
+            return []
+
+        chunk_size = chunk_size or max(1, KNN_BLOCK_ELEMENTS // n)
+        edges = {}
+        for start in range(0, n, chunk_size):
+            block = self.matrix[start:start + chunk_size] @ self.matrix.T
+            rows = np.arange(block.shape[0])
+            block[rows, rows + start] = -np.inf
+            neighbors = np.argpartition(block, -k, axis=1)[:, -k:]
+            scores = block[rows[:, None], neighbors]
+            for r, (cols, row_scores) in enumerate(zip(neighbors, scores)):
+                i = start + r
+                for j, score in zip(cols.tolist(), row_scores.tolist()):
+                    if score < min_score:
+                        continue
+                    key = (i, j) if i < j else (j, i)
+                    if score > edges.get(key, -1.0):
+                        edges[key] = score
+
+        return [
+            {"source": self.ids[i], "target": self.ids[j], "weight": round(score, 4)}
+            for (i, j), score in edges.items()
+        ]
+
+
+    def patched(self, docs: list, removed: set, version) -> "OwnerIndex":
+        """替换 / 追加 docs 对应的行、去掉 removed 中的行，返回新的索引 (原索引不变，读者不会看到一半的状态)"""
+        ids, topics = list(self.ids), list(self.topics)
+        matrix = self.matrix.copy()
+        appended = []
+        for doc in docs:
+            row = np.frombuffer(doc["embedding"], dtype=EMBEDDING_DTYPE)
+            i = self.positions.get(doc["id"])
+            if i is None:
+                ids.append(doc["id"])
+                topics.append(doc["topic"])
+                appended.append(row)
+            else:
+                matrix[i] = row
+                topics[i] = doc["topic"]
+        if appended:
+            matrix = np.vstack([matrix, np.stack(appended)])
+        if removed:
+            keep = [i for i, pebble_id in enumerate(ids) if pebble_id not in removed]
+            ids, topics, matrix = [ids[i] for i in keep], [topics[i] for i in keep], matrix[keep]
+        return OwnerIndex(ids, topics, matrix, version)
+
+
+class SemanticIndex:
+    """按用户缓存 OwnerIndex。
+
+    以该用户的语义向量版本号 (versioning.bump_embedding_version) 作为索引版本：任何 worker 上
+    改动了向量之后都会 +1。本 worker 的缓存正好落后一个版本时 (期间没有别处的改动)，只重新读取
+    改动的行就地更新；否则下次请求时重建矩阵。
+    """
+
+    def __init__(self, max_owners: int):
+        self._max_owners = max_owners
+        self._indexes: dict = {}
+
+    async def _build(self, owner: str, version) -> OwnerIndex:
+        cursor = pebbles_collection.find(
+            {"owner_id": owner, "isDeleted": False, "embedding": {"$exists": True}},
+            {"_id": 0, "id": 1, "topic": 1, "embedding": 1},
+        )
+        ids, topics, rows = [], [], []
+        async for doc in cursor:
+            ids.append(doc["id"])
+            topics.append(doc["topic"])
+            rows.append(doc["embedding"])
+        matrix = (
+            np.frombuffer(b"".join(rows), dtype=EMBEDDING_DTYPE).reshape(len(rows), EMBEDDING_DIM)
+            if rows else np.zeros((0, EMBEDDING_DIM), dtype=EMBEDDING_DTYPE)
+        )
+        return OwnerIndex(ids, topics, matrix, version)
+
+    async def get(self, owner: str) -> OwnerIndex:
+        version = await current_embedding_version(owner)
+        index = self._indexes.get(owner)
+        if index is None or index.version != version:
+            index = await self._build(owner, version)
+            self._indexes.pop(owner, None)
+            if len(self._indexes) >= self._max_owners:
+                # 淘汰最久未使用的用户 (dict 保持插入顺序)
+                self._indexes.pop(next(iter(self._indexes)))
+            self._indexes[owner] = index
+        else:
+            # 移到末尾，标记为最近使用
+            self._indexes[owner] = self._indexes.pop(owner)
+        return index
+
+    async def changed(self, owner: str, pebble_ids: list | None = None):
+        """pebble 新建 / 删除 / 恢复或派生字段变化之后调用；pebble_ids 为 None 表示不确定改了哪些 (重建)"""
+        version = await bump_embedding_version(owner)
+        index = self._indexes.get(owner)
+        if index is None or pebble_ids is None or index.version != version - 1:
+            return
+        docs = await pebbles_collection.find(
+            {"owner_id": owner, "id": {"$in": list(pebble_ids)}, "isDeleted": False, "embedding": {"$exists": True}},
+            {"_id": 0, "id": 1, "topic": 1, "embedding": 1},
+        ).to_list(length=len(pebble_ids))
+        removed = set(pebble_ids) - {d["id"] for d in docs}
+        # 读取期间缓存可能已被重建 / 淘汰，只更新仍是同一个对象的缓存
+        if self._indexes.get(owner) is index:
+            self._indexes[owner] = index.patched(docs, removed, version)
+
+
+semantic_index = SemanticIndex(max_owners=settings.SEMANTIC_INDEX_MAX_OWNERS)
@@ -0,0 +1,118 @@
+# backend/app/stream_parser.py
+
+import json
+
+_SCALAR_END = set(',}] \t\r\n')
+
+
+class IncrementalJSONParser:
+    """增量 JSON 解析器：边接收 token 流边识别已经完整的值。
+
+    feed() 每次追加一段文本，返回本次新完成、且 want(path) 为 True 的 (path, value) 列表。
+    path 是由对象 key / 数组下标组成的 tuple，例如 ('eli5_content', 'mainContent', 0)。
+    根对象之前的内容 (如 ```json 围栏) 会被跳过。
+    """
+
+    def __init__(self, want):
+        self._want = want
+        self._text = ""
+        self._pos = 0
+        self._stack = []          # 每层: {"type", "path", "start", "key", "index", "expect_key"}
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._scalar_start = None
+        self.done = False
+
+    def _child_path(self, frame):
+        if frame["type"] == "object":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["index"],)
+
+    def _begin_value(self):
+        frame = self._stack[-1]
+        if frame["type"] == "array":
+            frame["index"] += 1
+        return self._child_path(frame)
+
+    def _emit(self, path, start, end, out):
+        if self._want(path):
+            out.append((path, json.loads(self._text[start:end])))
+
+    def _finish_scalar(self, end, out):
+        start, self._scalar_start = self._scalar_start, None
+        self._emit(self._child_path(self._stack[-1]), start, end, out)
+
+    def feed(self, chunk: str) -> list:
+        out = []
+        self._text += chunk
+        text = self._text
+        i = self._pos
+        n = len(text)
+
+        while i < n and not self.done:
+            c = text[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if self._string_is_key:
+                        frame["key"] = json.loads(text[self._string_start:i + 1])
+                    else:
+                        self._emit(self._child_path(frame), self._string_start, i + 1, out)
+                i += 1
+                continue
+
+            if self._scalar_start is not None and c in _SCALAR_END:
+                self._finish_scalar(i, out)
+
+            if not self._stack:
+                # 根对象之前的内容 (markdown 围栏等) 全部忽略
+                if c in '{[':
+                    self._stack.append({
+                        "type": "object" if c == '{' else "array", "path": (), "start": i,
+                        "key": None, "index": -1, "expect_key": c == '{',
+                    })
+            elif c == '"':
+                frame = self._stack[-1]
+                self._string_is_key = frame["type"] == "object" and frame["expect_key"]
+                if not self._string_is_key:
+                    self._begin_value()
+                self._in_string = True
+                self._string_start = i
+            elif c in '{[':
+                path = self._begin_value()
+                self._stack.append({
+                    "type": "object" if c == '{' else "array", "path": path, "start": i,
+                    "key": None, "index": -1, "expect_key": c == '{',
+                })
+            elif c in '}]':
+                frame = self._stack.pop()
+                self._emit(frame["path"], frame["start"], i + 1, out)
+                if not self._stack:
+                    self.done = True
+            elif c == ':':
+                self._stack[-1]["expect_key"] = False
+            elif c == ',':
+                frame = self._stack[-1]
+                if frame["type"] == "object":
+                    frame["expect_key"] = True
+            elif c not in ' \t\r\n' and self._scalar_start is None:
+                # 数字 / true / false / null
+                self._begin_value()
+                self._scalar_start = i
+
+            i += 1
+
+        self._pos = i
+        return out
+
+    @property
+    def text(self) -> str:
+        return self._text
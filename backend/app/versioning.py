@@ -0,0 +1,85 @@
+# backend/app/versioning.py
+# 每个用户的档案版本号 (users.archiveVersion)：pebbles / folders 的每次写入完成后 +1。
+# 列表类接口用 (用户, 版本号, 路径 + 查询参数) 生成强 ETag；If-None-Match 命中时直接 304，
+# 只查一次用户记录，不查询、不序列化文档。
+# 版本号是每个用户各自的计数，不同用户很容易相同，所以用户必须参与哈希；
+# 同一浏览器切换账号时，Vary: Authorization 让 HTTP 缓存不会把上一个用户的响应体拿来复用
+
+import hashlib
+from fastapi import Request, Response
+from pymongo import ReturnDocument
+from app.database import users_collection
+
+# 响应格式变化时改这个值，让客户端缓存的旧 ETag 全部失效
+ETAG_FORMAT = 1
+# 压缩中间件给 ETag 加的后缀 (同一资源的不同编码是不同的表示)，比较时去掉
+ENCODING_SUFFIXES = ("-gzip", "-br")
+CACHE_CONTROL = "private, no-cache"
+VARY = "Authorization"
+
+
+async def bump_version(owner: str):
+    """写入完成之后调用 (先写数据再 +1，读到新版本号的请求一定能读到新数据)"""
+    await users_collection.update_one({"username": owner}, {"$inc": {"archiveVersion": 1}})
+
+
+async def current_version(owner: str) -> int:
+    user = await users_collection.find_one({"username": owner}, {"_id": 0, "archiveVersion": 1})
+    return (user or {}).get("archiveVersion", 0)
+
+
+# 语义向量版本号 (users.embeddingVersion)：只在 pebble 新建 / 删除 / 恢复、或派生字段的来源
+# (topic / summary / keywords) 变化时 +1，移动 / 验证等写入不会让语义索引失效 (见 app/semantic.py)
+
+async def bump_embedding_version(owner: str) -> int:
+    """返回 +1 之后的版本号"""
+    user = await users_collection.find_one_and_update(
+        {"username": owner}, {"$inc": {"embeddingVersion": 1}},
+        projection={"_id": 0, "embeddingVersion": 1}, return_document=ReturnDocument.AFTER,
+    )
+    return (user or {}).get("embeddingVersion", 0)
+
+
+async def current_embedding_version(owner: str) -> int:
+    user = await users_collection.find_one({"username": owner}, {"_id": 0, "embeddingVersion": 1})
+    return (user or {}).get("embeddingVersion", 0)
+
+
+def make_etag(owner: str, version: int, request: Request) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    material = f"{ETAG_FORMAT}\0{owner}\0{request.url.path}?{query}"
+    digest = hashlib.sha1(material.encode()).hexdigest()[:12]
+    return f'"v{version}-{digest}"'
+
+
+def _normalize(tag: str) -> str:
+    # If-None-Match 使用弱比较：忽略 W/ 前缀和编码后缀
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_SUFFIXES:
+        if tag.endswith(suffix + '"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+
+def matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(_normalize(tag) == etag for tag in if_none_match.split(","))
+
+
+async def conditional(request: Request, owner: str) -> tuple:
+    """返回 (etag, 304 响应或 None)；读取版本号在查询文档之前，版本号只会比数据旧"""
+    etag = make_etag(owner, await current_version(owner), request)
+    if matches(request.headers.get("if-none-match"), etag):
+        return etag, Response(status_code=304, headers=cache_headers(etag))
+    return etag, None
+
+
+def cache_headers(etag: str) -> dict:
+    # no-cache：浏览器每次都带 If-None-Match 回源验证，未变化时 304 + 本地缓存；
+    # private：共享缓存 (代理 / CDN) 不缓存
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": VARY}
@@ -0,0 +1,182 @@
+"""本地假 LLM provider：实现 app/gemini_service.py 用到的 AsyncOpenAI / Gemini 调用形状，
+可配置延迟、错误率和流式分块，压测时不消耗真实 API 配额。
+
+    from fake_provider import FakeProviderConfig, install
+    install(FakeProviderConfig(latency=0.8, error_rate=0.02))
+
+install() 创建真实的 app/providers 实现并把其中的 SDK 客户端换成假的，放进 provider_registry，
+并给两个 provider 都填上假的 key，使故障切换路径也会被走到。
+"""
+
+import asyncio
+import json
+import random
+import re
+from types import SimpleNamespace
+
+
+class FakeProviderConfig:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.3, error_rate: float = 0.0,
+                 error_status: int = 503, chunks: int = 40, seed: int | None = None):
+        self.latency = latency          # 秒，单次调用的平均耗时 (流式为整个流)
+        self.jitter = jitter            # 相对抖动，耗时在 latency * (1 ± jitter) 内均匀分布
+        self.error_rate = error_rate    # 每次调用失败的概率
+        self.error_status = error_status
+        self.chunks = chunks            # 流式响应切成的块数
+        self.rng = random.Random(seed)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self) -> bool:
+        return self.rng.random() < self.error_rate
+
+
+class FakeProviderError(Exception):
+    """带 status_code，provider_router 按状态码判断是否重试 (默认 503 可重试)"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"fake provider error {status_code}")
+        self.status_code = status_code
+
+
+# ==========================================
+# 响应内容
+# ==========================================
+def _level(topic: str, depth: str) -> dict:
+    return {
+        "title": f"{topic} ({depth})",
+        "summary": f"A {depth} explanation of {topic} in a couple of sentences. " * 2,
+        "emojiCollage": ["🪨", "🌊", "✨"],
+        "mainContent": [
+            {"type": "text", "heading": f"Part {i}", "body": f"Paragraph about {topic}. " * 25, "iconType": "idea"}
+            for i in range(4)
+        ] + [{"type": "key_points", "heading": "Key points", "body": "one | two | three"}],
+        "sidebarContent": [
+            {"type": "definition", "heading": f"Term {i}", "body": "Definition text. " * 6} for i in range(3)
+        ],
+        "keywords": [topic.lower(), "alpha", "beta"],
+    }
+
+
+def _topic(prompt: str) -> str:
+    # _build_prompt 里的 Topic: "<topic>"
+    match = re.search(r'Topic: "([^"\n]*)"', prompt)
+    return match.group(1) if match else "Fake topic"
+
+
+def reply(prompt: str) -> str:
+    """按 prompt 的种类返回合法输出：批量改写 / 单条改写 / 生成 artifact"""
+    if '"items"' in prompt and "Input:" in prompt:
+        payload = json.loads(prompt[prompt.index("Input:") + len("Input:"):prompt.index("OUTPUT MUST")])
+        return json.dumps({"items": [{"id": item["id"], "text": item["text"][::-1]} for item in payload["items"]]})
+    if "Original Text:" in prompt:      # Gemini 单条改写
+        return prompt.split("Original Text:", 1)[1].split("Output ONLY", 1)[0].strip()[::-1]
+    if "\n\nOriginal: " in prompt:      # DeepSeek 单条改写
+        return prompt.split("\n\nOriginal: ", 1)[1][::-1]
+    topic = _topic(prompt)
+    return json.dumps({
+        "eli5_content": _level(topic, "simple"),
+        "academic_content": _level(topic, "academic"),
+        "socratic_questions": [f"Why does {topic} matter?", f"How would you test {topic}?"],
+    }, ensure_ascii=False)
+
+
+def _split(text: str, n: int) -> list:
+    size = max(1, -(-len(text) // max(1, n)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _prompt_of(messages: list) -> str:
+    return "\n".join(m["content"] for m in messages if m["role"] == "user")
+
+
+# ==========================================
+# AsyncOpenAI 形状 (DeepSeek)
+# ==========================================
+class _Completions:
+    def __init__(self, config: FakeProviderConfig):
+        self.config = config
+
+    async def create(self, *, messages, stream=False, **kwargs):
+        prompt = _prompt_of(messages)
+        text = reply(prompt)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(text) // 4)
+        if not stream:
+            await asyncio.sleep(self.config.delay())
+            if self.config.should_fail():
+                raise FakeProviderError(self.config.error_status)
+            message = SimpleNamespace(content=text)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+        return self._stream(text, usage)
+
+    async def _stream(self, text: str, usage):
+        # 失败只发生在第一个 chunk 之前 (与真实 provider 的连接错误一致)，router 才能切换
+        pieces = _split(text, self.config.chunks)
+        per_chunk = self.config.delay() / len(pieces)
+        await asyncio.sleep(per_chunk)
+        if self.config.should_fail():
+            raise FakeProviderError(self.config.error_status)
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(per_chunk)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeAsyncOpenAI:
+    def __init__(self, config: FakeProviderConfig):
+        self.chat = SimpleNamespace(completions=_Completions(config))
+
+    async def close(self):
+        pass
+
+
+# ==========================================
+# google.generativeai.GenerativeModel 形状
+# ==========================================
+class FakeGeminiModel:
+    def __init__(self, config: FakeProviderConfig):
+        self.config = config
+
+    @staticmethod
+    def _usage(prompt: str, text: str):
+        return SimpleNamespace(prompt_token_count=len(prompt) // 4, candidates_token_count=len(text) // 4)
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        text = reply(prompt)
+        if not stream:
+            await asyncio.sleep(self.config.delay())
+            if self.config.should_fail():
+                raise FakeProviderError(self.config.error_status)
+            return SimpleNamespace(text=text, usage_metadata=self._usage(prompt, text))
+        return self._stream(prompt, text)
+
+    async def _stream(self, prompt: str, text: str):
+        pieces = _split(text, self.config.chunks)
+        per_chunk = self.config.delay() / len(pieces)
+        await asyncio.sleep(per_chunk)
+        if self.config.should_fail():
+            raise FakeProviderError(self.config.error_status)
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(per_chunk)
+            last = i == len(pieces) - 1
+            yield SimpleNamespace(text=piece, usage_metadata=self._usage(prompt, text) if last else None)
+
+
+def install(config: FakeProviderConfig):
+    """把 provider 的 SDK 客户端换成假的；需在应用处理请求之前调用"""
+    from app.database import settings
+    from app.providers import provider_registry, deepseek, gemini
+
+    fake_deepseek = deepseek.Provider()
+    fake_deepseek._client = FakeAsyncOpenAI(config)
+    fake_gemini = gemini.Provider()
+    model = FakeGeminiModel(config)
+    fake_gemini._models = {True: model, False: model}
+
+    provider_registry.install("deepseek", fake_deepseek)
+    provider_registry.install("gemini", fake_gemini)
+    settings.DEEPSEEK_API_KEY = settings.DEEPSEEK_API_KEY or "fake"
+    settings.GEMINI_API_KEY = settings.GEMINI_API_KEY or "fake"
@@ -0,0 +1,455 @@
+"""端到端压测：在进程内通过 ASGI 直接驱动真实的 FastAPI app (不经过网络栈)，
+provider 换成本地假实现 (benchmarks/fake_provider.py)，不消耗 API 配额。
+
+按权重混合场景 (登录、加载档案、生成、流式生成、后台任务、改写、自动保存连发、取消分组)，
+固定并发的虚拟用户循环执行，输出每个接口的 p50 / p95 / p99 / RPS，
+可写成 JSON 并与之前某次提交的结果对比。
+
+    cd backend
+    python benchmarks/loadtest.py                                  # 内存 Mongo (需要 mongomock-motor)
+    python benchmarks/loadtest.py --mongo mongodb://localhost:27017  # 本地 mongod，用临时库，结束后删除
+    python benchmarks/loadtest.py --concurrency 64 --duration 60 --mix archive=5,autosave=3,generate=1
+    python benchmarks/loadtest.py --output before.json
+    python benchmarks/loadtest.py --output after.json --compare before.json
+
+内存 Mongo 只适合比较应用层开销 (序列化、校验、路由、provider 调度)；
+涉及索引 / 查询计划的改动请用真实 mongod 测。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SCENARIOS = ("login", "archive", "generate", "generate_stream", "generate_job", "rewrite", "autosave", "ungroup")
+DEFAULT_MIX = "login=2,archive=30,generate=6,generate_stream=4,generate_job=2,rewrite=16,autosave=35,ungroup=5"
+PASSWORD = "loadtest-password"
+
+
+# ==========================================
+# 结果统计
+# ==========================================
+def percentile(ordered: list, p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.enabled = True     # 预热阶段关闭
+        self.samples = {}       # 名称 -> [耗时 (秒)]
+        self.errors = {}        # 名称 -> {状态码: 次数}
+
+    def add(self, name: str, seconds: float, status: int):
+        if not self.enabled:
+            return
+        self.samples.setdefault(name, []).append(seconds)
+        if status >= 400:
+            errors = self.errors.setdefault(name, {})
+            errors[str(status)] = errors.get(str(status), 0) + 1
+
+    def summary(self, wall: float) -> dict:
+        result = {}
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            result[name] = {
+                "count": len(ordered),
+                "errors": sum(self.errors.get(name, {}).values()),
+                "status": self.errors.get(name, {}),
+                "rps": round(len(ordered) / wall, 2),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return result
+
+
+# ==========================================
+# 虚拟用户会话
+# ==========================================
+class Session:
+    def __init__(self, client, recorder: Recorder, username: str, token: str, rng: random.Random, args):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.rng = rng
+        self.args = args
+        self.pebble_ids = []
+
+    async def request(self, name: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        self.recorder.add(name, time.perf_counter() - started, response.status_code)
+        return response
+
+    def topic(self) -> str:
+        # 主题池有限，重复主题会命中生成缓存，与线上情况类似
+        return f"Loadtest topic {self.rng.randrange(self.args.topics)}"
+
+
+async def scenario_login(s: Session):
+    started = time.perf_counter()
+    response = await s.client.post("/auth/token", data={"username": s.username, "password": PASSWORD})
+    s.recorder.add("POST /auth/token", time.perf_counter() - started, response.status_code)
+
+
+async def scenario_archive(s: Session):
+    """打开档案页：分页拉取摘要列表、文件夹，再按 id 取前几条完整文档"""
+    cursor = None
+    while True:
+        params = {"view": "summary", "limit": 100}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await s.request("GET /api/pebbles?view=summary", "GET", "/api/pebbles", params=params)).json()
+        cursor = page.get("nextCursor")
+        if not cursor:
+            break
+    await s.request("GET /api/folders", "GET", "/api/folders")
+    if s.pebble_ids:
+        ids = s.rng.sample(s.pebble_ids, min(20, len(s.pebble_ids)))
+        await s.request("POST /api/pebbles/by-ids", "POST", "/api/pebbles/by-ids", json={"ids": ids})
+
+
+async def scenario_generate(s: Session):
+    response = await s.request("POST /api/generate", "POST", "/api/generate", json={"topic": s.topic()})
+    if response.status_code == 200:
+        s.pebble_ids.append(response.json()["id"])
+
+
+async def scenario_generate_stream(s: Session):
+    # ASGITransport 会缓冲整个响应体，这里测的是整个流的时长
+    await s.request("POST /api/generate/stream", "POST", "/api/generate/stream", json={"topic": s.topic()})
+
+
+async def scenario_generate_job(s: Session):
+    response = await s.request("POST /api/generate/jobs", "POST", "/api/generate/jobs", json={"topic": s.topic()})
+    if response.status_code != 202:
+        return
+    job_id = response.json()["id"]
+    for _ in range(10):
+        job = (await s.request("GET /api/generate/jobs/{id}", "GET", f"/api/generate/jobs/{job_id}",
+                               params={"wait": 10})).json()
+        if job.get("status") in ("succeeded", "failed"):
+            break
+
+
+async def scenario_rewrite(s: Session):
+    text = " ".join(f"Sentence {s.rng.randrange(10_000)} about the topic." for _ in range(s.rng.randint(1, 6)))
+    mode = s.rng.choice(("improve", "shorter", "longer", "simplify"))
+    await s.request("POST /api/rewrite", "POST", "/api/rewrite", json={"text": text, "mode": mode})
+
+
+async def scenario_autosave(s: Session):
+    """编辑器自动保存连发：同一篇文档短时间内连续多次小修改"""
+    if not s.pebble_ids:
+        return
+    pebble_id = s.rng.choice(s.pebble_ids)
+    for i in range(s.args.autosave_burst):
+        body = {f"content.ELI5.mainContent.{s.rng.randrange(4)}.body": f"Edited paragraph {i} " * 20}
+        await s.request("PUT /api/pebbles/{id}", "PUT", f"/api/pebbles/{pebble_id}", json=body)
+        await asyncio.sleep(s.args.autosave_interval)
+
+
+async def scenario_ungroup(s: Session):
+    """新建文件夹，移入几篇文档，再取消分组"""
+    folder_id = str(uuid.uuid4())
+    folder = {"id": folder_id, "name": "Loadtest folder", "parentId": None, "createdAt": time.time() * 1000}
+    await s.request("POST /api/folders", "POST", "/api/folders", json=folder)
+    moved = s.rng.sample(s.pebble_ids, min(5, len(s.pebble_ids)))
+    operations = [{"op": "move", "kind": "pebble", "id": pid, "target": folder_id} for pid in moved]
+    if operations:
+        await s.request("POST /api/sync/batch", "POST", "/api/sync/batch", json={"operations": operations})
+    await s.request("POST /api/folders/{id}/ungroup", "POST", f"/api/folders/{folder_id}/ungroup")
+
+
+SCENARIO_FUNCS = {name: globals()[f"scenario_{name}"] for name in SCENARIOS}
+
+
+# ==========================================
+# 准备数据 / 执行
+# ==========================================
+async def _seed_user(client, index: int, archive_size: int, run_id: str) -> tuple:
+    from fake_provider import reply
+    from app.gemini_service import _parse_artifact
+
+    username = f"loadtest-{run_id}-{index}"
+    response = await client.post("/auth/register", json={"username": username, "password": PASSWORD})
+    response.raise_for_status()
+    token = response.json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    ids = []
+    operations = []
+    now = time.time() * 1000
+    for i in range(archive_size):
+        topic = f"Seed topic {i}"
+        pebble = _parse_artifact(reply(f'Topic: "{topic}"'), topic).model_dump()
+        pebble["timestamp"] = now - i * 1000
+        ids.append(pebble["id"])
+        operations.append({"op": "create", "kind": "pebble", "id": pebble["id"], "data": pebble})
+    for start in range(0, len(operations), 500):
+        response = await client.post("/api/sync/batch", json={"operations": operations[start:start + 500]},
+                                     headers=headers)
+        response.raise_for_status()
+    return username, token, ids
+
+
+async def _virtual_user(session: Session, mix: list, weights: list, deadline: float, scenario_times: dict, think: float):
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        name = session.rng.choices(mix, weights)[0]
+        started = time.perf_counter()
+        try:
+            await SCENARIO_FUNCS[name](session)
+        except Exception as e:
+            session.recorder.add(f"scenario {name} (exception: {type(e).__name__})", time.perf_counter() - started, 599)
+        if session.recorder.enabled:
+            scenario_times.setdefault(name, []).append(time.perf_counter() - started)
+        if think:
+            await asyncio.sleep(think)
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run(args, app) -> dict:
+    import httpx
+    from app.metrics import registry
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    mix = parse_mix(args.mix)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=300) as client:
+            print(f"seeding {args.users} users x {args.archive_size} pebbles ...", file=sys.stderr)
+            users = [await _seed_user(client, i, args.archive_size, run_id) for i in range(args.users)]
+            sessions = []
+            for i in range(args.concurrency):
+                username, token, ids = users[i % len(users)]
+                session = Session(client, recorder, username, token, random.Random(rng.random()), args)
+                # 同一用户的虚拟会话共享文档 id 列表 (新生成的也加进去)
+                session.pebble_ids = ids
+                sessions.append(session)
+
+            loop = asyncio.get_running_loop()
+            scenario_times = {}
+            if args.warmup:
+                recorder.enabled = False
+                print(f"warming up for {args.warmup}s ...", file=sys.stderr)
+                deadline = loop.time() + args.warmup
+                await asyncio.gather(*(_virtual_user(s, list(mix), list(mix.values()), deadline, scenario_times, args.think)
+                                       for s in sessions))
+                recorder.enabled = True
+
+            print(f"running {args.concurrency} virtual users for {args.duration}s ...", file=sys.stderr)
+            started = time.perf_counter()
+            deadline = loop.time() + args.duration
+            await asyncio.gather(*(_virtual_user(s, list(mix), list(mix.values()), deadline, scenario_times, args.think)
+                                   for s in sessions))
+            wall = time.perf_counter() - started
+
+    endpoints = recorder.summary(wall)
+    scenarios = {}
+    for name, samples in sorted(scenario_times.items()):
+        ordered = sorted(samples)
+        scenarios[name] = {
+            "count": len(ordered),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        }
+    total = sum(e["count"] for e in endpoints.values())
+    return {
+        "meta": _meta(args),
+        "totals": {
+            "requests": total,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "wall_s": round(wall, 3),
+            "rps": round(total / wall, 2),
+        },
+        "endpoints": endpoints,
+        "scenarios": scenarios,
+        "metrics": registry.render() if args.include_metrics else None,
+    }
+
+
+def _meta(args) -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return None
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--", "app")),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    }
+
+
+# ==========================================
+# 报告
+# ==========================================
+def print_report(report: dict, baseline: dict | None = None):
+    meta, totals = report["meta"], report["totals"]
+    print(f"\ncommit {meta['commit']}{' (dirty)' if meta['dirty'] else ''}  "
+          f"requests {totals['requests']}  errors {totals['errors']}  wall {totals['wall_s']}s  RPS {totals['rps']}")
+    if baseline:
+        base = baseline["totals"]
+        print(f"baseline {baseline['meta']['commit']}  requests {base['requests']}  errors {base['errors']}  "
+              f"RPS {base['rps']} ({_delta(totals['rps'], base['rps'])})")
+
+    header = f"{'endpoint':<40} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print("\n" + header + ("   Δp50     Δp95     Δp99" if baseline else ""))
+    for name, e in report["endpoints"].items():
+        line = f"{name:<40} {e['count']:>7} {e['errors']:>5} {e['rps']:>8} {e['p50_ms']:>9} {e['p95_ms']:>9} {e['p99_ms']:>9}"
+        old = (baseline or {}).get("endpoints", {}).get(name)
+        if old:
+            line += "  " + " ".join(f"{_delta(e[k], old[k]):>8}" for k in ("p50_ms", "p95_ms", "p99_ms"))
+        print(line)
+
+    print(f"\n{'scenario':<40} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, sc in report["scenarios"].items():
+        print(f"{name:<40} {sc['count']:>7} {sc['p50_ms']:>9} {sc['p95_ms']:>9} {sc['p99_ms']:>9}")
+
+
+def _delta(new: float, old: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+# ==========================================
+# 入口
+# ==========================================
+def _use_in_memory_mongo(database):
+    """把 app.database 的客户端 / 集合换成 mongomock_motor，须在导入其他 app 模块之前调用"""
+    try:
+        import mongomock_motor
+        import mongomock.collection
+    except ImportError:
+        raise SystemExit("in-memory mode needs mongomock-motor (pip install mongomock-motor), "
+                         "or pass --mongo mongodb://localhost:27017")
+
+    client = mongomock_motor.AsyncMongoMockClient()
+    database.client = client
+    database.db = client[database.settings.DB_NAME]
+    for name in list(vars(database)):
+        if name.endswith("_collection"):
+            setattr(database, name, database.db.get_collection(name[:-len("_collection")]))
+
+    # mongomock 兼容：pymongo 4.x 的 UpdateOne 会传 sort 参数
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    mongomock.collection.BulkOperationBuilder.add_update = lambda self, *a, sort=None, **k: add_update(self, *a, **k)
+
+    # mongomock 的 find_one_and_update(return_document=AFTER) 用原 filter 重新查询，
+    # filter 涉及被更新字段 (例如任务的 status) 时返回 None；按 _id 重新取
+    find_one_and_update = mongomock.collection.Collection.find_one_and_update
+
+    def _find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False, return_document=False, **kw):
+        if not return_document:
+            return find_one_and_update(self, filter, update, projection=projection, sort=sort, upsert=upsert, **kw)
+        before = find_one_and_update(self, filter, update, projection={"_id": 1}, sort=sort, upsert=upsert, **kw)
+        return None if before is None else self.find_one({"_id": before["_id"]}, projection)
+
+    mongomock.collection.Collection.find_one_and_update = _find_one_and_update
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mongo", default="memory", help="'memory' or a MongoDB URL (a temporary database is used)")
+    parser.add_argument("--provider", default="deepseek", choices=("deepseek", "gemini"))
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users")
+    parser.add_argument("--users", type=int, default=8, help="distinct accounts shared by the virtual users")
+    parser.add_argument("--archive-size", type=int, default=200, help="pebbles seeded per account")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds, not recorded")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--topics", type=int, default=500, help="size of the generate topic pool")
+    parser.add_argument("--autosave-burst", type=int, default=5)
+    parser.add_argument("--autosave-interval", type=float, default=0.05, help="seconds between autosaves in a burst")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between scenarios per virtual user")
+    parser.add_argument("--provider-latency", type=float, default=0.5, help="fake provider mean latency (s)")
+    parser.add_argument("--provider-jitter", type=float, default=0.3)
+    parser.add_argument("--provider-error-rate", type=float, default=0.0)
+    parser.add_argument("--provider-error-status", type=int, default=503)
+    parser.add_argument("--stream-chunks", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--include-metrics", action="store_true", help="embed the /metrics dump in the JSON report")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", help="baseline JSON report to diff against")
+    args = parser.parse_args()
+
+    temp_db = None
+    os.environ.setdefault("SECRET_KEY", "loadtest")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+    os.environ["AI_PROVIDER"] = args.provider
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.mongo == "memory":
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ["DB_NAME"] = "loadtest"
+    else:
+        temp_db = f"pebbles_loadtest_{uuid.uuid4().hex[:8]}"
+        os.environ["MONGO_URL"] = args.mongo
+        os.environ["DB_NAME"] = temp_db
+
+    import app.database as database
+    if args.mongo == "memory":
+        _use_in_memory_mongo(database)
+
+    from fake_provider import FakeProviderConfig, install
+    from app.main import app
+
+    install(FakeProviderConfig(
+        latency=args.provider_latency, jitter=args.provider_jitter, error_rate=args.provider_error_rate,
+        error_status=args.provider_error_status, chunks=args.stream_chunks, seed=args.seed,
+    ))
+
+    try:
+        report = asyncio.run(run(args, app))
+    finally:
+        if temp_db:
+            from pymongo import MongoClient
+            MongoClient(args.mongo).drop_database(temp_db)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nreport written to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
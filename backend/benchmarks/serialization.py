@@ -0,0 +1,131 @@
+"""序列化热点的微基准：列表接口的响应序列化 + provider 输出解析。
+
+对比旧路径 (每条文档 Pebble(**doc) 重新校验 -> jsonable_encoder -> json.dumps，
+以及 json.loads + 逐块手工清洗) 和新路径 (orjson 直接输出库里的文档，
+GeneratedArtifact.model_validate_json 一次解析)。不需要 MongoDB。
+
+    cd backend && python benchmarks/serialization.py [--sizes 100 1000 5000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for key, value in {"MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "bench", "SECRET_KEY": "bench",
+                   "ALGORITHM": "HS256", "ACCESS_TOKEN_EXPIRE_MINUTES": "30"}.items():
+    os.environ.setdefault(key, value)
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from app.models import Pebble, PebblePage, LevelContent, MainBlock, SidebarBlock  # noqa: E402
+from app.gemini_service import _parse_artifact  # noqa: E402
+
+
+def _level(i: int) -> dict:
+    return {
+        "title": f"Title {i}",
+        "summary": "A concise summary of the topic that spans a sentence or two. " * 2,
+        "emojiCollage": ["🪨", "🌊", "✨"],
+        "mainContent": [
+            {"type": "text", "heading": f"Section {j}", "body": "Body paragraph text. " * 30, "iconType": "idea"}
+            for j in range(5)
+        ] + [{"type": "key_points", "heading": "Key points", "body": ["one", "two", "three"]}],
+        "sidebarContent": [
+            {"type": "definition", "heading": f"Term {j}", "body": "Definition text. " * 8} for j in range(3)
+        ],
+        "keywords": ["alpha", "beta", "gamma", "delta"],
+    }
+
+
+def make_docs(n: int) -> list:
+    """与库里存的文档一致：写入路径都是 model_dump() 之后入库"""
+    now = time.time() * 1000
+    return [
+        Pebble(**{
+            "id": str(uuid.uuid4()), "topic": f"Topic {i}", "timestamp": now - i, "folderId": None,
+            "isVerified": False, "isDeleted": False, "isUserEdited": False,
+            "content": {"ELI5": _level(i), "ACADEMIC": _level(i)},
+            "socraticQuestions": ["Why?", "How?"], "owner_id": "bench", "updatedAt": now - i,
+        }).model_dump()
+        for i in range(n)
+    ]
+
+
+# --- 旧路径 (改动前的实现，作为基线) ---
+
+def legacy_list_response(docs: list) -> bytes:
+    # response_model=PebblePage：逐条校验 -> 再次校验响应模型 -> jsonable_encoder -> json.dumps
+    page = PebblePage(items=[Pebble(**d) for d in docs], nextCursor=None)
+    return JSONResponse(jsonable_encoder(PebblePage.model_validate(page))).body
+
+
+def legacy_parse_artifact(text: str, topic: str) -> Pebble:
+    if text.startswith("```json"):
+        text = text.replace("```json", "").replace("```", "")
+    data = json.loads(text)
+
+    def process_content(content_data):
+        main_blocks = []
+        for b in content_data.get('mainContent', []):
+            if b.get('type') == 'key_points' and isinstance(b.get('body'), str):
+                b['body'] = [s.strip() for s in b['body'].split('|')]
+            if 'iconType' not in b: b['iconType'] = 'default'
+            main_blocks.append(MainBlock(**b))
+        sidebar_blocks = []
+        for sb in content_data.get('sidebarContent', []):
+            try:
+                sidebar_blocks.append(SidebarBlock(**sb))
+            except Exception:
+                pass
+        clean_data = {k: v for k, v in content_data.items() if k not in ['mainContent', 'sidebarContent']}
+        return LevelContent(**clean_data, mainContent=main_blocks, sidebarContent=sidebar_blocks)
+
+    return Pebble(
+        id=str(uuid.uuid4()), topic=topic, timestamp=time.time() * 1000,
+        content={"ELI5": process_content(data.get('eli5_content', {})),
+                 "ACADEMIC": process_content(data.get('academic_content', {}))},
+        socraticQuestions=data.get('socratic_questions', []),
+    )
+
+
+# --- 新路径 ---
+
+def fast_list_response(docs: list) -> bytes:
+    return ORJSONResponse({"items": docs, "nextCursor": None}).body
+
+
+def _best(fn, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':<32} {'legacy ms':>10} {'fast ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        docs = make_docs(n)
+        assert json.loads(legacy_list_response(docs)) == json.loads(fast_list_response(docs))
+        legacy = _best(lambda: legacy_list_response(docs), args.repeat)
+        fast = _best(lambda: fast_list_response(docs), args.repeat)
+        print(f"{f'GET /api/pebbles ({n} full docs)':<32} {legacy * 1000:>10.2f} {fast * 1000:>10.2f} {legacy / fast:>7.1f}x")
+
+    raw = json.dumps({
+        "eli5_content": _level(0), "academic_content": _level(1), "socratic_questions": ["Why?", "How?"],
+    })
+    iterations = 200
+    legacy = _best(lambda: [legacy_parse_artifact(raw, "t") for _ in range(iterations)], args.repeat) / iterations
+    fast = _best(lambda: [_parse_artifact(raw, "t") for _ in range(iterations)], args.repeat) / iterations
+    print(f"{'provider output -> Pebble':<32} {legacy * 1000:>10.3f} {fast * 1000:>10.3f} {legacy / fast:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
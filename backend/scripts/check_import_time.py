@@ -0,0 +1,107 @@
+"""冷启动导入耗时检查：python -X importtime -c "import app.main"，超出预算或导入了
+provider SDK (应在第一次选用时才导入，见 app/providers) 即失败。
+
+测量方法：
+- 每次在新的子进程中导入 (不使用已加载的模块)，取 N 次运行的最小值 (best-of-N，默认 5)：
+  导入耗时的噪声只会让结果变大，最小值最接近真实成本。
+- 子进程先导入 DEPENDENCIES (启动必需的第三方库：FastAPI、Motor、numpy 等)，再导入 app.main；
+  预算只针对 app.main 的累计耗时，即项目自身的模块 + 不在 DEPENDENCIES 里的新依赖。
+  第三方库的耗时随机器快慢成倍变化，不计入预算，同一预算在开发机和 CI 上都适用。
+- 默认预算 = BASELINE_MS × 2。BASELINE_MS 是当前代码的测量值 (best-of-5，取多次测量中较大的一次)；
+  启动路径有意增加了导入时重新测量并更新它。
+
+    cd backend && python scripts/check_import_time.py [--budget-ms N] [--runs 5] [--top 15]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 导入 app.main 时不应该出现的模块 (前缀匹配)
+FORBIDDEN = ("openai", "google.generativeai", "grpc")
+
+# 启动必需的第三方库，先于 app.main 导入，不计入预算
+DEPENDENCIES = (
+    "fastapi", "fastapi.security", "fastapi.responses", "fastapi.middleware.cors",
+    "motor.motor_asyncio", "pydantic_settings", "numpy", "orjson", "jose", "passlib.context", "cachetools",
+)
+
+# app.main 自身的累计导入耗时 (不含 DEPENDENCIES)，best-of-5
+BASELINE_MS = 175.0
+BUDGET_MS = BASELINE_MS * 2
+
+# app.database 在导入时读取 Settings，没有 .env 时给必填项填上占位值 (导入阶段不会连接 MongoDB)
+ENV_DEFAULTS = {
+    "MONGO_URL": "mongodb://localhost:27017",
+    "DB_NAME": "pebbles_import_check",
+    "SECRET_KEY": "import-check",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "30",
+}
+
+
+def _measure() -> tuple:
+    """返回 (DEPENDENCIES 的耗时微秒, {模块名: (self 微秒, 累计微秒)})"""
+    env = {**ENV_DEFAULTS, **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(DEPENDENCIES)}; import app.main"],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr[-4000:])
+        raise SystemExit("import app.main failed")
+
+    dependencies_us, modules, in_app = 0, {}, False
+    for line in result.stderr.splitlines():
+        # import time:       123 |       4567 |   package.module
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        top_level = not name[1:].startswith(" ")
+        name = name.strip()
+        modules[name] = (int(self_us), int(cumulative_us))
+        # 按完成顺序输出：app.main 之前的顶层模块都属于 DEPENDENCIES
+        if top_level and not in_app:
+            if name == "app.main":
+                in_app = True
+            else:
+                dependencies_us += int(cumulative_us)
+    return dependencies_us, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [_measure() for _ in range(max(args.runs, 1))]
+    best = min(runs, key=lambda run: run[1]["app.main"][1])[1]
+    total_ms = best["app.main"][1] / 1000
+    failures = 0
+
+    print(
+        f"import app.main: {total_ms:.0f} ms (best of {len(runs)}, budget {args.budget_ms:.0f} ms); "
+        f"dependencies: {min(run[0] for run in runs) / 1000:.0f} ms (not budgeted)\n"
+    )
+    print(f"{'cumulative ms':>13} {'self ms':>8}  module")
+    app_modules = {name: t for name, t in best.items() if name.startswith("app.")}
+    for name, (self_us, cumulative_us) in sorted(app_modules.items(), key=lambda kv: -kv[1][1])[:args.top]:
+        print(f"{cumulative_us / 1000:>13.1f} {self_us / 1000:>8.1f}  {name}")
+
+    forbidden = sorted(name for name in best if name.startswith(FORBIDDEN))
+    if forbidden:
+        failures += 1
+        print(f"\nFAIL provider SDK imported at startup: {', '.join(forbidden[:10])}")
+    if total_ms > args.budget_ms:
+        failures += 1
+        print(f"\nFAIL import time {total_ms:.0f} ms exceeds budget {args.budget_ms:.0f} ms")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""对每个路由的 MongoDB 查询执行 explain()，出现 COLLSCAN 即失败。
+
+需要一个本地 mongod (默认 mongodb://localhost:27017，可用 MONGO_URL 覆盖)。
+脚本在临时数据库中建索引、写入少量样本数据，结束后删除该数据库。
+
+    cd backend && python scripts/check_query_plans.py
+"""
+
+import os
+import re
+import sys
+import time
+import uuid
+
+from pymongo import MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.indexes import INDEXES  # noqa: E402
+
+OWNER = "plan-check-user"
+SAMPLE_SIZE = 200
+
+# (路由, 集合, filter, sort)
+ROUTE_QUERIES = [
+    ("get_current_user / login / register", "users", {"username": OWNER}, None),
+    ("GET /api/pebbles", "pebbles", {"owner_id": OWNER, "isDeleted": False},
+     [("timestamp", -1), ("id", -1)]),
+    ("GET /api/pebbles?cursor=", "pebbles", {
+        "owner_id": OWNER, "isDeleted": False,
+        "$or": [{"timestamp": {"$lt": 1e12}}, {"timestamp": 1e12, "id": {"$lt": "z"}}],
+    }, [("timestamp", -1), ("id", -1)]),
+    ("POST /api/pebbles/by-ids", "pebbles", {"owner_id": OWNER, "id": {"$in": ["a", "b"]}, "isDeleted": False}, None),
+    ("GET /api/search", "pebbles", {"owner_id": OWNER, "isDeleted": False, "$and": [{"searchTerms.t": re.compile("^top")}]}, None),
+    ("PUT/DELETE /api/pebbles/{id}", "pebbles", {"id": "a", "owner_id": OWNER}, None),
+    ("POST /api/folders/{id}/ungroup (pebbles)", "pebbles", {"folderId": "f", "owner_id": OWNER}, None),
+    ("GET /api/sync/changes (pebbles)", "pebbles", {
+        "owner_id": OWNER,
+        "$or": [{"updatedAt": {"$gt": 0}}, {"updatedAt": 0, "id": {"$gt": ""}}],
+    }, [("updatedAt", 1), ("id", 1)]),
+    ("GET /api/folders", "folders", {"owner_id": OWNER, "isDeleted": {"$ne": True}}, [("id", 1)]),
+    ("GET /api/folders?cursor=", "folders", {"owner_id": OWNER, "isDeleted": {"$ne": True}, "id": {"$gt": "f1"}},
+     [("id", 1)]),
+    ("GET /api/export (folders)", "folders", {"owner_id": OWNER, "isDeleted": {"$ne": True}}, None),
+    ("GET /api/export (pebbles)", "pebbles", {"owner_id": OWNER, "isDeleted": {"$ne": True}}, None),
+    ("PUT /api/folders/{id}", "folders", {"id": "f", "owner_id": OWNER}, None),
+    ("POST /api/folders/{id}/ungroup (folders)", "folders", {"parentId": "f", "owner_id": OWNER}, None),
+    ("folder subtree (move / delete / ungroup)", "folders", {"owner_id": OWNER, "ancestors": "f1"}, None),
+    ("DELETE /api/folders/{id} (pebbles)", "pebbles", {"owner_id": OWNER, "folderId": {"$in": ["f1", "f2"]}, "isDeleted": False}, None),
+    ("POST /api/folders/{id}/restore (folders)", "folders", {"owner_id": OWNER, "deletedBy": "f1"}, None),
+    ("POST /api/folders/{id}/restore (pebbles)", "pebbles", {"owner_id": OWNER, "deletedBy": "f1"}, None),
+    ("GET /api/sync/changes (folders)", "folders", {
+        "owner_id": OWNER,
+        "$or": [{"updatedAt": {"$gt": 0}}, {"updatedAt": 0, "id": {"$gt": ""}}],
+    }, [("updatedAt", 1), ("id", 1)]),
+    ("POST /api/generate/jobs (active count)", "jobs", {"owner_id": OWNER, "status": {"$in": ["queued", "running"]}}, None),
+    ("GET /api/generate/jobs/{id}", "jobs", {"id": "j1", "owner_id": OWNER}, None),
+    ("job worker: claim", "jobs", {"id": "j1", "status": "queued"}, None),
+    ("job startup recovery", "jobs", {"status": "queued"}, [("createdAt", 1)]),
+    ("PUT /api/pebbles/{id} (latest revision)", "revisions", {"owner_id": OWNER, "pebbleId": "p1"}, [("seq", -1)]),
+    ("GET /api/pebbles/{id}/revisions", "revisions", {"owner_id": OWNER, "pebbleId": "p1", "seq": {"$lt": 50}}, [("seq", -1)]),
+    ("GET /api/pebbles/{id}/revisions/{seq} (checkpoint)", "revisions",
+     {"owner_id": OWNER, "pebbleId": "p1", "seq": {"$lte": 50}, "checkpoint": True}, [("seq", -1)]),
+    ("revision compaction: pending", "revisions", {"compacted": False, "createdAt": {"$lt": 1e12}}, None),
+]
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def _seed(db):
+    now = time.time() * 1000
+    db.users.insert_one({"username": OWNER, "hashed_password": "x"})
+    db.folders.insert_many([
+        {"id": f"f{i}", "name": f"Folder {i}", "parentId": f"f{i - 1}" if i else None,
+         "ancestors": [f"f{j}" for j in range(i)], "createdAt": now, "owner_id": OWNER, "updatedAt": now}
+        for i in range(10)
+    ])
+    db.pebbles.insert_many([
+        {"id": str(uuid.uuid4()), "topic": f"Topic {i}", "timestamp": now - i, "folderId": f"f{i % 10}",
+         "isDeleted": i % 7 == 0, "owner_id": OWNER, "updatedAt": now - i,
+         "searchTerms": [{"t": "topic", "w": 8}, {"t": str(i), "w": 8}]}
+        for i in range(SAMPLE_SIZE)
+    ])
+    db.jobs.insert_many([
+        {"id": f"j{i}", "owner_id": OWNER, "status": ("queued", "running", "succeeded")[i % 3],
+         "topic": f"Topic {i}", "createdAt": now - i, "attempts": 0}
+        for i in range(SAMPLE_SIZE)
+    ])
+    db.revisions.insert_many([
+        {"owner_id": OWNER, "pebbleId": f"p{i % 5}", "seq": i // 5, "fromSeq": i // 5, "createdAt": now - i,
+         "checkpoint": i % 50 < 5, "compacted": i % 3 == 0, "patch": []}
+        for i in range(SAMPLE_SIZE)
+    ])
+
+
+def main() -> int:
+    client = MongoClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db_name = f"pebbles_plan_check_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    failures = 0
+    try:
+        for collection_name, models in INDEXES.items():
+            db[collection_name].create_indexes(models)
+        _seed(db)
+
+        for route, collection_name, query, sort in ROUTE_QUERIES:
+            cursor = db[collection_name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+            stages = [s for s in _stages(winning_plan) if s]
+            ok = "COLLSCAN" not in stages
+            failures += not ok
+            print(f"{'OK  ' if ok else 'FAIL'} {route:<45} {' <- '.join(stages)}")
+    finally:
+        client.drop_database(db_name)
+        client.close()
+
+    if failures:
+        print(f"\n{failures} route quer{'y' if failures == 1 else 'ies'} fell back to COLLSCAN")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
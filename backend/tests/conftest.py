@@ -0,0 +1,79 @@
+# backend/tests/conftest.py
+# 测试用内存 MongoDB (mongomock-motor)：在导入任何路由 / 业务模块之前替换 app.database 里的客户端和集合引用
+
+import os
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "pebbles_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# 最低的 argon2 代价，注册 / 登录不拖慢测试
+os.environ.setdefault("ARGON2_TIME_COST", "1")
+os.environ.setdefault("ARGON2_MEMORY_COST", "1024")
+os.environ.setdefault("ARGON2_PARALLELISM", "1")
+
+import mongomock.collection
+import mongomock_motor
+import pytest
+
+import app.database as database
+
+client = mongomock_motor.AsyncMongoMockClient()
+database.client = client
+database.db = client[database.settings.DB_NAME]
+for _name in list(vars(database)):
+    if _name.endswith("_collection"):
+        setattr(database, _name, database.db.get_collection(_name[:-len("_collection")]))
+
+# --- mongomock 与 pymongo 4.15 的差异 ---
+# bulk_write 的 UpdateOne / ReplaceOne 会传 sort 参数，mongomock 不认识
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+_add_replace = mongomock.collection.BulkOperationBuilder.add_replace
+mongomock.collection.BulkOperationBuilder.add_update = lambda self, *a, sort=None, **k: _add_update(self, *a, **k)
+mongomock.collection.BulkOperationBuilder.add_replace = lambda self, *a, sort=None, **k: _add_replace(self, *a, **k)
+
+# find_one_and_update(return_document=AFTER) 在 mongomock 里用原 filter 重新查询，
+# filter 涉及被更新的字段 (例如 status: queued -> running) 时返回 None；改成按 _id 读回
+_find_one_and_update = mongomock.collection.Collection.find_one_and_update
+
+def _find_one_and_update_by_id(self, filter, update, projection=None, sort=None, upsert=False,
+                               return_document=False, **kwargs):
+    if not return_document:
+        return _find_one_and_update(self, filter, update, projection=projection, sort=sort,
+                                    upsert=upsert, return_document=False, **kwargs)
+    before = _find_one_and_update(self, filter, update, projection={"_id": 1}, sort=sort,
+                                  upsert=upsert, return_document=False, **kwargs)
+    return None if before is None else self.find_one({"_id": before["_id"]}, projection)
+
+mongomock.collection.Collection.find_one_and_update = _find_one_and_update_by_id
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    # 整个测试会话共用一个应用实例 (lifespan 只运行一次：关闭时会停掉哈希线程池和后台任务)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+
+@pytest.fixture
+def stub_provider():
+    """两个 provider 都换成 StubProvider，测试结束后恢复"""
+    from app.providers import provider_registry
+    from helpers import StubProvider
+    saved = dict(provider_registry._instances)
+    stub = StubProvider()
+    for name in provider_registry.names():
+        provider_registry.install(name, stub)
+    yield stub
+    provider_registry._instances.clear()
+    provider_registry._instances.update(saved)
@@ -0,0 +1,72 @@
+# backend/tests/helpers.py
+
+import json
+import uuid
+
+
+def register(app_client, username: str | None = None) -> dict:
+    """注册一个新用户，返回带 token 的请求头"""
+    username = username or f"user-{uuid.uuid4().hex[:8]}"
+    response = app_client.post("/auth/register", json={"username": username, "password": "pw-123456"})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def level(topic: str) -> dict:
+    return {
+        "title": topic, "summary": f"About {topic}", "emojiCollage": ["🪨"],
+        "mainContent": [{"type": "text", "heading": "Intro", "body": f"{topic} body"}],
+        "sidebarContent": [], "keywords": [topic.lower()],
+    }
+
+
+def make_pebble(topic: str, **fields) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "topic": topic, "timestamp": 1_700_000_000_000,
+        "content": {"ELI5": level(topic), "ACADEMIC": level(topic)}, "socraticQuestions": ["Why?"], **fields,
+    }
+
+
+def artifact_json(topic: str) -> str:
+    """provider 的原始输出 (GeneratedArtifact 格式)"""
+    return json.dumps({
+        "eli5_content": level(topic), "academic_content": level(topic), "socratic_questions": ["Why?"],
+    })
+
+
+class StubProvider:
+    """替换 provider_registry 里的 provider，不调用真实 SDK；calls 记录每次调用的 prompt"""
+
+    def __init__(self, topic: str = "Stub"):
+        self.topic = topic
+        self.calls = []
+        self.dropped_ids = set() # rewrite_batch 的结构化输出里故意漏掉的 id
+
+    async def startup(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def generate(self, prompt: str) -> str:
+        self.calls.append(prompt)
+        return artifact_json(self.topic)
+
+    async def stream(self, prompt: str):
+        self.calls.append(prompt)
+        text = artifact_json(self.topic)
+        for i in range(0, len(text), 17):
+            yield text[i:i + 17]
+
+    async def rewrite(self, text: str, instruction: str) -> str:
+        self.calls.append(text)
+        return text.upper()
+
+    async def rewrite_batch(self, prompt: str) -> str:
+        """按 prompt 里 Input 的 JSON 返回结构化输出，和 rewrite 一样转成大写"""
+        self.calls.append(prompt)
+        payload = json.loads(prompt.split("Input:", 1)[1].strip().splitlines()[0])
+        return json.dumps({"items": [
+            {"id": item["id"], "text": item["text"].upper()}
+            for item in payload["items"] if item["id"] not in self.dropped_ids
+        ]})
@@ -0,0 +1,73 @@
+import gzip
+import orjson
+import pytest
+from app import archive
+from app.database import settings
+from helpers import register, make_pebble
+
+
+async def _chunks(data: bytes, size: int = 1000):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def _lines(data: bytes, size: int = 1000) -> list:
+    return [line async for line in archive.iter_lines(_chunks(data, size))]
+
+
+def _events(response) -> list:
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+
+def test_export_import_round_trip(app_client):
+    alice, bob = register(app_client), register(app_client)
+    folder = {"id": "rt-folder", "name": "Notes", "parentId": None, "createdAt": 1_700_000_000_000}
+    assert app_client.post("/api/folders", json=folder, headers=alice).status_code == 200
+    pebbles = [make_pebble(f"Topic {i}", folderId="rt-folder") for i in range(3)]
+    for pebble in pebbles:
+        assert app_client.post("/api/pebbles", json=pebble, headers=alice).status_code == 200
+
+    exported = app_client.get("/api/export", headers=alice)
+    assert exported.headers["cache-control"] == "private, no-store"
+    body = exported.content
+    events = _events(app_client.post("/api/import", content=body, headers=bob))
+    assert events[-1] == {"event": "done", "processed": 4, "inserted": 4, "updated": 0, "skipped": 0, "errors": 0}
+
+    # 再导入一次是幂等的
+    again = _events(app_client.post("/api/import", content=body, headers=bob))[-1]
+    assert again["skipped"] == 4 and again["inserted"] == 0
+
+    imported = app_client.get("/api/pebbles", headers=bob).json()["items"]
+    assert sorted(p["id"] for p in imported) == sorted(p["id"] for p in pebbles)
+    assert {p["folderId"] for p in imported} == {"rt-folder"}
+
+
+def test_unsupported_header_version_is_fatal(app_client):
+    headers = register(app_client)
+    for version in ("1", None, 99):
+        body = orjson.dumps({"type": "header", "version": version}) + b"\n"
+        done = _events(app_client.post("/api/import", content=body, headers=headers))[-1]
+        assert "Unsupported archive version" in done["fatal"]
+
+
+@pytest.mark.anyio
+async def test_iter_lines_splits_across_chunk_boundaries():
+    text = b"".join(b"line %d\n" % i for i in range(2000)) + b"tail"
+    expected = text.split(b"\n")
+    assert await _lines(text, 7) == expected
+    assert await _lines(gzip.compress(text), 7) == expected
+
+
+@pytest.mark.anyio
+async def test_iter_lines_rejects_gzip_bomb(monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_MAX_LINE_BYTES", 1024 * 1024)
+    bomb = gzip.compress(b"a" * (64 * 1024 * 1024), compresslevel=9)
+    with pytest.raises(archive.ArchiveFormatError, match="Line longer"):
+        await _lines(bomb, 64 * 1024)
+
+
+@pytest.mark.anyio
+async def test_iter_lines_rejects_truncated_gzip():
+    data = gzip.compress(b"x\n" * 100_000)
+    with pytest.raises(archive.ArchiveFormatError, match="Truncated"):
+        await _lines(data[:len(data) // 2])
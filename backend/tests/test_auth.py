@@ -0,0 +1,33 @@
+import asyncio
+import threading
+import pytest
+from app.auth import PasswordHasher, PasswordHashingBusy
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_cancelled_hash_keeps_slot_until_thread_finishes():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    release = threading.Event()
+    first = asyncio.create_task(hasher._run(release.wait))
+    await asyncio.sleep(0.05)
+
+    # 等待方被取消，但 argon2 线程还在运行：槽位不能被下一个请求拿到
+    first.cancel()
+    second = asyncio.create_task(hasher._run(lambda: "second"))
+    await asyncio.sleep(0.05)
+    assert hasher.stats == {"in_flight": 1, "queued": 1, "max_queued": 1}
+    assert not second.done()
+    with pytest.raises(PasswordHashingBusy):
+        await hasher._run(lambda: "rejected")
+
+    release.set()
+    assert await asyncio.wait_for(second, 1) == "second"
+    assert hasher.stats["in_flight"] == 0 and hasher.stats["queued"] == 0
+    hasher.shutdown()
+
+
+def test_hash_stats_are_exported_as_metrics(app_client):
+    body = app_client.get("/metrics").text
+    assert 'pebbles_password_hash_tasks{state="in_flight"}' in body
+    assert app_client.get("/auth/hash-stats").status_code == 404
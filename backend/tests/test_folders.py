@@ -0,0 +1,63 @@
+import anyio
+from app.database import folders_collection
+from helpers import register, make_pebble
+
+
+def _tree(app_client, headers: dict) -> dict:
+    """a / b / c 三层文件夹，b、c 下各一个 pebble；返回 {名字: pebble id}"""
+    for folder_id, parent_id in (("a", None), ("b", "a"), ("c", "b"), ("d", None)):
+        folder = {"id": folder_id, "name": folder_id, "parentId": parent_id, "createdAt": 0}
+        assert app_client.post("/api/folders", json=folder, headers=headers).status_code == 200
+    pebbles = {name: make_pebble(name, folderId=name) for name in ("b", "c")}
+    for pebble in pebbles.values():
+        assert app_client.post("/api/pebbles", json=pebble, headers=headers).status_code == 200
+    return {name: p["id"] for name, p in pebbles.items()}
+
+
+def _ancestors(owner: str) -> dict:
+    async def _read():
+        cursor = folders_collection.find({"owner_id": owner}, {"_id": 0, "id": 1, "ancestors": 1})
+        return {d["id"]: d["ancestors"] async for d in cursor}
+    return anyio.run(_read)
+
+
+def test_move_rewrites_subtree_ancestors(app_client):
+    owner = "folders-move"
+    headers = register(app_client, owner)
+    _tree(app_client, headers)
+
+    response = app_client.post("/api/folders/b/move", json={"parentId": "d"}, headers=headers)
+    assert response.json() == {"id": "b", "parentId": "d", "ancestors": ["d"]}
+    assert _ancestors(owner) == {"a": [], "b": ["d"], "c": ["d", "b"], "d": []}
+
+    # 不能移动进自己的子树；PUT parentId 走同样的校验
+    assert app_client.post("/api/folders/d/move", json={"parentId": "c"}, headers=headers).status_code == 400
+    assert app_client.put("/api/folders/b", json={"parentId": "c"}, headers=headers).status_code == 400
+    assert app_client.post("/api/folders/b/move", json={"parentId": "missing"}, headers=headers).status_code == 404
+    assert app_client.put("/api/folders/b", json={"isDeleted": True}, headers=headers).status_code == 400
+
+    assert app_client.put("/api/folders/c", json={"parentId": None}, headers=headers).status_code == 200
+    assert _ancestors(owner) == {"a": [], "b": ["d"], "c": [], "d": []}
+
+
+def test_delete_restore_and_counts(app_client):
+    headers = register(app_client)
+    pebble_ids = _tree(app_client, headers)
+    assert app_client.get("/api/folder-counts", headers=headers).json() == {"a": 2, "b": 2, "c": 1}
+    assert app_client.get("/api/folder-counts", params={"root": "b"}, headers=headers).json() == {"b": 2, "c": 1}
+
+    assert app_client.delete("/api/folders/b", headers=headers).json() == {"folders": 2, "pebbles": 2}
+    folders = {f["id"] for f in app_client.get("/api/folders", headers=headers).json()["items"]}
+    assert folders == {"a", "d"}
+    assert app_client.post("/api/pebbles/by-ids", json={"ids": list(pebble_ids.values())}, headers=headers).json() == []
+    assert app_client.get("/api/folder-counts", headers=headers).json() == {}
+
+    # 父文件夹在此期间被删除：恢复到根目录
+    assert app_client.delete("/api/folders/a", headers=headers).status_code == 200
+    restored = app_client.post("/api/folders/b/restore", headers=headers).json()
+    assert restored == {"folders": 2, "pebbles": 2, "parentId": None}
+    folders = {f["id"]: f for f in app_client.get("/api/folders", headers=headers).json()["items"]}
+    assert set(folders) == {"b", "c", "d"} and folders["b"]["parentId"] is None
+    assert len(app_client.post("/api/pebbles/by-ids", json={"ids": list(pebble_ids.values())}, headers=headers).json()) == 2
+    assert app_client.get("/api/folder-counts", headers=headers).json() == {"b": 2, "c": 1}
+    assert app_client.post("/api/folders/b/restore", headers=headers).status_code == 404
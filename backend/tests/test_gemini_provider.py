@@ -0,0 +1,39 @@
+import pytest
+from google.api_core.exceptions import NotFound, ServiceUnavailable
+from app.providers import gemini
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """替换 genai.get_model：按顺序返回预设的结果 (异常实例则抛出)"""
+    outcomes, seen = [], []
+
+    def get_model(name):
+        seen.append(name)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(gemini.genai, "configure", lambda **kwargs: None)
+    monkeypatch.setattr(gemini.genai, "get_model", get_model)
+    return outcomes, seen
+
+
+async def test_transient_error_falls_back_without_caching(lookups):
+    outcomes, seen = lookups
+    provider = gemini.Provider()
+
+    outcomes.append(ServiceUnavailable("down"))
+    model = await provider.model()
+    assert model.model_name == f"models/{gemini.GEMINI_MODEL_CANDIDATES[0]}"
+    assert provider._model_name is None and provider._models == {}
+
+    # 下一次调用重新解析，首选模型不存在时用下一个候选并缓存
+    outcomes.extend([NotFound("gone"), object()])
+    model = await provider.model()
+    assert model.model_name == f"models/{gemini.GEMINI_MODEL_CANDIDATES[1]}"
+    assert await provider.model() is model
+    assert len(seen) == 3
@@ -0,0 +1,120 @@
+import asyncio
+import uuid
+import pytest
+from app.database import jobs_collection, settings
+from app.documents import now_ms
+from app.jobs import JobQueue
+from app.models import Pebble
+from helpers import register, make_pebble
+
+pytestmark = pytest.mark.anyio
+
+
+def _pebble(job: dict) -> Pebble:
+    return Pebble(**make_pebble(job["topic"]))
+
+
+async def _insert_job(owner: str, **fields) -> str:
+    job = {
+        "id": str(uuid.uuid4()), "owner_id": owner, "status": "queued", "topic": "T",
+        "params": {}, "createdAt": now_ms(), "attempts": 0, **fields,
+    }
+    await jobs_collection.insert_one(job)
+    return job["id"]
+
+
+async def test_job_is_claimed_only_once():
+    calls = []
+
+    async def runner(job):
+        calls.append(job["id"])
+        return _pebble(job)
+
+    queue = JobQueue(runner, workers=1)
+    job_id = await _insert_job("claim-owner")
+    await asyncio.gather(queue._run(job_id), queue._run(job_id))
+
+    assert calls == [job_id]
+    job = await jobs_collection.find_one({"id": job_id})
+    assert job["status"] == "succeeded" and job["attempts"] == 1
+    assert "leaseUntil" not in job
+
+
+async def test_expired_lease_is_requeued_and_exhausted_job_fails():
+    owner = f"lease-{uuid.uuid4().hex[:6]}"
+    expired = now_ms() - 1000
+    retry_id = await _insert_job(owner, status="running", leaseUntil=expired, attempts=1)
+    exhausted_id = await _insert_job(owner, status="running", leaseUntil=expired, attempts=settings.JOB_MAX_ATTEMPTS)
+    live_id = await _insert_job(owner, status="running", leaseUntil=now_ms() + 60_000, attempts=1)
+
+    ran = []
+
+    async def runner(job):
+        ran.append(job["id"])
+        return _pebble(job)
+
+    queue = JobQueue(runner, workers=1)
+    await queue.start()
+    try:
+        assert (await queue.get(owner, retry_id, wait=5))["status"] == "succeeded"
+    finally:
+        await queue.stop()
+
+    assert retry_id in ran and exhausted_id not in ran and live_id not in ran
+    assert (await jobs_collection.find_one({"id": exhausted_id}))["status"] == "failed"
+    # 租约未过期的任务属于其他仍在运行的进程，不动
+    assert (await jobs_collection.find_one({"id": live_id}))["status"] == "running"
+
+
+async def test_cancelled_job_goes_back_to_queue():
+    started = asyncio.Event()
+
+    async def runner(job):
+        started.set()
+        await asyncio.sleep(60)
+
+    queue = JobQueue(runner, workers=1)
+    job_id = await _insert_job("cancel-owner")
+    task = asyncio.create_task(queue._run(job_id))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    job = await jobs_collection.find_one({"id": job_id})
+    assert job["status"] == "queued" and "leaseUntil" not in job
+
+
+def test_owners_are_served_round_robin():
+    queue = JobQueue(runner=None, workers=1)
+    for job_id in ("a1", "a2", "a3"):
+        queue._push("alice", job_id)
+    queue._push("bob", "b1")
+    queue._push("carol", "c1")
+
+    order = [queue._pop() for _ in range(5)]
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+    assert queue.snapshot()["queued"] == 0
+
+
+def test_job_api_with_stubbed_provider(app_client, stub_provider):
+    headers = register(app_client)
+    response = app_client.post("/api/generate/jobs", json={"topic": "Job topic", "no_cache": True}, headers=headers)
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    job = app_client.get(f"/api/generate/jobs/{job_id}", params={"wait": 10}, headers=headers).json()
+    assert job["status"] == "succeeded", job
+    assert job["result"]["topic"] == "Job topic"
+    assert len(stub_provider.calls) == 1
+
+    pebbles = app_client.get("/api/pebbles", headers=headers).json()["items"]
+    assert [p["id"] for p in pebbles] == [job["result"]["id"]]
+    # 其他用户看不到这个任务
+    assert app_client.get(f"/api/generate/jobs/{job_id}", headers=register(app_client)).status_code == 404
+
+
+def test_job_api_limits_active_jobs(app_client, stub_provider, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_MAX_ACTIVE_PER_USER", 0)
+    headers = register(app_client)
+    response = app_client.post("/api/generate/jobs", json={"topic": "Too many"}, headers=headers)
+    assert response.status_code == 429
@@ -0,0 +1,56 @@
+from helpers import register, make_pebble
+
+
+def _pages(app_client, path: str, headers: dict, **params) -> list:
+    pages, cursor = [], None
+    while True:
+        page = app_client.get(path, params={**params, **({"cursor": cursor} if cursor else {})}, headers=headers).json()
+        pages.append(page["items"])
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return pages
+
+
+def test_pebbles_cursor_pagination(app_client):
+    headers = register(app_client)
+    pebbles = [make_pebble(f"Topic {i}", timestamp=1_700_000_000_000 + i % 3) for i in range(7)]
+    for pebble in pebbles:
+        assert app_client.post("/api/pebbles", json=pebble, headers=headers).status_code == 200
+
+    # timestamp 有重复时按 (timestamp, id) 排序，不漏不重
+    pages = _pages(app_client, "/api/pebbles", headers, limit=3, view="summary")
+    assert [len(page) for page in pages] == [3, 3, 1]
+    keys = [(p["timestamp"], p["id"]) for page in pages for p in page]
+    assert keys == sorted(((p["timestamp"], p["id"]) for p in pebbles), reverse=True)
+    assert pages[0][0]["summary"].startswith("About Topic") and pages[0][0]["keywords"] == [pages[0][0]["topic"].lower()]
+    assert app_client.get("/api/pebbles", params={"cursor": "???"}, headers=headers).status_code == 400
+
+
+def test_folders_cursor_pagination(app_client):
+    headers = register(app_client)
+    for i in range(5):
+        folder = {"id": f"folder-{i}", "name": f"F{i}", "parentId": "folder-0" if i else None, "createdAt": 0}
+        assert app_client.post("/api/folders", json=folder, headers=headers).status_code == 200
+    assert app_client.delete("/api/folders/folder-4", headers=headers).status_code == 200
+
+    pages = _pages(app_client, "/api/folders", headers, limit=2)
+    assert [[f["id"] for f in page] for page in pages] == [["folder-0", "folder-1"], ["folder-2", "folder-3"]]
+    assert not {"ancestors", "deletedBy", "_id"} & {key for page in pages for f in page for key in f}
+
+
+def test_update_values_are_validated(app_client):
+    headers = register(app_client)
+    pebble = make_pebble("Validated")
+    assert app_client.post("/api/pebbles", json=pebble, headers=headers).status_code == 200
+    url = f"/api/pebbles/{pebble['id']}"
+
+    for bad in ({"content": "oops"}, {"content.ELI5.mainContent.3.body": "x"}, {"content.ELI5.summary": ["x"]}):
+        response = app_client.put(url, json=bad, headers=headers)
+        assert response.status_code == 400, bad
+    stored = app_client.post("/api/pebbles/by-ids", json={"ids": [pebble["id"]]}, headers=headers).json()[0]
+    assert stored["content"]["ELI5"]["summary"] == "About Validated"
+
+    assert app_client.put(url, json={"content.ELI5.mainContent.0.body": "Edited"}, headers=headers).status_code == 200
+    stored = app_client.post("/api/pebbles/by-ids", json={"ids": [pebble["id"]]}, headers=headers).json()[0]
+    assert stored["content"]["ELI5"]["mainContent"][0]["body"] == "Edited"
+    assert app_client.put("/api/folders/missing", json={"name": "x"}, headers=headers).status_code == 404
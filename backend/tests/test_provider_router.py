@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from app.database import settings
+from app.provider_router import ProviderRouter, ProviderUnavailable
+
+pytestmark = pytest.mark.anyio
+
+COOLDOWN = 0.05
+
+
+class Boom(Exception):
+    status_code = 400       # 不重试
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROVIDER", "gemini")
+    monkeypatch.setattr(settings, "AI_FAILOVER", False)
+    monkeypatch.setattr(settings, "AI_MAX_RETRIES", 0)
+    monkeypatch.setattr(settings, "AI_BREAKER_MIN_REQUESTS", 1)
+    monkeypatch.setattr(settings, "AI_BREAKER_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "AI_BREAKER_COOLDOWN", COOLDOWN)
+    return ProviderRouter()
+
+
+async def _fail():
+    raise Boom("bad request")
+
+
+async def _open_breaker(router) -> object:
+    with pytest.raises(ProviderUnavailable):
+        await router.call({"gemini": _fail})
+    breaker = router._state("gemini").breaker
+    assert breaker.state == "open"
+    await asyncio.sleep(COOLDOWN * 1.5)
+    assert breaker.state == "half_open"
+    return breaker
+
+
+async def test_failed_probe_reopens_and_successful_probe_closes(router):
+    breaker = await _open_breaker(router)
+    with pytest.raises(ProviderUnavailable):
+        await router.call({"gemini": _fail})
+    assert breaker.state == "open"
+
+    await asyncio.sleep(COOLDOWN * 1.5)
+
+    async def ok():
+        return "ok"
+    assert await router.call({"gemini": ok}) == "ok"
+    assert breaker.state == "closed"
+
+
+async def test_cancelled_probe_does_not_wedge_breaker(router):
+    breaker = await _open_breaker(router)
+    started = asyncio.Event()
+
+    async def hang():
+        started.set()
+        await asyncio.sleep(60)
+
+    probe = asyncio.create_task(router.call({"gemini": hang}))
+    await started.wait()
+    # 探测进行中：其他请求被拒绝
+    assert not breaker.available()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.available()
+
+    async def ok():
+        return "recovered"
+    assert await router.call({"gemini": ok}) == "recovered"
+    assert breaker.state == "closed"
+
+
+async def test_disconnected_stream_probe_does_not_wedge_breaker(router):
+    breaker = await _open_breaker(router)
+
+    async def chunks():
+        for i in range(100):
+            yield f"chunk{i}"
+
+    stream = router.stream({"gemini": chunks})
+    assert await stream.__anext__() == "chunk0"
+    # 客户端断开：StreamingResponse 关闭生成器 (GeneratorExit)
+    await stream.aclose()
+    assert breaker.available()
+
+    received = [chunk async for chunk in router.stream({"gemini": chunks})]
+    assert len(received) == 100
+    assert breaker.state == "closed"
@@ -0,0 +1,81 @@
+import anyio
+from app.revisions import compact_pebble, reconstruct
+from helpers import register, make_pebble
+
+
+def _pebble(app_client, headers: dict, pebble_id: str) -> dict:
+    return app_client.post("/api/pebbles/by-ids", json={"ids": [pebble_id]}, headers=headers).json()[0]
+
+
+def test_edit_history_restore_and_compaction(app_client):
+    owner = "revisions-owner"
+    headers = register(app_client, owner)
+    pebble = make_pebble("Original")
+    pebble_id = pebble["id"]
+    assert app_client.post("/api/pebbles", json=pebble, headers=headers).status_code == 200
+    original = _pebble(app_client, headers, pebble_id)["content"]
+
+    edits = [
+        {"topic": "Renamed"},
+        {"content.ELI5.mainContent.0.body": "Edited body"},
+        {"socraticQuestions": ["Why?", "How?"]},
+    ]
+    for edit in edits:
+        assert app_client.put(f"/api/pebbles/{pebble_id}", json=edit, headers=headers).status_code == 200
+    # 内容没有变化的编辑不记修订
+    assert app_client.put(f"/api/pebbles/{pebble_id}", json=edits[-1], headers=headers).status_code == 200
+
+    page = app_client.get(f"/api/pebbles/{pebble_id}/revisions", params={"limit": 2}, headers=headers).json()
+    assert [r["seq"] for r in page["items"]] == [3, 2] and page["nextBeforeSeq"] == 2
+    assert page["items"][1]["paths"] == ["/content/ELI5/mainContent/0/body"]
+
+    baseline = app_client.get(f"/api/pebbles/{pebble_id}/revisions/0", headers=headers).json()
+    assert baseline["revision"]["source"] == "baseline"
+    assert baseline["state"]["topic"] == "Original"
+    middle = app_client.get(f"/api/pebbles/{pebble_id}/revisions/2", headers=headers).json()["state"]
+    assert middle["topic"] == "Renamed" and middle["socraticQuestions"] == ["Why?"]
+    assert middle["content"]["ELI5"]["mainContent"][0]["body"] == "Edited body"
+
+    # 恢复到基线：内容回到原稿，恢复本身记成新修订
+    restored = app_client.post(f"/api/pebbles/{pebble_id}/revisions/0/restore", headers=headers).json()
+    assert restored == {"status": "restored", "seq": 4}
+    current = _pebble(app_client, headers, pebble_id)
+    assert current["topic"] == "Original" and current["content"] == original
+    latest = app_client.get(f"/api/pebbles/{pebble_id}/revisions", params={"limit": 1}, headers=headers).json()
+    assert latest["items"][0]["source"] == "restore" and latest["items"][0]["restoredFrom"] == 0
+
+    # 合并后每个保留的版本仍能重建为同样的内容
+    anyio.run(compact_pebble, owner, pebble_id, float("inf"))
+    items = app_client.get(f"/api/pebbles/{pebble_id}/revisions", headers=headers).json()["items"]
+    assert [r["seq"] for r in items] == [4, 0] and items[0]["squashed"] == 4
+    _, state = anyio.run(reconstruct, owner, pebble_id, 4)
+    assert state["topic"] == "Original" and state["content"] == original
+
+    assert app_client.get(f"/api/pebbles/{pebble_id}/revisions/9", headers=headers).status_code == 404
+    other = register(app_client)
+    assert app_client.post(f"/api/pebbles/{pebble_id}/revisions/0/restore", headers=other).status_code == 404
+
+
+def test_sync_batch_edits_are_recorded(app_client):
+    headers = register(app_client)
+    pebble = make_pebble("Synced")
+    pebble_id = pebble["id"]
+    assert app_client.post("/api/pebbles", json=pebble, headers=headers).status_code == 200
+
+    operations = [
+        {"op": "update", "kind": "pebble", "id": pebble_id, "data": {"content.ELI5.mainContent.0.body": "Autosaved"}},
+        {"op": "update", "kind": "pebble", "id": pebble_id, "data": {"isVerified": True}},
+        {"op": "update", "kind": "pebble", "id": pebble_id, "data": {"topic": "Synced again"}},
+    ]
+    result = app_client.post("/api/sync/batch", json={"operations": operations}, headers=headers).json()
+    assert result["applied"] == 3 and not result["errors"]
+    assert app_client.put(f"/api/pebbles/{pebble_id}", json={"topic": "Edited"}, headers=headers).status_code == 200
+
+    # 批量同步的编辑和之后的 PUT 接在同一条差异链上 (不会因为前像对不上而存成快照)
+    items = app_client.get(f"/api/pebbles/{pebble_id}/revisions", headers=headers).json()["items"]
+    assert [(r["seq"], r["source"], r["checkpoint"]) for r in items] == [
+        (3, "edit", False), (2, "edit", False), (1, "edit", False), (0, "baseline", True),
+    ]
+    assert items[2]["paths"] == ["/content/ELI5/mainContent/0/body"]
+    state = app_client.get(f"/api/pebbles/{pebble_id}/revisions/2", headers=headers).json()["state"]
+    assert state["topic"] == "Synced again" and state["content"]["ELI5"]["mainContent"][0]["body"] == "Autosaved"
@@ -0,0 +1,53 @@
+import uuid
+import pytest
+from app.database import settings
+from app.gemini_service import rewrite_batch_logic, rewrite_text_logic
+
+pytestmark = pytest.mark.anyio
+
+
+def _texts(n: int) -> list:
+    # 改写缓存是进程级的，每个测试用不同的原文
+    tag = uuid.uuid4().hex[:8]
+    return [f"{tag} paragraph {i}" for i in range(n)]
+
+
+def _batch_calls(stub) -> list:
+    return [call for call in stub.calls if "Input:" in call]
+
+
+async def test_items_are_packed_into_structured_calls(stub_provider, monkeypatch):
+    monkeypatch.setattr(settings, "REWRITE_PACK_MAX_ITEMS", 2)
+    texts = _texts(5)
+
+    result = await rewrite_batch_logic([(text, "shorter") for text in texts])
+
+    assert result == [text.upper() for text in texts]
+    # 2 + 2 两箱走结构化输出，剩下的一条单独改写
+    assert len(_batch_calls(stub_provider)) == 2
+    assert [call for call in stub_provider.calls if "Input:" not in call] == [texts[4]]
+
+
+async def test_duplicates_and_cached_items_are_not_sent(stub_provider):
+    cached, first, second = _texts(3)
+    await rewrite_text_logic(cached, "improve")
+    stub_provider.calls.clear()
+
+    items = [(cached, "improve"), (first, "improve"), (first, "improve"), (second, "unknown-mode")]
+    assert await rewrite_batch_logic(items) == [cached.upper(), first.upper(), first.upper(), second.upper()]
+
+    [call] = stub_provider.calls
+    assert cached not in call and call.count(first) == 1 and second in call
+    # 未知的 mode 按 improve 处理，结果进入同一个缓存
+    stub_provider.calls.clear()
+    assert await rewrite_text_logic(second, "improve") == second.upper()
+    assert stub_provider.calls == []
+
+
+async def test_items_dropped_from_structured_output_fall_back(stub_provider):
+    texts = _texts(3)
+    stub_provider.dropped_ids = {1}
+
+    assert await rewrite_batch_logic([(text, "longer") for text in texts]) == [text.upper() for text in texts]
+    assert len(_batch_calls(stub_provider)) == 1
+    assert [call for call in stub_provider.calls if "Input:" not in call] == [texts[1]]
@@ -0,0 +1,63 @@
+import uuid
+import anyio
+import numpy as np
+import pytest
+from app.database import pebbles_collection, users_collection
+from app.documents import backfill_derived_fields
+from app.semantic import OwnerIndex, SemanticIndex, EMBEDDING_DIM, semantic_index
+from helpers import register, make_pebble
+
+
+@pytest.mark.anyio
+async def test_index_is_rebuilt_after_backfill():
+    owner = f"legacy-{uuid.uuid4().hex[:8]}"
+    await users_collection.insert_one({"username": owner})
+    await pebbles_collection.insert_one({**make_pebble("Legacy"), "owner_id": owner, "isDeleted": False})
+    index = SemanticIndex(max_owners=4)
+
+    # 补建向量之前建立的索引是空的，补建之后版本号变化，重新构建
+    assert (await index.get(owner)).ids == []
+    await backfill_derived_fields()
+    assert len((await index.get(owner)).ids) == 1
+
+
+def test_knn_edges_do_not_depend_on_chunk_size():
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((50, EMBEDDING_DIM)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    index = OwnerIndex([f"p{i}" for i in range(50)], [""] * 50, matrix, 0)
+
+    edges = {(e["source"], e["target"]): e["weight"] for e in index.knn_edges(3, -1.0)}
+    assert edges == {(e["source"], e["target"]): e["weight"] for e in index.knn_edges(3, -1.0, chunk_size=7)}
+    assert len(edges) >= 50 * 3 // 2
+
+
+def test_writes_patch_the_cached_index(app_client, monkeypatch):
+    owner = f"semantic-{uuid.uuid4().hex[:8]}"
+    headers = register(app_client, owner)
+    first, second = make_pebble("Volcano"), make_pebble("Glacier")
+    for pebble in (first, second):
+        assert app_client.post("/api/pebbles", json=pebble, headers=headers).status_code == 200
+    index = anyio.run(semantic_index.get, owner)
+    assert sorted(index.ids) == sorted([first["id"], second["id"]])
+
+    builds = []
+    build = semantic_index._build
+    monkeypatch.setattr(semantic_index, "_build", lambda *args: builds.append(args) or build(*args))
+
+    # 不影响向量的写入不会让索引失效
+    assert app_client.put(f"/api/pebbles/{first['id']}", json={"isVerified": True}, headers=headers).status_code == 200
+    assert anyio.run(semantic_index.get, owner) is index
+
+    # 改到向量 / 新建 / 删除：只更新改动的行，不重建
+    assert app_client.put(f"/api/pebbles/{first['id']}", json={"topic": "Lava"}, headers=headers).status_code == 200
+    third = make_pebble("Tundra")
+    assert app_client.post("/api/pebbles", json=third, headers=headers).status_code == 200
+    assert app_client.delete(f"/api/pebbles/{second['id']}", headers=headers).status_code == 200
+    patched = anyio.run(semantic_index.get, owner)
+    assert builds == []
+    assert patched.ids == [first["id"], third["id"]] and patched.topics == ["Lava", "Tundra"]
+
+    rebuilt = anyio.run(SemanticIndex(max_owners=1).get, owner)
+    assert rebuilt.version == patched.version
+    assert np.array_equal(rebuilt.matrix[[rebuilt.positions[i] for i in patched.ids]], patched.matrix)
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from app import gemini_service
+from app.gemini_service import _single_flight
+
+pytestmark = pytest.mark.anyio
+
+
+def _factory(calls: list, started: asyncio.Event, release: asyncio.Event, result="shared"):
+    async def call():
+        calls.append(1)
+        started.set()
+        await release.wait()
+        return result
+    return call
+
+
+async def test_concurrent_callers_share_one_call():
+    calls, started, release = [], asyncio.Event(), asyncio.Event()
+    factory = _factory(calls, started, release)
+    waiters = [asyncio.create_task(_single_flight("sf:share", factory)) for _ in range(3)]
+    await started.wait()
+    release.set()
+    assert await asyncio.gather(*waiters) == ["shared"] * 3
+    assert calls == [1] and "sf:share" not in gemini_service._inflight
+
+
+async def test_cancelled_waiter_does_not_cancel_shared_call():
+    calls, started, release = [], asyncio.Event(), asyncio.Event()
+    factory = _factory(calls, started, release)
+    first = asyncio.create_task(_single_flight("sf:cancel-one", factory))
+    second = asyncio.create_task(_single_flight("sf:cancel-one", factory))
+    await started.wait()
+
+    first.cancel()
+    await asyncio.sleep(0)
+    assert first.cancelled()
+    release.set()
+    assert await second == "shared"
+    assert calls == [1]
+
+
+async def test_call_is_cancelled_when_every_waiter_leaves():
+    calls, started, release = [], asyncio.Event(), asyncio.Event()
+    factory = _factory(calls, started, release)
+    waiters = [asyncio.create_task(_single_flight("sf:cancel-all", factory)) for _ in range(2)]
+    await started.wait()
+    task = gemini_service._inflight["sf:cancel-all"][0]
+
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert task.cancelled() and "sf:cancel-all" not in gemini_service._inflight
+
+    # 之后的请求重新发起调用
+    release.set()
+    assert await _single_flight("sf:cancel-all", factory) == "shared"
+    assert calls == [1, 1]
+
+
+async def test_exception_reaches_every_waiter():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    results = await asyncio.gather(*(_single_flight("sf:error", fail) for _ in range(3)), return_exceptions=True)
+    assert [type(r) for r in results] == [RuntimeError] * 3
@@ -0,0 +1,36 @@
+import json
+from app.stream_parser import IncrementalJSONParser
+
+DOCUMENT = {
+    "eli5_content": {
+        "title": "Quote \" and \\ backslash", "emojiCollage": ["🪨", "✨"],
+        "mainContent": [{"type": "text", "heading": "Intro", "body": "line\nbreak é"}, {"n": -12.5e3}],
+        "flags": [True, False, None, 0],
+    },
+    "socratic_questions": ["Why?", "How {many} [items]?"],
+}
+TEXT = "```json\n" + json.dumps(DOCUMENT, ensure_ascii=False, indent=1) + "\n```"
+
+
+def _parse(chunks) -> list:
+    parser = IncrementalJSONParser(lambda path: True)
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    assert parser.done
+    return events
+
+
+def test_every_value_is_emitted_once_in_order():
+    events = _parse([TEXT])
+    assert events[-1] == ((), DOCUMENT)
+    assert (("eli5_content", "mainContent", 1, "n"), -12500.0) in events
+    assert (("eli5_content", "flags", 2), None) in events
+    assert (("socratic_questions", 1), "How {many} [items]?") in events
+
+
+def test_chunk_boundaries_do_not_change_the_result():
+    expected = _parse([TEXT])
+    assert _parse(TEXT) == expected   # 每个字符一块
+    for split in range(1, len(TEXT)):
+        assert _parse([TEXT[:split], TEXT[split:]]) == expected, split
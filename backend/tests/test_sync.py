@@ -0,0 +1,70 @@
+import uuid
+import anyio
+from app.database import pebbles_collection
+from app.documents import backfill_updated_at
+from helpers import register, make_pebble
+
+
+def _folder(folder_id: str, parent_id: str | None = None) -> dict:
+    return {"op": "create", "kind": "folder", "id": folder_id, "data": {"name": folder_id, "parentId": parent_id, "createdAt": 1_700_000_000_000}}
+
+
+def test_batch_rejects_folder_cycles(app_client):
+    headers = register(app_client)
+    a, b, c = (f"f-{uuid.uuid4().hex[:6]}" for _ in range(3))
+    operations = [
+        _folder(a), _folder(b, a), _folder(c, b),
+        {"op": "move", "kind": "folder", "id": a, "target": c},
+        {"op": "update", "kind": "folder", "id": b, "data": {"parentId": c}},
+        {"op": "move", "kind": "folder", "id": c, "target": a},
+        {"op": "move", "kind": "folder", "id": b, "target": "missing"},
+    ]
+    result = app_client.post("/api/sync/batch", json={"operations": operations}, headers=headers).json()
+
+    assert [e["index"] for e in result["errors"]] == [3, 4, 6]
+    assert "own subtree" in result["errors"][0]["detail"]
+    assert result["errors"][2]["detail"] == "Target folder not found"
+    assert result["applied"] == 4
+
+    folders = {f["id"]: f for f in app_client.get("/api/folders", headers=headers).json()["items"]}
+    assert folders[a]["parentId"] is None
+    assert folders[b]["parentId"] == a
+    assert folders[c]["parentId"] == a
+
+
+def test_batch_update_values_are_validated(app_client):
+    headers = register(app_client)
+    pebble = make_pebble("Batch")
+    operations = [
+        {"op": "create", "kind": "pebble", "id": pebble["id"], "data": pebble},
+        {"op": "update", "kind": "pebble", "id": pebble["id"], "data": {"content": "oops"}},
+        {"op": "update", "kind": "pebble", "id": pebble["id"], "data": {"content.ELI5.mainContent.0.body": "Edited"}},
+        {"op": "update", "kind": "pebble", "id": "missing", "data": {"topic": "x"}},
+    ]
+    result = app_client.post("/api/sync/batch", json={"operations": operations}, headers=headers).json()
+
+    assert [e["index"] for e in result["errors"]] == [1, 3]
+    assert result["applied"] == 2
+    stored = app_client.post("/api/pebbles/by-ids", json={"ids": [pebble["id"]]}, headers=headers).json()[0]
+    assert stored["content"]["ELI5"]["mainContent"][0]["body"] == "Edited"
+
+
+def test_changes_cursor_rereads_late_commits(app_client):
+    owner = f"sync-{uuid.uuid4().hex[:8]}"
+    headers = register(app_client, owner)
+    first = make_pebble("First")
+    assert app_client.post("/api/pebbles", json=first, headers=headers).status_code == 200
+    page = app_client.get("/api/sync/changes", headers=headers).json()
+    assert [p["id"] for p in page["pebbles"]] == [first["id"]] and not page["hasMore"]
+    stamped_at = page["pebbles"][0]["updatedAt"]
+
+    # updatedAt 在上一次同步之前打上、之后才提交的写入；以及没有 updatedAt 的旧文档
+    late, legacy = make_pebble("Late"), make_pebble("Legacy")
+    anyio.run(pebbles_collection.insert_many, [
+        {**late, "owner_id": owner, "isDeleted": False, "updatedAt": stamped_at - 1},
+        {**legacy, "owner_id": owner, "isDeleted": False},
+    ])
+    anyio.run(backfill_updated_at)
+
+    changes = app_client.get("/api/sync/changes", params={"cursor": page["cursor"]}, headers=headers).json()
+    assert {late["id"], legacy["id"]} <= {p["id"] for p in changes["pebbles"]}
@@ -0,0 +1,39 @@
+import uuid
+import pytest
+from app.database import pebbles_collection, users_collection
+from app.documents import backfill_derived_fields
+from app.versioning import current_version
+from helpers import register, make_pebble
+
+
+def test_etag_is_scoped_to_owner(app_client):
+    alice, bob = register(app_client), register(app_client)
+    first = app_client.get("/api/pebbles", headers=alice)
+    assert first.status_code == 200
+    assert "Authorization" in first.headers["vary"]
+    assert first.headers["cache-control"].startswith("private")
+    etag = first.headers["etag"]
+
+    # 同一版本号、同一 URL，换一个用户也不能拿到 304
+    other = app_client.get("/api/pebbles", headers={**bob, "If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+    assert app_client.get("/api/pebbles", headers={**alice, "If-None-Match": etag}).status_code == 304
+
+    assert app_client.post("/api/pebbles", json=make_pebble("New"), headers=alice).status_code == 200
+    changed = app_client.get("/api/pebbles", headers={**alice, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+
+@pytest.mark.anyio
+async def test_backfill_bumps_owner_version():
+    owner = f"legacy-{uuid.uuid4().hex[:8]}"
+    await users_collection.insert_one({"username": owner, "archiveVersion": 3})
+    await pebbles_collection.insert_one({**make_pebble("Legacy"), "owner_id": owner, "isDeleted": False})
+    before = await current_version(owner)
+
+    await backfill_derived_fields()
+
+    doc = await pebbles_collection.find_one({"owner_id": owner})
+    assert "searchTerms" in doc and "embedding" in doc
+    assert await current_version(owner) == before + 1
@@ -6,7 +6,7 @@ import { TheArtifact } from './views/TheArtifact';
 import { TheArchive } from './views/TheArchive';
 import { AuthView } from './views/AuthView'; // 新增：认证视图
 import { ArchiveSidebar } from './components/ArchiveSidebar';
-import { pebbleApi, folderApi } from './services/api'; // 新增：API 服务
+import { pebbleApi, folderApi, syncApi } from './services/api'; // 新增：API 服务
 import { CheckCircle2, ArrowRight, Loader2, LogOut } from 'lucide-react';
 
 const App: React.FC = () => {
@@ -67,7 +67,7 @@ const App: React.FC = () => {
     try {
       setIsLoading(true);
       const [fetchedPebbles, fetchedFolders] = await Promise.all([
-        pebbleApi.getAll(),
+        pebbleApi.getSummaries(),
         folderApi.getAll()
       ]);
       setArchive(fetchedPebbles);
@@ -80,6 +80,17 @@ const App: React.FC = () => {
     }
   };
 
+  // 列表里是摘要 (isPartial)，打开 / 预览前取完整文档并替换存档里的条目
+  const loadFullPebbles = async (pebbles: PebbleData[]) => {
+    const partialIds = pebbles.filter(p => p.isPartial).map(p => p.id);
+    if (!partialIds.length) return pebbles;
+    const fetched = new Map((await pebbleApi.getByIds(partialIds)).map(p => [p.id, p]));
+    setArchive(prev => prev.map(p => (p.isPartial && fetched.get(p.id)) || p));
+    return pebbles.map(p => fetched.get(p.id) || p);
+  };
+
+  const loadFullPebble = async (pebble: PebbleData) => (await loadFullPebbles([pebble]))[0];
+
   // ★★★ 新增：处理退出登录 ★★★
   const handleLogout = () => {
     // 1. 清除本地存储的 Token
@@ -132,21 +143,27 @@ const App: React.FC = () => {
     };
 
     try {
-        // Frontend Simulation Logs (为了视觉效果保留延迟)
-        await new Promise(r => setTimeout(r, 800));
         addLog(`> Integrating ${currentReferences.length} context nodes...`);
-        updateTask({ progress: 20 });
-        
-        await new Promise(r => setTimeout(r, 800));
-        addLog(`> Retrieving semantic lattice...`);
-        updateTask({ progress: 50 });
-
-        await new Promise(r => setTimeout(r, 800));
         addLog(`> Querying generative models (Backend)...`);
-        updateTask({ progress: 70 });
-
-        // --- REAL API CALL ---
-        const pebble = await pebbleApi.generate(topic, currentReferences);
+        updateTask({ progress: 10 });
+
+        // --- REAL API CALL (streaming) ---
+        // 每收到一个已完成的片段就写一条日志，进度随片段推进
+        let sections = 0;
+        const pebble = await pebbleApi.generateStream(topic, currentReferences, (event) => {
+            if (event.event === 'done') return;
+            sections += 1;
+            if (event.event === 'field' && event.field === 'title') {
+                addLog(`> [${event.level}] ${event.value}`);
+            } else if (event.event === 'main_block') {
+                addLog(`> [${event.level}] Block ${event.index + 1}: ${event.block.heading || event.block.type}`);
+            } else if (event.event === 'sidebar_block') {
+                addLog(`> [${event.level}] Sidebar: ${event.block.heading}`);
+            } else if (event.event === 'socratic_question') {
+                addLog(`> Socratic question ${event.index + 1} ready`);
+            }
+            updateTask({ progress: Math.min(95, 10 + sections * 3) });
+        });
         
         addLog(`> Constructing artifacts...`);
         updateTask({ progress: 100 });
@@ -471,11 +488,17 @@ const App: React.FC = () => {
           });
       }
 
-      // 3. API Call
+      // 3. API Call —— 只提交被修改的这个 block (路径级更新)，不再上传整棵 content
       if (updatedContentForApi) {
         setSaveStatus('saving'); // ★ 开始保存
+                const blockPath = `content.${level}.${section === 'main' ? 'mainContent' : 'sidebarContent'}.${index}`;
                 try {
-                    await pebbleApi.update(pebbleId, updatedContentForApi);
+                    await syncApi.batch([{
+                        op: 'update',
+                        kind: 'pebble',
+                        id: pebbleId,
+                        data: { [blockPath]: { ...updatedBlock, isUserEdited: true }, isUserEdited: true },
+                    }]);
                     // 稍微延迟一下变回 Saved，让用户看清
                     setTimeout(() => setSaveStatus('saved'), 500); 
                 } catch (e) {
@@ -485,6 +508,31 @@ const App: React.FC = () => {
             }
   };
 
+  // ★★★ 一次更新多个正文版块 (整篇改写)：一次状态更新 + 一次同步请求 ★★★
+  const handleUpdateMainBlocks = async (pebbleId: string, level: CognitiveLevel, updates: Record<number, MainBlock>) => {
+      const applyTo = (p: PebbleData): PebbleData => {
+          const mainContent = p.content[level].mainContent.map((b, i) => updates[i] ? { ...updates[i], isUserEdited: true } : b);
+          return { ...p, content: { ...p.content, [level]: { ...p.content[level], mainContent } }, isUserEdited: true };
+      };
+      setArchive(prev => prev.map(p => p.id === pebbleId ? applyTo(p) : p));
+      if (activePebble?.id === pebbleId) {
+          setActivePebble(prev => prev && applyTo(prev));
+      }
+
+      const data: Record<string, unknown> = { isUserEdited: true };
+      Object.entries(updates).forEach(([index, block]) => {
+          data[`content.${level}.mainContent.${index}`] = { ...block, isUserEdited: true };
+      });
+      setSaveStatus('saving');
+      try {
+          await syncApi.batch([{ op: 'update', kind: 'pebble', id: pebbleId, data }]);
+          setTimeout(() => setSaveStatus('saved'), 500);
+      } catch (e) {
+          console.error(e);
+          setSaveStatus('error');
+      }
+  };
+
   // ★★★ 修复：添加版块逻辑 ★★★
   const handleAddBlock = async (
       pebbleId: string,
@@ -699,7 +747,9 @@ const App: React.FC = () => {
 
       // 2. 在现有存档中查找是否已有这样的草稿
       // 我们按时间倒序找，优先复用最近的一个
-      const existingDraft = archive.sort((a, b) => b.timestamp - a.timestamp).find(p => {
+      // 只有标题对得上的才需要完整内容来判断
+      const candidates = await loadFullPebbles(archive.filter(p => p.topic === DEFAULT_TITLE));
+      const existingDraft = candidates.sort((a, b) => b.timestamp - a.timestamp).find(p => {
           // 检查标题
           if (p.topic !== DEFAULT_TITLE) return false;
           
@@ -778,9 +828,13 @@ const App: React.FC = () => {
       setActivePebble(null);
   };
 
-  const handleSelectFromArchive = (pebble: PebbleData) => {
-      setActivePebble(pebble);
-      setViewState(ViewState.ARTIFACT);
+  const handleSelectFromArchive = async (pebble: PebbleData) => {
+      try {
+          setActivePebble(await loadFullPebble(pebble));
+          setViewState(ViewState.ARTIFACT);
+      } catch (e) {
+          console.error("Failed to load pebble", e);
+      }
   };
 
   // --- Render ---
@@ -855,6 +909,7 @@ const App: React.FC = () => {
                     onAddBlock={handleAddBlock} // 新增：添加版块
                     onMoveBlock={handleMoveBlock} // 新增：移动版块
                     onDeleteBlock={handleDeleteBlock} // 新增：删除版块
+                    onUpdateMainBlocks={handleUpdateMainBlocks} // 整篇改写
                 />
             </div>
           )}
@@ -865,6 +920,7 @@ const App: React.FC = () => {
                     pebbles={archive}
                     folders={folders}
                     onSelectPebble={handleSelectFromArchive}
+                    onLoadPebble={loadFullPebble}
                     onBack={goToDrop}
                     onCreateFolder={handleCreateFolder}
                     onMovePebble={handleMovePebble}
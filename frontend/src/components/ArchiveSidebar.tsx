@@ -6,6 +6,7 @@ import {
   PanelLeft, Layers, ArrowLeft, Plus, PenTool
 } from 'lucide-react';
 import { PebbleData, GenerationTask, Folder } from '../types';
+import { folderApi } from '../services/api';
 
 interface ArchiveSidebarProps {
   archive: PebbleData[];
@@ -78,6 +79,13 @@ export const ArchiveSidebar: React.FC<ArchiveSidebarProps> = ({
   const visiblePebbles = useMemo(() => archive.filter(p => !p.isDeleted), [archive]);
   const isCardMode = sidebarWidth > 300;
 
+  // 文件夹卡片上的数量 (含子文件夹) 由服务端一次聚合算出，archive / folders 变化时刷新
+  const [folderCounts, setFolderCounts] = useState<Record<string, number>>({});
+  useEffect(() => {
+    if (!isCardMode) return;
+    folderApi.counts().then(setFolderCounts).catch(() => {});
+  }, [isCardMode, archive, folders]);
+
   // --- Effects (Resize & Click Outside) ---
   useEffect(() => {
     const handleClickOutside = (e: MouseEvent) => {
@@ -411,7 +419,7 @@ export const ArchiveSidebar: React.FC<ArchiveSidebarProps> = ({
               )}
               {subFolders.map(folder => {
                   const isEditing = editingId === folder.id;
-                  const itemCount = visiblePebbles.filter(p => p.folderId === folder.id).length;
+                  const itemCount = folderCounts[folder.id] ?? 0;
                   const subFolderCount = folders.filter(f => f.parentId === folder.id).length;
                   return (
                       <div 
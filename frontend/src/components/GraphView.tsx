@@ -1,6 +1,7 @@
-import React, { useEffect, useRef } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import * as d3 from 'd3';
-import { PebbleData } from '../types';
+import { PebbleData, GraphEdge } from '../types';
+import { graphApi } from '../services/api';
 
 interface GraphViewProps {
   pebbles: PebbleData[];
@@ -9,6 +10,14 @@ interface GraphViewProps {
 
 export const GraphView: React.FC<GraphViewProps> = ({ pebbles, onNodeClick }) => {
   const svgRef = useRef<SVGSVGElement>(null);
+  const [edges, setEdges] = useState<GraphEdge[]>([]);
+
+  // 语义 kNN 边由后端计算 (/api/graph)
+  useEffect(() => {
+    let cancelled = false;
+    graphApi.get().then(graph => { if (!cancelled) setEdges(graph.edges); }).catch(console.error);
+    return () => { cancelled = true; };
+  }, [pebbles]);
 
   useEffect(() => {
     if (!svgRef.current || pebbles.length === 0) return;
@@ -27,35 +36,19 @@ export const GraphView: React.FC<GraphViewProps> = ({ pebbles, onNodeClick }) =>
        mass: p.isVerified ? 50 : 5
     }));
 
-    // Generate links based on loose semantic matching (simulated here by char code or just random for demo)
-    // In a real app, use vector embeddings. 
-    // Here: Verified nodes act as hubs.
-    const links: any[] = [];
-    const verifiedNodes = nodes.filter(n => n.isVerified);
-    const unverifiedNodes = nodes.filter(n => !n.isVerified);
-
-    // If we have hubs, connect little stones to them
-    if (verifiedNodes.length > 0) {
-        unverifiedNodes.forEach((uvNode, i) => {
-             // Connect to a random verified node (simulating clustering)
-             const target = verifiedNodes[i % verifiedNodes.length];
-             links.push({ source: uvNode.id, target: target.id });
-        });
-        // Connect hubs to each other weakly
-        for(let i=0; i<verifiedNodes.length; i++) {
-             for(let j=i+1; j<verifiedNodes.length; j++) {
-                  links.push({ source: verifiedNodes[i].id, target: verifiedNodes[j].id, isHubLink: true });
-             }
-        }
-    } else {
-        // Fallback: Random chain if no mastery
-        for (let i = 0; i < nodes.length - 1; i++) {
-            links.push({ source: nodes[i].id, target: nodes[i+1].id });
-        }
-    }
+    // Links: sparse semantic k-nearest-neighbour edges computed server-side.
+    // Edges between two mastered (verified) nodes are drawn as strong hub links.
+    const nodeIds = new Set(nodes.map(n => n.id));
+    const verifiedIds = new Set(nodes.filter(n => n.isVerified).map(n => n.id));
+    const links: any[] = edges
+      .filter(e => nodeIds.has(e.source) && nodeIds.has(e.target))
+      .map(e => ({
+        ...e,
+        isHubLink: verifiedIds.has(e.source) && verifiedIds.has(e.target),
+      }));
 
     const simulation = d3.forceSimulation(nodes as any)
-      .force("link", d3.forceLink(links).id((d: any) => d.id).distance((d: any) => d.isHubLink ? 300 : 100))
+      .force("link", d3.forceLink(links).id((d: any) => d.id).distance((d: any) => 60 + (1 - d.weight) * (d.isHubLink ? 300 : 150)))
       .force("charge", d3.forceManyBody().strength((d: any) => d.isVerified ? -600 : -100)) // Verified push harder
       .force("center", d3.forceCenter(width / 2, height / 2))
       .force("collide", d3.forceCollide().radius((d: any) => d.radius + 20));
@@ -138,7 +131,7 @@ export const GraphView: React.FC<GraphViewProps> = ({ pebbles, onNodeClick }) =>
     }
 
     return () => { simulation.stop(); };
-  }, [pebbles]);
+  }, [pebbles, edges]);
 
   return (
     <svg 
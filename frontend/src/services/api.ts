@@ -1,5 +1,9 @@
 import axios from 'axios';
-import { PebbleData, Folder } from '../types';
+import {
+  PebbleData, PebbleSummary, PebblePage, PebbleSearchResult, Folder, GenerationStreamEvent,
+  SyncOperation, SyncBatchResult, SyncChanges, GraphEdge, RelatedPebble, GenerationJob,
+  ArchiveImportEvent, ArchiveImportStats, RevisionPage, RevisionDetail,
+} from '../types';
 
 // ★★★ 步骤1: BaseURL 统一指向服务器根目录 ★★★
 // 本地: http://localhost:8002
@@ -52,9 +56,42 @@ export const authApi = {
 // 这样：
 // 本地 -> http://localhost:8002/api/pebbles (正确)
 // 线上 -> /pebbles/api/api/pebbles -> Nginx 去掉第一个前缀 -> /api/pebbles (正确)
+// 摘要 -> 列表用的 PebbleData (isPartial)，content 里只有卡片渲染需要的字段
+const fromSummary = (s: PebbleSummary): PebbleData => {
+  const level = {
+    title: s.topic, summary: s.summary ?? '', emojiCollage: s.emoji ? [s.emoji] : [],
+    keywords: s.keywords ?? [], mainContent: [], sidebarContent: [],
+  };
+  return {
+    id: s.id, topic: s.topic, timestamp: s.timestamp, folderId: s.folderId, isVerified: s.isVerified,
+    content: { ELI5: level, ACADEMIC: level }, socraticQuestions: [], isPartial: true,
+  };
+};
+
 export const pebbleApi = {
-  getAll: async () => {
-    const res = await api.get<PebbleData[]>('/api/pebbles'); // 加了 /api
+  // ★★★ Archive 列表：逐页拉取摘要，完整文档在打开时用 getByIds 按需获取 ★★★
+  getSummaries: async () => {
+    const all: PebbleData[] = [];
+    let cursor: string | null = null;
+    do {
+      const page: PebblePage<PebbleSummary> = await pebbleApi.getPage(cursor, 500);
+      all.push(...page.items.map(fromSummary));
+      cursor = page.nextCursor;
+    } while (cursor);
+    return all;
+  },
+  getPage: async (cursor: string | null = null, limit = 100) => {
+    const res = await api.get<PebblePage<PebbleSummary>>('/api/pebbles', {
+      params: { limit, view: 'summary', ...(cursor ? { cursor } : {}) },
+    });
+    return res.data;
+  },
+  search: async (q: string, limit = 50) => {
+    const res = await api.get<PebbleSearchResult[]>('/api/search', { params: { q, limit } });
+    return res.data;
+  },
+  getByIds: async (ids: string[]) => {
+    const res = await api.post<PebbleData[]>('/api/pebbles/by-ids', { ids });
     return res.data;
   },
   create: async (pebble: PebbleData) => {
@@ -72,20 +109,96 @@ export const pebbleApi = {
   generate: async (topic: string, contextPebbles: PebbleData[]) => {
     const res = await api.post<PebbleData>('/api/generate', { // 加了 /api
         topic, 
-        context_pebbles: contextPebbles 
+        // 只发送 id，服务端按 token 预算组装上下文；为空时服务端自动检索相关 pebble
+        context_ids: contextPebbles.map(p => p.id)
     });
     return res.data;
   },
+  // ★★★ 流式生成：逐行读取 NDJSON 事件，最后一个事件是 done (完整 Pebble) 或 error ★★★
+  generateStream: async (
+    topic: string,
+    contextPebbles: PebbleData[],
+    onEvent: (event: GenerationStreamEvent) => void
+  ) => {
+    const token = localStorage.getItem('pebbles_token');
+    const res = await fetch(`${API_URL}/api/generate/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ topic, context_ids: contextPebbles.map(p => p.id) }),
+    });
+    if (res.status === 401) {
+      // 与 axios 拦截器保持一致
+      localStorage.removeItem('pebbles_token');
+      window.location.reload();
+    }
+    if (!res.ok || !res.body) throw new Error(`Generation failed (${res.status})`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result: PebbleData | null = null;
+
+    const handleLine = (line: string) => {
+      if (!line.trim()) return;
+      const event = JSON.parse(line) as GenerationStreamEvent;
+      if (event.event === 'error') throw new Error(event.detail);
+      if (event.event === 'done') result = event.pebble;
+      onEvent(event);
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer);
+
+    if (!result) throw new Error('Generation stream ended unexpectedly');
+    return result as PebbleData;
+  },
+  // ★★★ 后台生成任务：提交后立即返回，断线 / 刷新后可以用 id 继续查询 ★★★
+  createJob: async (topic: string, contextPebbles: PebbleData[] = []) => {
+    const res = await api.post<GenerationJob>('/api/generate/jobs', {
+      topic,
+      context_ids: contextPebbles.map(p => p.id)
+    });
+    return res.data;
+  },
+  // wait > 0 时服务端最多等待 wait 秒 (上限 30)，任务结束会立即返回
+  getJob: async (id: string, wait = 0) => {
+    const res = await api.get<GenerationJob>(`/api/generate/jobs/${id}`, { params: { wait } });
+    return res.data;
+  },
   rewrite: async (text: string, mode: 'improve' | 'shorter' | 'longer' | 'simplify') => {
     const res = await api.post('/api/rewrite', { text, mode }); // 加了 /api
     return res.data.text;
+  },
+  // 一次请求改写多段文本，返回同顺序的结果
+  rewriteBatch: async (items: { text: string; mode: 'improve' | 'shorter' | 'longer' | 'simplify' }[]) => {
+    const res = await api.post<{ texts: string[] }>('/api/rewrite/batch', { items });
+    return res.data.texts;
   }
 };
 
 export const folderApi = {
+  // ★★★ 后端按 cursor 分页，这里逐页拉取完整列表 ★★★
   getAll: async () => {
-    const res = await api.get<Folder[]>('/api/folders'); // 加了 /api
-    return res.data;
+    const all: Folder[] = [];
+    let cursor: string | null = null;
+    do {
+      const res: { data: PebblePage<Folder> } = await api.get('/api/folders', {
+        params: cursor ? { cursor } : {},
+      });
+      all.push(...res.data.items);
+      cursor = res.data.nextCursor;
+    } while (cursor);
+    return all;
   },
   create: async (folder: Folder) => {
     const res = await api.post('/api/folders', folder); // 加了 /api
@@ -99,5 +212,127 @@ export const folderApi = {
   ungroup: async (id: string) => {
     const res = await api.post(`/api/folders/${id}/ungroup`);
     return res.data;
+  },
+  // ★★★ 子树操作 (服务端在一个事务里处理整个子树) ★★★
+  move: async (id: string, parentId: string | null) => {
+    const res = await api.post(`/api/folders/${id}/move`, { parentId });
+    return res.data;
+  },
+  delete: async (id: string) => {
+    const res = await api.delete<{ folders: number; pebbles: number }>(`/api/folders/${id}`);
+    return res.data;
+  },
+  restore: async (id: string) => {
+    const res = await api.post<{ folders: number; pebbles: number; parentId: string | null }>(`/api/folders/${id}/restore`);
+    return res.data;
+  },
+  // {folderId: 该文件夹及所有子文件夹下的 pebble 数}
+  counts: async (root?: string) => {
+    const res = await api.get<Record<string, number>>('/api/folder-counts', { params: root ? { root } : {} });
+    return res.data;
   }
-};
\ No newline at end of file
+};
+
+// ★★★ 批量 / 增量同步 ★★★
+export const syncApi = {
+  // 多个操作合并成一次请求；任何一条失败都会抛错 (errors 中带下标)
+  batch: async (operations: SyncOperation[]) => {
+    const res = await api.post<SyncBatchResult>('/api/sync/batch', { operations });
+    if (res.data.errors.length) {
+      throw new Error(res.data.errors.map(e => `#${e.index}: ${e.detail}`).join('; '));
+    }
+    return res.data;
+  },
+  changes: async (cursor: string | null, since = 0) => {
+    const res = await api.get<SyncChanges>('/api/sync/changes', {
+      params: cursor ? { cursor } : { since },
+    });
+    return res.data;
+  },
+};
+
+// ★★★ 语义图谱 ★★★
+export const graphApi = {
+  get: async (k = 3) => {
+    const res = await api.get<{ nodes: string[]; edges: GraphEdge[] }>('/api/graph', { params: { k } });
+    return res.data;
+  },
+  related: async (id: string, k = 5) => {
+    const res = await api.get<RelatedPebble[]>(`/api/related/${id}`, { params: { k } });
+    return res.data;
+  },
+};
+
+// ★★★ 档案导出 / 导入 ★★★
+export const archiveApi = {
+  // gzip 压缩的 NDJSON 文件
+  export: async (includeDeleted = false) => {
+    const res = await api.get<Blob>('/api/export', {
+      params: { include_deleted: includeDeleted },
+      responseType: 'blob',
+    });
+    return res.data;
+  },
+  // 直接上传文件字节，服务端边收边写；逐行回调进度 / 单条错误，返回最终统计
+  import: async (file: Blob, onEvent: (event: ArchiveImportEvent) => void, overwrite = false) => {
+    const token = localStorage.getItem('pebbles_token');
+    const res = await fetch(`${API_URL}/api/import?overwrite=${overwrite}`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/octet-stream',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: file,
+    });
+    if (!res.ok || !res.body) throw new Error(`Import failed (${res.status})`);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result: ArchiveImportStats | null = null;
+
+    const handleLine = (line: string) => {
+      if (!line.trim()) return;
+      const event = JSON.parse(line) as ArchiveImportEvent;
+      if (event.event === 'done') {
+        if (event.fatal) throw new Error(event.fatal);
+        result = event;
+      }
+      onEvent(event);
+    };
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split('\n');
+      buffer = lines.pop() ?? '';
+      lines.forEach(handleLine);
+    }
+    handleLine(buffer);
+    if (!result) throw new Error('Import ended unexpectedly');
+    return result as ArchiveImportStats;
+  },
+};
+
+// ★★★ 修订历史 (撤销 / 历史版本) ★★★
+export const revisionApi = {
+  // 最新在前；把 nextBeforeSeq 传回来翻下一页
+  list: async (pebbleId: string, beforeSeq: number | null = null, limit = 50) => {
+    const res = await api.get<RevisionPage>(`/api/pebbles/${pebbleId}/revisions`, {
+      params: { limit, ...(beforeSeq !== null ? { before_seq: beforeSeq } : {}) },
+    });
+    return res.data;
+  },
+  // 某个版本的完整内容 (预览)
+  get: async (pebbleId: string, seq: number) => {
+    const res = await api.get<RevisionDetail>(`/api/pebbles/${pebbleId}/revisions/${seq}`);
+    return res.data;
+  },
+  restore: async (pebbleId: string, seq: number) => {
+    const res = await api.post<{ status: string; seq: number | null }>(
+      `/api/pebbles/${pebbleId}/revisions/${seq}/restore`
+    );
+    return res.data;
+  },
+};
@@ -65,6 +65,125 @@ export interface PebbleData {
   // ★★★ 新增：标记是否经过人工编辑 ★★★
   // true = Edited, false/undefined = Generated
   isUserEdited?: boolean; 
+
+  // 由摘要分页 (view=summary) 构造的条目：content 只有列表卡片用到的字段，
+  // 打开 / 预览之前要用 pebbleApi.getByIds 取完整文档
+  isPartial?: boolean;
+}
+
+// --- Archive pagination (GET /api/pebbles) ---
+export interface PebbleSummary {
+  id: string;
+  topic: string;
+  folderId: string | null;
+  timestamp: number;
+  isVerified: boolean;
+  emoji: string | null;
+  summary?: string; // 只有 view=summary 的分页返回
+  keywords?: string[];
+}
+
+export interface PebbleSearchResult extends PebbleSummary {
+  score: number;
+}
+
+export interface PebblePage<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
+// --- Batch / delta sync (/api/sync/*) ---
+export interface SyncOperation {
+  op: 'create' | 'update' | 'delete' | 'move';
+  kind: 'pebble' | 'folder';
+  id: string;
+  data?: Record<string, unknown>; // update 支持点路径，如 "content.ELI5.mainContent.3.body"
+  target?: string | null;         // move 的目标 folderId / parentId
+}
+
+export interface SyncBatchResult {
+  applied: number;
+  errors: { index: number; detail: string }[];
+  serverTime: number;
+}
+
+// POST /api/import 的 NDJSON 事件
+export interface ArchiveImportStats {
+  processed: number;
+  inserted: number;
+  updated: number;
+  skipped: number;
+  errors: number;
+}
+
+export type ArchiveImportEvent =
+  | { event: 'error'; line: number; detail: string }
+  | ({ event: 'progress' } & ArchiveImportStats)
+  | ({ event: 'done'; fatal?: string } & ArchiveImportStats);
+
+// --- Revision history (GET /api/pebbles/{id}/revisions) ---
+export interface RevisionSummary {
+  seq: number;
+  fromSeq: number; // < seq when several edits were squashed into one revision
+  createdAt: number;
+  source: 'baseline' | 'edit' | 'restore';
+  restoredFrom?: number | null;
+  checkpoint: boolean;
+  size: number;
+  squashed: number;
+  changes: number;
+  paths: string[]; // JSON Pointer paths of the changed fields (first 10)
+}
+
+export interface RevisionPage {
+  items: RevisionSummary[];
+  nextBeforeSeq: number | null;
+}
+
+export interface RevisionDetail {
+  revision: RevisionSummary;
+  state: Pick<PebbleData, 'topic' | 'content' | 'socraticQuestions' | 'isUserEdited'>;
+}
+
+export interface SyncChanges {
+  pebbles: PebbleData[];
+  folders: Folder[];
+  cursor: string;
+  hasMore: boolean;
+}
+
+// --- Semantic graph (/api/graph, /api/related) ---
+export interface GraphEdge {
+  source: string;
+  target: string;
+  weight: number; // cosine similarity
+}
+
+export interface RelatedPebble {
+  id: string;
+  topic: string;
+  score: number;
+}
+
+// --- Streaming generation events (POST /api/generate/stream) ---
+export type GenerationStreamEvent =
+  | { event: 'field'; level: CognitiveLevel; field: string; value: unknown }
+  | { event: 'main_block'; level: CognitiveLevel; index: number; block: MainBlock }
+  | { event: 'sidebar_block'; level: CognitiveLevel; index: number; block: SidebarBlock }
+  | { event: 'socratic_question'; index: number; value: string }
+  | { event: 'done'; pebble: PebbleData }
+  | { event: 'error'; detail: string };
+
+export interface GenerationJob {
+  id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  topic: string;
+  createdAt: number;
+  startedAt?: number | null;
+  finishedAt?: number | null;
+  attempts: number;
+  error?: string | null;
+  result?: PebbleData | null;
 }
 
 export interface LogEntry {
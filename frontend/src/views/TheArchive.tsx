@@ -1,6 +1,7 @@
 import React, { useState, useMemo, useEffect, useRef } from 'react';
 import { PebbleData, Folder, CognitiveLevel } from '../types';
 import { GraphView } from '../components/GraphView';
+import { pebbleApi } from '../services/api';
 import { 
   ArrowLeft, GitGraph, Orbit, Box, ChevronRight, Home, 
   LayoutGrid, List as ListIcon, ChevronDown, CheckCircle2, 
@@ -13,6 +14,7 @@ interface TheArchiveProps {
   pebbles: PebbleData[];
   folders: Folder[];
   onSelectPebble: (pebble: PebbleData) => void;
+  onLoadPebble: (pebble: PebbleData) => Promise<PebbleData>; // 列表里是摘要，预览前取完整文档
   onBack: () => void;
   onCreateFolder: (name: string, parentId: string | null, initialPebbleIds: string[]) => string;
   onMovePebble: (pebbleId: string, targetFolderId: string | null) => void;
@@ -131,6 +133,7 @@ export const TheArchive: React.FC<TheArchiveProps> = ({
   pebbles, 
   folders, 
   onSelectPebble, 
+  onLoadPebble,
   onBack,
   onCreateFolder,
   onMovePebble,
@@ -169,6 +172,30 @@ export const TheArchive: React.FC<TheArchiveProps> = ({
 
   // Filter out deleted items
   const visiblePebbles = useMemo(() => pebbles.filter(p => !p.isDeleted), [pebbles]);
+
+  // ★★★ 服务端检索 (标题/摘要/关键词/正文)，id -> 相关度排名；结果返回前先用标题匹配兜底 ★★★
+  const [searchRanks, setSearchRanks] = useState<Map<string, number> | null>(null);
+  useEffect(() => {
+    setSearchRanks(null);
+    if (!search.trim()) return;
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const results = await pebbleApi.search(search);
+        if (!cancelled) setSearchRanks(new Map(results.map((r, i) => [r.id, i])));
+      } catch (e) {
+        console.error(e);
+      }
+    }, 250);
+    return () => { cancelled = true; clearTimeout(timer); };
+  }, [search]);
+
+  const searchPebbles = (candidates: PebbleData[]) => {
+    if (!searchRanks) return candidates.filter(p => p.topic.toLowerCase().includes(search.toLowerCase()));
+    return candidates
+      .filter(p => searchRanks.has(p.id))
+      .sort((a, b) => searchRanks.get(a.id)! - searchRanks.get(b.id)!);
+  };
   
   // --- Logic for Vault View ---
   
@@ -198,11 +225,11 @@ export const TheArchive: React.FC<TheArchiveProps> = ({
       const term = search.toLowerCase();
       return {
         folders: childFolders.filter(f => f.name.toLowerCase().includes(term)),
-        pebbles: childPebbles.filter(p => p.topic.toLowerCase().includes(term))
+        pebbles: searchPebbles(childPebbles)
       };
     }
     return { folders: childFolders, pebbles: childPebbles };
-  }, [folders, visiblePebbles, currentFolderId, search]);
+  }, [folders, visiblePebbles, currentFolderId, search, searchRanks]);
 
   // --- Handlers ---
 
@@ -341,7 +368,9 @@ export const TheArchive: React.FC<TheArchiveProps> = ({
 
       // ★★★ OPEN PREVIEW ON CLICK ★★★
       if (pebble) {
-          setPreviewPebble(pebble);
+          onLoadPebble(pebble)
+              .then(full => setPreviewPebble(full))
+              .catch(e => console.error("Failed to load pebble", e));
       }
   };
 
@@ -631,7 +660,7 @@ export const TheArchive: React.FC<TheArchiveProps> = ({
     const childPebbles = visiblePebbles.filter(p => p.folderId === parentId);
 
     if (search && parentId === currentFolderId) {
-        const allMatchingPebbles = visiblePebbles.filter(p => p.topic.toLowerCase().includes(search.toLowerCase()));
+        const allMatchingPebbles = searchPebbles(visiblePebbles);
         return allMatchingPebbles.map(pebble => renderPebbleListRow(pebble, 0));
     }
 
@@ -24,6 +24,8 @@ interface TheArtifactProps {
   onUpdateMetadata: (pebbleId: string, level: CognitiveLevel, field: 'title' | 'summary' | 'keywords', value: string | string[]) => void;
   // ★★★ 新增：更新全局 Pebble 数据 (苏格拉底问题)
   onUpdateGlobal: (pebbleId: string, field: 'socraticQuestions', value: string[]) => void;
+  // 一次更新多个正文版块 (整篇改写)，key 为版块下标
+  onUpdateMainBlocks: (pebbleId: string, level: CognitiveLevel, updates: Record<number, MainBlock>) => void;
 }
 
 // --- Icons Data & Helper ---
@@ -730,15 +732,43 @@ export const TheArtifact: React.FC<TheArtifactProps> = ({
   onUpdateGlobal,
   onAddBlock,
   onMoveBlock,
-  onDeleteBlock
+  onDeleteBlock,
+  onUpdateMainBlocks
 }) => {
   const [level, setLevel] = useState<CognitiveLevel>(CognitiveLevel.ELI5);
   const [completedQuestions, setCompletedQuestions] = useState<Set<number>>(new Set());
+  const [isRewritingAll, setIsRewritingAll] = useState(false);
   
   const content = pebble.content[level];
   const questions = pebble.socraticQuestions || [];
   const isLocked = pebble.isVerified; // 苏格拉底：视觉上的锁定状态（绿色）
 
+  // ★★★ 整篇改写：当前层级所有正文段落 (要点列表逐条) 合并成一次批量请求 ★★★
+  const handleRewriteAll = async (aiMode: 'improve' | 'shorter' | 'longer' | 'simplify') => {
+      const blocks = content.mainContent;
+      const texts = blocks.flatMap(b => Array.isArray(b.body) ? b.body : [b.body]);
+      if (!texts.length) return;
+
+      setIsRewritingAll(true);
+      try {
+          const rewritten = await pebbleApi.rewriteBatch(texts.map(text => ({ text, mode: aiMode })));
+          const updates: Record<number, MainBlock> = {};
+          let offset = 0;
+          blocks.forEach((b, i) => {
+              const n = Array.isArray(b.body) ? b.body.length : 1;
+              const parts = rewritten.slice(offset, offset + n);
+              offset += n;
+              updates[i] = { ...b, body: Array.isArray(b.body) ? parts : parts[0] };
+          });
+          onUpdateMainBlocks(pebble.id, level, updates);
+      } catch (error) {
+          console.error(error);
+          alert("AI Failed");
+      } finally {
+          setIsRewritingAll(false);
+      }
+  };
+
 // ★★★ 新增：当 Pebble ID 变化或 isVerified 变化时，同步勾选状态 ★★★
   useEffect(() => {
       if (pebble.isVerified) {
@@ -897,6 +927,15 @@ export const TheArtifact: React.FC<TheArtifactProps> = ({
             
             {/* Main Column */}
             <div className="lg:col-span-8">
+                <div className="flex justify-end mb-4">
+                    <button
+                        onClick={() => handleRewriteAll('improve')}
+                        disabled={isRewritingAll}
+                        className="flex items-center gap-1.5 px-3 py-1.5 bg-white border border-stone-200 rounded-full text-xs font-bold text-stone-500 hover:text-stone-900 hover:border-stone-400 transition-colors disabled:opacity-50"
+                    >
+                        {isRewritingAll ? <Loader2 size={12} className="animate-spin" /> : <Wand2 size={12} />} Polish All
+                    </button>
+                </div>
                 <MainContentRenderer 
                     blocks={content.mainContent} 
                     onUpdateBlock={(idx, b) => onUpdateContent(pebble.id, level, 'main', idx, b)}